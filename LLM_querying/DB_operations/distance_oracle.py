@@ -0,0 +1,236 @@
+import os
+import sys
+import heapq
+import logging
+import argparse
+import threading
+
+import numpy as np
+
+from LLM_querying.DB_operations.graph_snapshot import GraphSnapshot, GRAPH_SNAPSHOT_PATH
+
+logger = logging.getLogger(__name__)
+
+# Oracle files live next to the graph snapshot they were computed from:
+#   components.npy          int32 [N], connected-component label per node
+#   landmarks.npy           int32 [L], landmark rows
+#   landmark_distances.npy  int16 [L, N], hop distance from each landmark (-1 = unreachable)
+NUM_LANDMARKS = int(os.getenv("GRAPH_NUM_LANDMARKS", "16"))
+MIN_LANDMARK_COMPONENT = 50  # components smaller than this get no landmark (plain search is already cheap)
+MAX_PATH_EXPANSIONS = int(os.getenv("GRAPH_MAX_PATH_EXPANSIONS", "200000"))
+
+
+def _frontier_neighbors(offsets, neighbors, frontier):
+    """Every neighbour (with repeats) of the `frontier` rows, gathered in one vectorised step."""
+    starts, ends = offsets[frontier], offsets[frontier + 1]
+    counts = ends - starts
+    total = int(counts.sum())
+    slice_starts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return neighbors[slice_starts + np.arange(total)]
+
+
+def bfs_distances(offsets, neighbors, source, num_nodes):
+    """Frontier-at-a-time BFS over CSR arrays; returns hop distances (-1 = unreachable)."""
+    dist = np.full(num_nodes, -1, dtype=np.int32)
+    dist[source] = 0
+    frontier = np.asarray([source], dtype=np.int64)
+    depth = 0
+    while frontier.size:
+        depth += 1
+        reached = _frontier_neighbors(offsets, neighbors, frontier)
+        reached = np.unique(reached[dist[reached] < 0])
+        dist[reached] = depth
+        frontier = reached.astype(np.int64)
+    return dist
+
+
+def connected_components(offsets, neighbors, num_nodes):
+    """Component label per node; each component is flooded by a frontier BFS into the one shared label array."""
+    labels = np.full(num_nodes, -1, dtype=np.int32)
+    component = 0
+    for row in range(num_nodes):
+        if labels[row] >= 0:
+            continue
+        labels[row] = component
+        frontier = np.asarray([row], dtype=np.int64)
+        while frontier.size:
+            reached = _frontier_neighbors(offsets, neighbors, frontier)
+            reached = np.unique(reached[labels[reached] < 0])
+            labels[reached] = component
+            frontier = reached.astype(np.int64)
+        component += 1
+    return labels
+
+
+def select_landmarks(offsets, neighbors, components, num_landmarks):
+    """
+    Farthest-point landmark selection over components with at least `MIN_LANDMARK_COMPONENT` nodes.
+    Starts from the highest-degree node; nodes not yet reached by any landmark count as infinitely far,
+    so each large component gets a landmark before the giant one gets its second.
+    """
+    num_nodes = len(components)
+    sizes = np.bincount(components)
+    eligible = sizes[components] >= MIN_LANDMARK_COMPONENT
+    if not eligible.any():
+        return np.empty(0, dtype=np.int32), np.empty((0, num_nodes), dtype=np.int16)
+
+    degrees = np.diff(offsets)
+    first = int(np.argmax(np.where(eligible, degrees, -1)))
+
+    landmarks, distances = [], []
+    nearest = np.full(num_nodes, np.iinfo(np.int32).max, dtype=np.int64)
+    candidate = first
+    while len(landmarks) < num_landmarks:
+        dist = bfs_distances(offsets, neighbors, candidate, num_nodes)
+        landmarks.append(candidate)
+        distances.append(dist.astype(np.int16))
+        logger.info(f"📍 Landmark {len(landmarks)}/{num_landmarks}: row {candidate}")
+
+        reached = dist >= 0
+        nearest[reached] = np.minimum(nearest[reached], dist[reached])
+        score = np.where(eligible, nearest, -1)
+        score[landmarks] = -1
+        candidate = int(np.argmax(score))
+        if score[candidate] <= 0:
+            break
+    return np.asarray(landmarks, dtype=np.int32), np.vstack(distances)
+
+
+def build_distance_oracle(snapshot_path=GRAPH_SNAPSHOT_PATH, num_landmarks=NUM_LANDMARKS):
+    """Offline step: computes component labels and landmark distances for a graph snapshot."""
+    snapshot = GraphSnapshot(snapshot_path)
+    offsets, neighbors = np.asarray(snapshot.offsets), np.asarray(snapshot.neighbors)
+    num_nodes = len(snapshot.ids)
+
+    logger.info("🔍 Labelling connected components...")
+    components = connected_components(offsets, neighbors, num_nodes)
+    logger.info(f"📌 {components.max() + 1 if num_nodes else 0} components")
+
+    landmarks, distances = select_landmarks(offsets, neighbors, components, num_landmarks)
+
+    np.save(os.path.join(snapshot_path, "components.npy"), components)
+    np.save(os.path.join(snapshot_path, "landmarks.npy"), landmarks)
+    np.save(os.path.join(snapshot_path, "landmark_distances.npy"), distances)
+    logger.info(f"🎉 Distance oracle written to {snapshot_path} ({len(landmarks)} landmarks)")
+
+
+class DistanceOracle:
+    """
+    Landmark (ALT) distance index over a graph snapshot. Unreachable pairs are rejected from
+    component labels alone; reachable ones are found with A* guided by landmark lower bounds.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        path = snapshot.path
+        self.components = np.load(os.path.join(path, "components.npy"), mmap_mode="r")
+        self.landmarks = np.load(os.path.join(path, "landmarks.npy"))
+        self.landmark_distances = np.load(os.path.join(path, "landmark_distances.npy"), mmap_mode="r")
+        self._table = np.asarray(self.landmark_distances, dtype=np.int32)  # widened once for the A* bounds
+
+    def is_reachable(self, node1_id, node2_id):
+        row1, row2 = self.snapshot.row_of.get(node1_id), self.snapshot.row_of.get(node2_id)
+        return row1 is not None and row2 is not None and self.components[row1] == self.components[row2]
+
+    def known_unreachable(self, node1_id, node2_id):
+        """True only if both nodes are in the snapshot and in different components."""
+        row1, row2 = self.snapshot.row_of.get(node1_id), self.snapshot.row_of.get(node2_id)
+        return row1 is not None and row2 is not None and self.components[row1] != self.components[row2]
+
+    def distance_bounds(self, node1_id, node2_id):
+        """(lower, upper) hop-distance bounds from the landmarks; None if unreachable."""
+        if not self.is_reachable(node1_id, node2_id):
+            return None
+        row1, row2 = self.snapshot.row_of[node1_id], self.snapshot.row_of[node2_id]
+        d1 = self.landmark_distances[:, row1].astype(np.int32)
+        d2 = self.landmark_distances[:, row2].astype(np.int32)
+        valid = (d1 >= 0) & (d2 >= 0)
+        if not valid.any():
+            return 0, None
+        return int(np.abs(d1[valid] - d2[valid]).max()), int((d1[valid] + d2[valid]).min())
+
+    def shortest_path(self, node1_id, node2_id, max_expansions=MAX_PATH_EXPANSIONS):
+        """Shortest SIMILAR_TO path as a list of node IDs ([] if unreachable or not found)."""
+        if not self.is_reachable(node1_id, node2_id):
+            return []
+
+        snapshot = self.snapshot
+        start, goal = snapshot.row_of[node1_id], snapshot.row_of[node2_id]
+        if start == goal:
+            return [node1_id]
+
+        to_goal = self._table[:, goal]
+        useful = to_goal >= 0  # landmarks in the goal's component
+        to_goal = to_goal[useful]
+
+        def heuristic(rows):
+            """ALT lower bound max_L |d(L, row) - d(L, goal)| for a block of rows."""
+            if not len(to_goal):
+                return np.zeros(len(rows), dtype=np.int32)
+            return np.abs(self._table[:, rows][useful] - to_goal[:, None]).max(axis=0)
+
+        best = {start: 0}
+        parent = {start: -1}
+        heap = [(int(heuristic([start])[0]), 0, start)]  # (f, -g, row): ties go to the deeper node
+        expansions = 0
+        while heap and expansions < max_expansions:
+            _, cost, row = heapq.heappop(heap)
+            cost = -cost
+            if row == goal:
+                path = []
+                while row != -1:
+                    path.append(snapshot.ids[row])
+                    row = parent[row]
+                return path[::-1]
+            if cost > best[row]:
+                continue
+            expansions += 1
+
+            new_cost = cost + 1
+            fresh = [int(n) for n in snapshot.neighbor_rows(row) if new_cost < best.get(int(n), new_cost + 1)]
+            if not fresh:
+                continue
+            for neighbor, bound in zip(fresh, heuristic(fresh).tolist()):
+                best[neighbor] = new_cost
+                parent[neighbor] = row
+                heapq.heappush(heap, (new_cost + bound, -new_cost, neighbor))
+
+        logger.warning(f"⚠️ Path search between {node1_id} and {node2_id} gave up after {expansions} expansions")
+        return []
+
+
+_oracle = None
+_oracle_lock = threading.Lock()
+
+
+def get_distance_oracle():
+    """Returns the shared oracle for the shared graph snapshot, loading it on first use."""
+    global _oracle
+    if _oracle is None:
+        with _oracle_lock:
+            if _oracle is None:
+                from LLM_querying.DB_operations.graph_snapshot import get_graph_snapshot
+                _oracle = DistanceOracle(get_graph_snapshot())
+    return _oracle
+
+
+def find_distance_oracle():
+    """The shared oracle if one has been built for the graph snapshot, else None; never raises for a missing one."""
+    if _oracle is None and not os.path.exists(os.path.join(GRAPH_SNAPSHOT_PATH, "components.npy")):
+        return None
+    return get_distance_oracle()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute the landmark distance oracle for a graph snapshot.")
+    parser.add_argument("snapshot_dir", nargs="?", default=GRAPH_SNAPSHOT_PATH)
+    parser.add_argument("--landmarks", type=int, default=NUM_LANDMARKS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+    build_distance_oracle(args.snapshot_dir, num_landmarks=args.landmarks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import logging
+import argparse
+import threading
+from collections import deque
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Graph backend: "neo4j" (remote) or "local" (CSR snapshot of SIMILAR_TO, see below)
+GRAPH_BACKEND = os.getenv("GRAPH_BACKEND", "neo4j").lower()
+GRAPH_SNAPSHOT_PATH = os.getenv("GRAPH_SNAPSHOT_PATH", "graph_snapshot")
+GRAPH_MAX_FANOUT = int(os.getenv("GRAPH_MAX_FANOUT", "50"))  # neighbours followed per node in k-hop queries
+GRAPH_MAX_NODES = int(os.getenv("GRAPH_MAX_NODES", "5000"))  # cap on nodes returned by k-hop queries
+
+# Snapshot layout (one directory):
+#   ids.json       list of N node IDs (row order)
+#   kinds.npy      int8 [N], index into NODE_KINDS
+#   offsets.npy    int64 [N + 1], CSR row pointers
+#   neighbors.npy  int32 [E], neighbour rows, each row's slice sorted by weight (desc)
+#   weights.npy    float32 [E], SIMILAR_TO weights aligned with neighbors
+NODE_KINDS = ["concept", "overloaded_concept", "belief"]
+LABEL_KINDS = {"Concept": 0, "Overloaded_Concept": 1, "Belief": 2}
+CONCEPT_KINDS = (0, 1)
+BELIEF_KINDS = (2,)
+
+EXPORT_FETCH_SIZE = 10000
+
+
+class GraphSnapshot:
+    """
+    Read-only, memory-mapped compressed-sparse-row copy of the (undirected) SIMILAR_TO graph.
+    Answers the same questions as the Neo4j expansion queries without a network round trip.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "ids.json"), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self.kinds = np.load(os.path.join(path, "kinds.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.neighbors = np.load(os.path.join(path, "neighbors.npy"), mmap_mode="r")
+        self.weights = np.load(os.path.join(path, "weights.npy"), mmap_mode="r")
+        self.row_of = {node_id: row for row, node_id in enumerate(self.ids)}
+        logger.info(f"✅ Loaded graph snapshot from {path} ({len(self.ids)} nodes, {len(self.neighbors) // 2} edges)")
+
+    def neighbor_rows(self, row):
+        return self.neighbors[self.offsets[row]:self.offsets[row + 1]]
+
+    def _nearest(self, node_id, top_k, source_kinds, target_kinds):
+        row = self.row_of.get(node_id)
+        if row is None or self.kinds[row] not in source_kinds:
+            return []
+        result = []
+        for neighbor in self.neighbor_rows(row):
+            if self.kinds[neighbor] in target_kinds:
+                result.append(self.ids[neighbor])
+                if len(result) == top_k:
+                    break
+        return result
+
+    def nearest_concepts(self, concept_ids, top_k=5):
+        """Mirrors `get_nearest_concepts`: concept → related concepts / overloaded concepts, strongest first."""
+        return {cid: self._nearest(cid, top_k, (0,), CONCEPT_KINDS) for cid in concept_ids}
+
+    def nearest_beliefs(self, belief_ids, top_k=5):
+        """Mirrors `get_nearest_beliefs`: belief → related beliefs, strongest first."""
+        return {bid: self._nearest(bid, top_k, BELIEF_KINDS, BELIEF_KINDS) for bid in belief_ids}
+
+    def within_distance(self, node_id, distance, max_fanout=GRAPH_MAX_FANOUT, max_nodes=GRAPH_MAX_NODES):
+        """
+        Breadth-first k-hop neighbourhood (excluding the start node), following at most
+        `max_fanout` strongest edges per node and returning at most `max_nodes` IDs.
+        """
+        start = self.row_of.get(node_id)
+        if start is None:
+            return []
+
+        seen = {start}
+        frontier = deque([(start, 0)])
+        found = []
+        while frontier and len(found) < max_nodes:
+            row, depth = frontier.popleft()
+            if depth == distance:
+                continue
+            for neighbor in self.neighbor_rows(row)[:max_fanout]:
+                neighbor = int(neighbor)
+                if neighbor in seen:
+                    continue
+                seen.add(neighbor)
+                found.append(self.ids[neighbor])
+                if len(found) == max_nodes:
+                    break
+                frontier.append((neighbor, depth + 1))
+        return found
+
+
+def build_csr(num_nodes, sources, targets, weights):
+    """
+    Builds undirected CSR arrays from directed edge lists, keeping the strongest weight per pair
+    and sorting each node's neighbours by weight (descending).
+    """
+    src = np.concatenate([sources, targets]).astype(np.int64)
+    dst = np.concatenate([targets, sources]).astype(np.int64)
+    w = np.concatenate([weights, weights]).astype(np.float32)
+
+    keep = src != dst
+    src, dst, w = src[keep], dst[keep], w[keep]
+
+    # Deduplicate (src, dst) pairs, keeping the highest weight
+    order = np.lexsort((-w, dst, src))
+    src, dst, w = src[order], dst[order], w[order]
+    first = np.ones(len(src), dtype=bool)
+    first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+    src, dst, w = src[first], dst[first], w[first]
+
+    # Strongest neighbours first within each row
+    order = np.lexsort((-w, src))
+    src, dst, w = src[order], dst[order], w[order]
+
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.add.at(offsets, src + 1, 1)
+    np.cumsum(offsets, out=offsets)
+    return offsets, dst.astype(np.int32), w
+
+
+def export_similarity_graph(driver, out_dir, fetch_size=EXPORT_FETCH_SIZE):
+    """Dumps every Concept / Overloaded_Concept / Belief node and SIMILAR_TO edge from Neo4j to `out_dir`."""
+    os.makedirs(out_dir, exist_ok=True)
+
+    ids, kinds, row_of = [], [], {}
+    with driver.session(fetch_size=fetch_size) as session:
+        logger.info("🔍 Exporting nodes...")
+        for record in session.run(
+            """
+            MATCH (n) WHERE n:Concept OR n:Overloaded_Concept OR n:Belief
+            RETURN n.id AS id, labels(n) AS labels
+            """
+        ):
+            if record["id"] is None or record["id"] in row_of:
+                continue
+            kind = next((LABEL_KINDS[l] for l in record["labels"] if l in LABEL_KINDS), None)
+            row_of[record["id"]] = len(ids)
+            ids.append(record["id"])
+            kinds.append(kind)
+
+        logger.info(f"📌 {len(ids)} nodes. Exporting SIMILAR_TO edges...")
+        sources, targets, weights = [], [], []
+        for record in session.run(
+            "MATCH (a)-[r:SIMILAR_TO]->(b) RETURN a.id AS a, b.id AS b, r.weight AS weight"
+        ):
+            a, b = row_of.get(record["a"]), row_of.get(record["b"])
+            if a is None or b is None:
+                continue
+            sources.append(a)
+            targets.append(b)
+            weights.append(record["weight"] if record["weight"] is not None else 0.0)
+
+    offsets, neighbors, csr_weights = build_csr(
+        len(ids), np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64),
+        np.asarray(weights, dtype=np.float32)
+    )
+
+    with open(os.path.join(out_dir, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    np.save(os.path.join(out_dir, "kinds.npy"), np.asarray(kinds, dtype=np.int8))
+    np.save(os.path.join(out_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(out_dir, "neighbors.npy"), neighbors)
+    np.save(os.path.join(out_dir, "weights.npy"), csr_weights)
+
+    logger.info(f"🎉 Graph snapshot written to {out_dir} ({len(ids)} nodes, {len(sources)} edges)")
+    return len(ids), len(sources)
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_graph_snapshot():
+    """Returns the shared graph snapshot at `GRAPH_SNAPSHOT_PATH`, loading it on first use."""
+    global _snapshot
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = GraphSnapshot(GRAPH_SNAPSHOT_PATH)
+    return _snapshot
+
+
+def use_local_graph():
+    return GRAPH_BACKEND == "local"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshot the Neo4j SIMILAR_TO graph into CSR arrays.")
+    parser.add_argument("out_dir", help="directory to write the snapshot to")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+
+    from LLM_querying.DB_operations.neo4j_operations import get_driver
+    export_similarity_graph(get_driver(), args.out_dir)
+
+
+if __name__ == "__main__":
+    main()
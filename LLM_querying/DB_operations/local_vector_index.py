@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import logging
+import argparse
+from types import SimpleNamespace
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Snapshot layout (one directory):
+#   vectors.npy     float32 [N, dim], memory-mapped on load
+#   ids.json        list of N vector IDs (row order)
+#   metadata.jsonl  one metadata object per row
+VECTORS_FILE = "vectors.npy"
+IDS_FILE = "ids.json"
+METADATA_FILE = "metadata.jsonl"
+
+EXPORT_FETCH_BATCH_SIZE = 100
+NORM_BLOCK_ROWS = 65536  # rows per block when computing norms at load, so the mmap is never copied whole
+
+
+def _matches_condition(value, condition):
+    """Evaluates one Pinecone-style metadata condition (`$eq`, `$ne`, `$in`, `$nin` or a plain value)."""
+    if not isinstance(condition, dict):
+        return value == condition
+    for op, operand in condition.items():
+        if op == "$eq" and value != operand:
+            return False
+        if op == "$ne" and value == operand:
+            return False
+        if op == "$in" and value not in operand:
+            return False
+        if op == "$nin" and value in operand:
+            return False
+    return True
+
+
+def matches_filter(metadata, metadata_filter):
+    """True if `metadata` satisfies every key of a Pinecone-style `filter` dictionary."""
+    return all(_matches_condition(metadata.get(key), condition) for key, condition in metadata_filter.items())
+
+
+def snapshot_version(path, count=None):
+    """Identifies a snapshot's contents by when its IDs were written and how many there are."""
+    if count is None:
+        with open(os.path.join(path, IDS_FILE), "r", encoding="utf-8") as f:
+            count = len(json.load(f))
+    return f"{os.stat(os.path.join(path, IDS_FILE)).st_mtime_ns}:{count}"
+
+
+class LocalVectorIndex:
+    """
+    In-process stand-in for the `belief-embeddings` Pinecone index.
+    Vectors are memory-mapped from a snapshot directory; `query` and `fetch` return objects
+    shaped like Pinecone responses so the `pinecone_operations` search functions work unchanged.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        with open(os.path.join(path, IDS_FILE), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        with open(os.path.join(path, METADATA_FILE), "r", encoding="utf-8") as f:
+            self.metadata = [json.loads(line) for line in f]
+
+        self.row_of = {vid: row for row, vid in enumerate(self.ids)}
+        # Identifies this snapshot's contents (e.g. for the semantic search cache)
+        self.version = snapshot_version(path, len(self.ids))
+        self.norms = np.empty(len(self.vectors), dtype=np.float32)
+        for start in range(0, len(self.vectors), NORM_BLOCK_ROWS):
+            block = np.asarray(self.vectors[start : start + NORM_BLOCK_ROWS], dtype=np.float32)
+            self.norms[start : start + len(block)] = np.linalg.norm(block, axis=1)
+        self.norms[self.norms == 0] = 1.0
+
+        # Row indices per `type`, so the common belief / concept filters skip a metadata scan
+        rows_by_type = {}
+        for row, meta in enumerate(self.metadata):
+            rows_by_type.setdefault(meta.get("type"), []).append(row)
+        self.rows_by_type = {t: np.asarray(rows, dtype=np.int64) for t, rows in rows_by_type.items()}
+
+        logger.info(f"✅ Loaded local vector index from {path} ({len(self.ids)} vectors)")
+
+    def _candidate_rows(self, metadata_filter):
+        if not metadata_filter:
+            return None  # all rows
+
+        type_condition = metadata_filter.get("type")
+        if type_condition is not None:
+            types = [t for t in self.rows_by_type if _matches_condition(t, type_condition)]
+            rows = np.concatenate([self.rows_by_type[t] for t in types]) if types else np.empty(0, dtype=np.int64)
+        else:
+            rows = np.arange(len(self.ids))
+
+        others = {k: v for k, v in metadata_filter.items() if k != "type"}
+        if others:
+            rows = np.asarray([r for r in rows if matches_filter(self.metadata[r], others)], dtype=np.int64)
+        return np.sort(rows)
+
+    def query(self, vector=None, id=None, top_k=10, include_metadata=False, include_values=False, filter=None, **kwargs):
+        """Cosine-similarity search; mirrors `pinecone.Index.query`."""
+        if vector is None:
+            if id not in self.row_of:
+                return {"matches": []}
+            vector = self.vectors[self.row_of[id]]
+
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        rows = self._candidate_rows(filter)
+        if rows is not None and len(rows) == 0:
+            return {"matches": []}
+
+        # Score every row straight off the mmap and select the candidates afterwards: fancy-indexing
+        # the matrix by `rows` would copy most of it on every filtered query.
+        scores = (self.vectors @ query) / self.norms
+        if rows is None:
+            rows = np.arange(len(self.ids))
+        else:
+            scores = scores[rows]
+
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return {"matches": []}
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+
+        matches = []
+        for i in best:
+            row = int(rows[i])
+            match = {"id": self.ids[row], "score": float(scores[i])}
+            if include_metadata:
+                match["metadata"] = self.metadata[row]
+            if include_values:
+                match["values"] = self.vectors[row].tolist()
+            matches.append(match)
+        return {"matches": matches}
+
+    def fetch(self, ids, **kwargs):
+        """Looks vectors up by ID; mirrors `pinecone.Index.fetch`."""
+        vectors = {}
+        for vid in ids:
+            row = self.row_of.get(vid)
+            if row is not None:
+                vectors[vid] = SimpleNamespace(id=vid, values=self.vectors[row].tolist(), metadata=self.metadata[row])
+        return SimpleNamespace(vectors=vectors)
+
+    def describe_index_stats(self):
+        return {"total_vector_count": len(self.ids), "dimension": int(self.vectors.shape[1])}
+
+
+def export_pinecone_index(index, out_dir, dimension=768, batch_size=EXPORT_FETCH_BATCH_SIZE):
+    """
+    Snapshots every vector and its metadata from a Pinecone index into `out_dir`
+    in the format read by `LocalVectorIndex`.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    logger.info("🔍 Listing vector IDs from Pinecone...")
+    all_ids = []
+    for page in index.list():
+        all_ids.extend(page if isinstance(page, list) else [page])
+    all_ids = list(dict.fromkeys(all_ids))
+    logger.info(f"📌 {len(all_ids)} vector IDs to export")
+
+    vectors = np.lib.format.open_memmap(
+        os.path.join(out_dir, VECTORS_FILE), mode="w+", dtype=np.float32, shape=(len(all_ids), dimension)
+    )
+    exported_ids = []
+    with open(os.path.join(out_dir, METADATA_FILE), "w", encoding="utf-8") as meta_file:
+        for i in range(0, len(all_ids), batch_size):
+            batch = all_ids[i : i + batch_size]
+            response = index.fetch(ids=batch)
+            for vid in batch:
+                vdata = response.vectors.get(vid)
+                if vdata is None:
+                    logger.warning(f"⚠️ Vector {vid} disappeared during export, skipping")
+                    continue
+                vectors[len(exported_ids)] = np.asarray(vdata.values, dtype=np.float32)
+                meta_file.write(json.dumps(dict(vdata.metadata or {})) + "\n")
+                exported_ids.append(vid)
+            logger.info(f"✅ Exported {len(exported_ids)}/{len(all_ids)} vectors")
+
+    vectors.flush()
+    del vectors
+    if len(exported_ids) != len(all_ids):
+        # Trim rows reserved for vectors that vanished mid-export
+        trimmed = np.load(os.path.join(out_dir, VECTORS_FILE))[: len(exported_ids)]
+        np.save(os.path.join(out_dir, VECTORS_FILE), trimmed)
+
+    with open(os.path.join(out_dir, IDS_FILE), "w", encoding="utf-8") as f:
+        json.dump(exported_ids, f)
+
+    logger.info(f"🎉 Local vector index written to {out_dir}")
+    return len(exported_ids)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshot the Pinecone index into a local vector index.")
+    parser.add_argument("out_dir", help="directory to write the snapshot to")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_FETCH_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+
+    from LLM_querying.DB_operations.pinecone_operations import get_pinecone_index
+    export_pinecone_index(get_pinecone_index(), args.out_dir, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
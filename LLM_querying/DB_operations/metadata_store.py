@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import sqlite3
+import logging
+import argparse
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Local ID → metadata sidecar (SQLite), read before falling back to a Pinecone fetch
+METADATA_STORE_PATH = os.getenv("METADATA_STORE_PATH", "metadata_store.sqlite")
+
+SQLITE_MAX_VARIABLES = 900  # stay under SQLite's default host-parameter limit
+EXPORT_FETCH_BATCH_SIZE = 100
+
+
+class MetadataStore:
+    """
+    Read-only SQLite file mapping vector IDs to their Pinecone metadata, as of the index version
+    it was exported from (`index_version`, None for stores written without one). Lookups are local
+    reads; IDs missing from the store are simply not found.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        count = self._db.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+        try:
+            row = self._db.execute("SELECT value FROM info WHERE key = 'index_version'").fetchone()
+        except sqlite3.OperationalError:  # written before versions were recorded
+            row = None
+        version = json.loads(row[0]) if row else None
+        self.index_version = tuple(version) if isinstance(version, list) else version
+        logger.info(f"✅ Loaded metadata store from {path} ({count} IDs)")
+
+    def get(self, item_id):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM metadata WHERE id = ?", (item_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, item_ids):
+        """Returns {id: metadata} for every ID found in the store."""
+        unique_ids = list(dict.fromkeys(item_ids))
+        found = {}
+        with self._lock:
+            for i in range(0, len(unique_ids), SQLITE_MAX_VARIABLES):
+                batch = unique_ids[i : i + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" for _ in batch)
+                for item_id, data in self._db.execute(
+                    f"SELECT id, data FROM metadata WHERE id IN ({placeholders})", batch
+                ):
+                    found[item_id] = json.loads(data)
+        return found
+
+
+def write_metadata_store(items, path, index_version=None):
+    """
+    Writes (id, metadata) pairs to a new SQLite store at `path`, replacing any existing file
+    only once the write has completed. `index_version` is the version of the index the items
+    were read from (see `pinecone_operations.get_index_version`).
+    """
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    db = sqlite3.connect(tmp_path)
+    db.execute("CREATE TABLE metadata (id TEXT PRIMARY KEY, data TEXT NOT NULL) WITHOUT ROWID")
+    db.execute("CREATE TABLE info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    db.execute("INSERT INTO info (key, value) VALUES ('index_version', ?)", (json.dumps(index_version),))
+    count = 0
+    for item_id, metadata in items:
+        db.execute("INSERT OR REPLACE INTO metadata (id, data) VALUES (?, ?)",
+                   (item_id, json.dumps(dict(metadata or {}))))
+        count += 1
+        if count % 10000 == 0:
+            logger.info(f"✅ Wrote metadata for {count} IDs")
+    db.commit()
+    db.close()
+
+    os.replace(tmp_path, path)
+    logger.info(f"🎉 Metadata store written to {path} ({count} IDs)")
+    return count
+
+
+def iter_pinecone_metadata(index, batch_size=EXPORT_FETCH_BATCH_SIZE):
+    """Yields (id, metadata) for every vector in a Pinecone index."""
+    logger.info("🔍 Listing vector IDs from Pinecone...")
+    all_ids = []
+    for page in index.list():
+        all_ids.extend(page if isinstance(page, list) else [page])
+    all_ids = list(dict.fromkeys(all_ids))
+    logger.info(f"📌 {len(all_ids)} vector IDs to export")
+
+    for i in range(0, len(all_ids), batch_size):
+        response = index.fetch(ids=all_ids[i : i + batch_size])
+        for vid, vdata in response.vectors.items():
+            yield vid, vdata.metadata
+
+
+def iter_snapshot_metadata(snapshot_dir):
+    """Yields (id, metadata) from a local vector index snapshot, without loading its vectors."""
+    from LLM_querying.DB_operations.local_vector_index import IDS_FILE, METADATA_FILE
+
+    with open(os.path.join(snapshot_dir, IDS_FILE), "r", encoding="utf-8") as f:
+        ids = json.load(f)
+    with open(os.path.join(snapshot_dir, METADATA_FILE), "r", encoding="utf-8") as f:
+        for vid, line in zip(ids, f):
+            yield vid, json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export all vector metadata into a local SQLite store.")
+    parser.add_argument("out_path", nargs="?", default=METADATA_STORE_PATH)
+    parser.add_argument("--from-snapshot", help="read a local vector index snapshot instead of Pinecone")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_FETCH_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+
+    # The version is read before the export, so writes made during it leave the store stale
+    if args.from_snapshot:
+        from LLM_querying.DB_operations.local_vector_index import snapshot_version
+        index_version = snapshot_version(args.from_snapshot)
+        items = iter_snapshot_metadata(args.from_snapshot)
+    else:
+        from LLM_querying.DB_operations.pinecone_operations import get_pinecone_index, read_index_version
+        index = get_pinecone_index()
+        index_version = read_index_version(index)
+        items = iter_pinecone_metadata(index, batch_size=args.batch_size)
+    write_metadata_store(items, args.out_path, index_version=index_version)
+
+
+if __name__ == "__main__":
+    main()
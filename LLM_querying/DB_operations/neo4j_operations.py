@@ -1,7 +1,9 @@
 import os
 import logging
+import threading
 from dotenv import load_dotenv
 from neo4j import GraphDatabase
+from LLM_querying.tracing import traced
 
 # Load environment variables
 load_dotenv()
@@ -10,71 +12,165 @@ load_dotenv()
 NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
-
-# Initialize Neo4j Driver
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+# Longest SIMILAR_TO path `get_concept_path` searches for (0 = unbounded)
+CONCEPT_PATH_MAX_HOPS = int(os.getenv("CONCEPT_PATH_MAX_HOPS", "6"))
 
 # Logging setup
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
-logger.info("✅ Neo4j Driver initialized.")
+
+# Neo4j Driver is created on first use (see `get_driver`)
+_driver = None
+_driver_lock = threading.Lock()
+
+
+def get_driver():
+    """Returns the shared Neo4j driver, creating it on first use."""
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                _driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+                logger.info("✅ Neo4j Driver initialized.")
+    return _driver
+
+
+def warmup_neo4j():
+    """Creates the driver and opens a connection ahead of the first query."""
+    get_driver().verify_connectivity()
+
+# Node labels that carry an indexed `id` property
+NODE_LABELS = ["Concept", "Overloaded_Concept", "Belief"]
+
+
+def _match_node_by_id(variable, parameter):
+    """
+    Cypher subquery binding `variable` to the node whose `id` is `$parameter`, using one
+    label-qualified (index-backed) lookup per label instead of a label-less scan.
+    """
+    branches = "\n        UNION\n".join(
+        f"        MATCH (x:{label} {{id: ${parameter}}}) RETURN x AS {variable}" for label in NODE_LABELS
+    )
+    return f"""
+    CALL {{
+{branches}
+    }}"""
+
+
+### ✅ Schema Bootstrap
+def ensure_indexes():
+    """
+    Creates the `id` property indexes every lookup relies on (idempotent).
+    Run once after ingestion, or at server startup.
+    """
+    with get_driver().session() as session:
+        for label in NODE_LABELS:
+            session.run(f"CREATE INDEX {label.lower()}_id IF NOT EXISTS FOR (n:{label}) ON (n.id)").consume()
+        session.run("CALL db.awaitIndexes()").consume()
+    logger.info(f"✅ Indexes ensured on {', '.join(f'{label}.id' for label in NODE_LABELS)}")
+
 
 ### ✅ Get Nearest Concepts (Includes Overloaded Concepts)
+@traced("neo4j.nearest_concepts")
+def get_nearest_concepts(concept_ids, top_k=5):
+    """
+    Batch variant of `get_nearest_concept`: a single UNWIND query for all IDs.
+    Returns a dictionary mapping each concept ID to its list of related concept IDs.
+    """
+    query = """
+    UNWIND $concept_ids AS concept_id
+    MATCH (c:Concept {id: concept_id})
+    CALL {
+        WITH c
+        MATCH (c)-[:SIMILAR_TO]-(related)
+        WHERE related.type IN ['concept', 'overloaded_concept']
+        RETURN related.id AS related_id
+        LIMIT $top_k
+    }
+    RETURN concept_id, collect(related_id) AS ids
+    """
+    results = {cid: [] for cid in concept_ids}
+    with get_driver().session() as session:
+        for record in session.run(query, concept_ids=list(results), top_k=top_k):
+            results[record["concept_id"]] = record["ids"]
+    return results
+
+
 def get_nearest_concept(concept_id, top_k=5):
     """
     Finds the nearest `top_k` concepts or overloaded concepts to a given concept ID.
     Returns a list of concept IDs.
     """
+    return get_nearest_concepts([concept_id], top_k=top_k)[concept_id]
+
+### ✅ Get Nearest Beliefs
+@traced("neo4j.nearest_beliefs")
+def get_nearest_beliefs(belief_ids, top_k=5):
+    """
+    Batch variant of `get_nearest_belief`: a single UNWIND query for all IDs.
+    Returns a dictionary mapping each belief ID to its list of related belief IDs.
+    """
     query = """
-    MATCH (c:Concept {id: $concept_id})-[:SIMILAR_TO]-(related)
-    WHERE related.type IN ['concept', 'overloaded_concept']
-    RETURN related.id AS id
-    LIMIT $top_k
+    UNWIND $belief_ids AS belief_id
+    MATCH (b:Belief {id: belief_id})
+    CALL {
+        WITH b
+        MATCH (b)-[:SIMILAR_TO]-(related:Belief)
+        RETURN related.id AS related_id
+        LIMIT $top_k
+    }
+    RETURN belief_id, collect(related_id) AS ids
     """
-    with driver.session() as session:
-        results = session.run(query, concept_id=concept_id, top_k=top_k)
-        return [record["id"] for record in results]
+    results = {bid: [] for bid in belief_ids}
+    with get_driver().session() as session:
+        for record in session.run(query, belief_ids=list(results), top_k=top_k):
+            results[record["belief_id"]] = record["ids"]
+    return results
+
 
-### ✅ Get Nearest Beliefs
 def get_nearest_belief(belief_id, top_k=5):
     """
     Finds the nearest `top_k` beliefs to a given belief ID.
     Returns a list of belief IDs.
     """
-    query = """
-    MATCH (b:Belief {id: $belief_id})-[:SIMILAR_TO]-(related:Belief)
-    RETURN related.id AS id
-    LIMIT $top_k
-    """
-    with driver.session() as session:
-        results = session.run(query, belief_id=belief_id, top_k=top_k)
-        return [record["id"] for record in results]
+    return get_nearest_beliefs([belief_id], top_k=top_k)[belief_id]
 
 ### ✅ Get Shortest Path Between Two Nodes
-def get_shortest_path(node1_id, node2_id):
+@traced("neo4j.shortest_path")
+def get_shortest_path(node1_id, node2_id, max_length=None):
     """
-    Finds the shortest path (using `SIMILAR_TO`) between two nodes.
+    Finds the shortest path (using `SIMILAR_TO`) between two nodes, optionally at most `max_length` hops.
     Returns a list of node IDs along the path.
     """
-    query = """
-    MATCH (start {id: $node1_id}), (end {id: $node2_id}),
-    p = shortestPath((start)-[:SIMILAR_TO*]-(end))
+    hops = f"*..{int(max_length)}" if max_length else "*"
+    query = f"""
+    {_match_node_by_id("start", "node1_id")}
+    {_match_node_by_id("end", "node2_id")}
+    MATCH p = shortestPath((start)-[:SIMILAR_TO{hops}]-(end))
     RETURN [node in nodes(p) | node.id] AS path_ids
     """
-    with driver.session() as session:
+    with get_driver().session() as session:
         result = session.run(query, node1_id=node1_id, node2_id=node2_id)
         return result.single()["path_ids"] if result.peek() else []
 
 ### ✅ Get All Nodes Within a Certain Distance
+@traced("neo4j.within_distance")
 def get_nodes_within_distance(node_id, distance):
     """
     Finds all nodes within `distance` edges from the given node.
     Returns a list of node IDs.
     """
+    distance = int(distance)  # interpolated into the pattern, so it must be a plain integer
     query = f"""
-    MATCH (n {{id: $node_id}})-[:SIMILAR_TO*1..{distance}]-(related)
+    {_match_node_by_id("n", "node_id")}
+    MATCH (n)-[:SIMILAR_TO*1..{distance}]-(related)
     RETURN DISTINCT related.id AS id
     """
-    with driver.session() as session:
+    with get_driver().session() as session:
         results = session.run(query, node_id=node_id)
         return [record["id"] for record in results]
+
+
+if __name__ == "__main__":
+    # Schema bootstrap: python -m LLM_querying.DB_operations.neo4j_operations
+    ensure_indexes()
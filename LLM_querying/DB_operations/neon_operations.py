@@ -1,29 +1,207 @@
 import os
+import time
+import queue
+import threading
 import psycopg2
 import logging
+from contextlib import contextmanager
+from collections import OrderedDict
 from dotenv import load_dotenv
-from LLM_querying.DB_operations.pinecone_operations import get_metadata  # Import Pinecone operations
+from LLM_querying.DB_operations.pinecone_operations import get_metadata_batch  # Import Pinecone operations
+from LLM_querying.tracing import span, traced, count
 
 # Load environment variables
 load_dotenv()
 
-# Get Neon PostgreSQL URL
+# Get Neon PostgreSQL URL (checked when the pool is first created)
 DATABASE_URL = os.getenv("NEON_URL")
 
-# Ensure the URL is set
-if not DATABASE_URL:
-    raise ValueError("NEON_URL is not set in environment variables")
+# Connection pool config
+NEON_POOL_SIZE = int(os.getenv("NEON_POOL_SIZE", "5"))
+NEON_POOL_TIMEOUT = float(os.getenv("NEON_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+NEON_POOL_HEALTHCHECK_INTERVAL = float(os.getenv("NEON_POOL_HEALTHCHECK_INTERVAL", "30"))  # idle seconds before `SELECT 1`
 
 # Logging setup
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-# Establish database connection
+
+class NeonConnectionPool:
+    """
+    Thread-safe pool of Neon connections.
+    Connections are created on demand up to `max_size`, health-checked when they have been idle,
+    and replaced transparently when they turn out to be broken.
+    """
+
+    def __init__(self, dsn, max_size=NEON_POOL_SIZE, timeout=NEON_POOL_TIMEOUT,
+                 healthcheck_interval=NEON_POOL_HEALTHCHECK_INTERVAL):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+
+        self._idle = queue.LifoQueue()  # (connection, last_used) — LIFO keeps warm connections warm
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._stats = {
+            "checkouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "connections_created": 0,
+            "connections_discarded": 0,
+            "healthchecks_failed": 0,
+            "in_use": 0,
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, sslmode="require")
+        with self._lock:
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._stats["connections_discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._lock:
+                self._stats["healthchecks_failed"] += 1
+            return False
+
+    def _acquire(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise TimeoutError(f"No Neon connection available after {self.timeout}s (pool size {self.max_size})")
+        waited = time.monotonic() - start
+
+        try:
+            conn = None
+            while conn is None:
+                try:
+                    candidate, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    conn = self._connect()
+                    break
+                if self._is_healthy(candidate, last_used):
+                    conn = candidate
+                else:
+                    logger.warning("⚠️ Dropping broken Neon connection, reconnecting...")
+                    self._discard(candidate)
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+        return conn
+
+    def _release(self, conn, broken=False):
+        try:
+            if broken or conn.closed:
+                self._discard(conn)
+            else:
+                self._idle.put((conn, time.monotonic()))
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrows a connection; commits on success, rolls back on error and returns it to the pool."""
+        with span("neon.pool_checkout"):
+            conn = self._acquire()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except Exception:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        finally:
+            self._release(conn, broken=broken)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["idle"] = self._idle.qsize()
+        snapshot["max_size"] = self.max_size
+        snapshot["wait_time_avg"] = (
+            snapshot["wait_time_total"] / snapshot["checkouts"] if snapshot["checkouts"] else 0.0
+        )
+        return snapshot
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
+
+# The pool is created on first use (see `get_pool`)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the shared connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Ensure the URL is set
+                if not DATABASE_URL:
+                    raise ValueError("NEON_URL is not set in environment variables")
+                _pool = NeonConnectionPool(DATABASE_URL)
+    return _pool
+
+
+# Borrow a pooled database connection (use as `with get_connection() as conn:`)
 def get_connection():
-    return psycopg2.connect(DATABASE_URL, sslmode="require")
+    return get_pool().connection()
+
+
+def get_pool_stats():
+    """Returns a snapshot of connection pool statistics (checkouts, wait times, connections created...)."""
+    return get_pool().stats()
+
+
+def warmup_neon():
+    """Opens a pooled connection ahead of the first query."""
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT 1")
 
 
 ### **🔍 Generic Document Metadata Retrieval Methods**
+@traced("neon.get_mistral_output")
 def get_mistral_output(sep_id):
     """Retrieves the full `mistral_output` JSON for a given `sep_id`."""
     query = "SELECT mistral_output FROM sep_embeddings WHERE id = %s"
@@ -35,6 +213,7 @@ def get_mistral_output(sep_id):
     return result[0] if result else None
 
 
+@traced("neon.get_title")
 def get_title(sep_id):
     """Retrieves the title of the document for a given `sep_id`."""
     query = "SELECT title FROM sep_embeddings WHERE id = %s"
@@ -46,6 +225,7 @@ def get_title(sep_id):
     return result[0] if result else None
 
 
+@traced("neon.get_section")
 def get_section(sep_id):
     """Retrieves the section name of the document for a given `sep_id`."""
     query = "SELECT section FROM sep_embeddings WHERE id = %s"
@@ -57,6 +237,7 @@ def get_section(sep_id):
     return result[0] if result else None
 
 
+@traced("neon.get_content")
 def get_content(sep_id):
     """Retrieves the main content of the document for a given `sep_id`."""
     query = "SELECT content FROM sep_embeddings WHERE id = %s"
@@ -68,108 +249,152 @@ def get_content(sep_id):
     return result[0] if result else None
 
 
-### **🔍 Belief & Concept Retrieval Methods Using Pinecone**
-def get_beliefs_in_document(belief_id):
+def _to_db_id(sep_id):
+    """Pinecone stores numeric metadata as floats (e.g. `13769.0`); the table key is an integer."""
+    try:
+        return int(float(sep_id))
+    except (TypeError, ValueError):
+        return sep_id
+
+
+def get_titles_and_contents(sep_ids):
     """
-    Given a belief ID, fetches the SEP ID from Pinecone metadata and retrieves associated beliefs.
+    Retrieves title and content for many documents in one query.
+    Returns a dictionary mapping each found `sep_id` (as passed in) to a `(title, content)` tuple.
     """
-    # **Step 1: Fetch `sep_id` from Pinecone**
-    metadata = get_metadata(belief_id)
-    if not metadata or "sep_id" not in metadata:
-        logger.error(f"❌ No SEP ID found for belief {belief_id}")
-        return []
-
-    sep_id = metadata["sep_id"]
+    unique_ids = list(dict.fromkeys(s for s in sep_ids if s is not None))
+    if not unique_ids:
+        return {}
 
-    # **Step 2: Retrieve `mistral_output` JSON from Neon**
-    mistral_json = get_mistral_output(sep_id)
-    if not mistral_json:
-        logger.error(f"❌ No document found for SEP ID {sep_id}")
-        return []
+    query = "SELECT id, title, content FROM sep_embeddings WHERE id = ANY(%s)"
 
-    # **Step 3: Extract Beliefs from JSON**
-    if "key_beliefs" in mistral_json:
-        beliefs = [belief["belief"] for belief in mistral_json["key_beliefs"]]
-        return beliefs
+    with span("neon.titles_and_contents", ids=len(unique_ids)) as sp, \
+            get_connection() as conn, conn.cursor() as cur:
+        cur.execute(query, ([_to_db_id(s) for s in unique_ids],))
+        rows = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+        sp.set(rows=len(rows))
 
-    logger.info(f"🔍 No beliefs found in document {sep_id}")
-    return []
+    return {s: rows[_to_db_id(s)] for s in unique_ids if _to_db_id(s) in rows}
 
 
-def get_concepts_in_document(belief_id):
+### **🔍 Belief & Concept Retrieval Methods Using Pinecone**
+# Facet name → (`mistral_output` key, extractor for that key's value)
+DOCUMENT_FACETS = {
+    "beliefs": ("key_beliefs", lambda value: [belief["belief"] for belief in value]),
+    "concepts": ("key_concepts", lambda value: [concept["name"] for concept in value]),
+    "thinkers": ("associated_thinkers", lambda value: value),
+    "eras": ("associated_eras", lambda value: value),
+}
+DOCUMENT_FACET_CACHE_SIZE = int(os.getenv("DOCUMENT_FACET_CACHE_SIZE", "2048"))  # documents kept per process
+
+# Per-`sep_id` facet cache shared by every facet getter: {sep_id: {facet: value}}
+_facet_cache = OrderedDict()
+_facet_cache_lock = threading.Lock()
+
+
+def _cached_facets(sep_id):
+    with _facet_cache_lock:
+        entry = _facet_cache.get(sep_id)
+        if entry is not None:
+            _facet_cache.move_to_end(sep_id)
+            return dict(entry)
+    return {}
+
+
+def _cache_facets(sep_id, facets):
+    with _facet_cache_lock:
+        entry = _facet_cache.setdefault(sep_id, {})
+        entry.update(facets)
+        _facet_cache.move_to_end(sep_id)
+        while len(_facet_cache) > DOCUMENT_FACET_CACHE_SIZE:
+            _facet_cache.popitem(last=False)
+
+
+def get_facets_by_sep_id(sep_ids, facets=tuple(DOCUMENT_FACETS)):
     """
-    Given a belief ID, fetches the SEP ID from Pinecone metadata and retrieves associated concepts.
+    Retrieves the requested facets of many documents, projecting only the needed `mistral_output`
+    keys in SQL and answering from the per-`sep_id` cache where possible.
+    Returns {sep_id: {facet: list}} for every document found (facets absent from the JSON are `[]`).
+    """
+    unknown = [f for f in facets if f not in DOCUMENT_FACETS]
+    if unknown:
+        raise ValueError(f"Unknown document facets: {unknown}")
+
+    results, missing = {}, {}
+    for sep_id in dict.fromkeys(s for s in sep_ids if s is not None):
+        cached = _cached_facets(_to_db_id(sep_id))
+        results[sep_id] = {f: cached[f] for f in facets if f in cached}
+        if len(results[sep_id]) < len(facets):
+            missing[sep_id] = [f for f in facets if f not in cached]
+
+    count("neon.facet_cache_hits", len(results) - len(missing))
+    if missing:
+        wanted = [f for f in facets if any(f in m for m in missing.values())]
+        columns = ", ".join("mistral_output -> %s" for _ in wanted)
+        query = f"SELECT id, {columns} FROM sep_embeddings WHERE id = ANY(%s)"
+        params = [DOCUMENT_FACETS[f][0] for f in wanted] + [[_to_db_id(s) for s in missing]]
+
+        with span("neon.facets", ids=len(missing), facets=len(wanted)) as sp, \
+                get_connection() as conn, conn.cursor() as cur:
+            cur.execute(query, params)
+            rows = {row[0]: row[1:] for row in cur.fetchall()}
+            sp.set(rows=len(rows))
+
+        for sep_id in missing:
+            row = rows.get(_to_db_id(sep_id))
+            if row is None:
+                logger.error(f"❌ No document found for SEP ID {sep_id}")
+                del results[sep_id]
+                continue
+            fetched = {f: DOCUMENT_FACETS[f][1](value) if value else [] for f, value in zip(wanted, row)}
+            _cache_facets(_to_db_id(sep_id), fetched)
+            results[sep_id] = {f: results[sep_id][f] if f in results[sep_id] else fetched[f] for f in facets}
+
+    return results
+
+
+def get_document_facets(belief_ids, facets=tuple(DOCUMENT_FACETS)):
     """
-    # **Step 1: Fetch `sep_id` from Pinecone**
-    metadata = get_metadata(belief_id)
-    if not metadata or "sep_id" not in metadata:
-        logger.error(f"❌ No SEP ID found for belief {belief_id}")
-        return []
+    Given belief IDs, resolves their SEP IDs with one Pinecone fetch and retrieves the requested
+    facets (any of "beliefs", "concepts", "thinkers", "eras") of their documents in one query.
+    Returns {belief_id: {facet: list}}; beliefs without a SEP ID or document get empty lists.
+    """
+    metadata = get_metadata_batch(belief_ids)
+    sep_ids = {}
+    for belief_id in belief_ids:
+        sep_id = (metadata.get(belief_id) or {}).get("sep_id")
+        if sep_id is None:
+            logger.error(f"❌ No SEP ID found for belief {belief_id}")
+        sep_ids[belief_id] = sep_id
 
-    sep_id = metadata["sep_id"]
+    documents = get_facets_by_sep_id(sep_ids.values(), facets)
+    empty = {f: [] for f in facets}
+    return {belief_id: dict(documents.get(sep_id, empty)) for belief_id, sep_id in sep_ids.items()}
 
-    # **Step 2: Retrieve `mistral_output` JSON from Neon**
-    mistral_json = get_mistral_output(sep_id)
-    if not mistral_json:
-        logger.error(f"❌ No document found for SEP ID {sep_id}")
-        return []
 
-    # **Step 3: Extract Concepts from JSON**
-    if "key_concepts" in mistral_json:
-        concepts = [concept["name"] for concept in mistral_json["key_concepts"]]
-        return concepts
+def get_beliefs_in_document(belief_id):
+    """
+    Given a belief ID, fetches the SEP ID from Pinecone metadata and retrieves associated beliefs.
+    """
+    return get_document_facets([belief_id], ["beliefs"])[belief_id]["beliefs"]
 
-    logger.info(f"🔍 No concepts found in document {sep_id}")
-    return []
+
+def get_concepts_in_document(belief_id):
+    """
+    Given a belief ID, fetches the SEP ID from Pinecone metadata and retrieves associated concepts.
+    """
+    return get_document_facets([belief_id], ["concepts"])[belief_id]["concepts"]
 
 
 def get_associated_thinkers(belief_id):
     """
     Given a belief ID, fetches the SEP ID from Pinecone metadata and retrieves associated thinkers.
     """
-    # **Step 1: Fetch `sep_id` from Pinecone**
-    metadata = get_metadata(belief_id)
-    if not metadata or "sep_id" not in metadata:
-        logger.error(f"❌ No SEP ID found for belief {belief_id}")
-        return []
-
-    sep_id = metadata["sep_id"]
-
-    # **Step 2: Retrieve `mistral_output` JSON from Neon**
-    mistral_json = get_mistral_output(sep_id)
-    if not mistral_json:
-        logger.error(f"❌ No document found for SEP ID {sep_id}")
-        return []
-
-    # **Step 3: Extract Thinkers from JSON**
-    if "associated_thinkers" in mistral_json:
-        return mistral_json["associated_thinkers"]
-
-    logger.info(f"🔍 No associated thinkers found in document {sep_id}")
-    return []
+    return get_document_facets([belief_id], ["thinkers"])[belief_id]["thinkers"]
 
 
 def get_associated_eras(belief_id):
     """
     Given a belief ID, fetches the SEP ID from Pinecone metadata and retrieves associated eras.
     """
-    # **Step 1: Fetch `sep_id` from Pinecone**
-    metadata = get_metadata(belief_id)
-    if not metadata or "sep_id" not in metadata:
-        logger.error(f"❌ No SEP ID found for belief {belief_id}")
-        return []
-
-    sep_id = metadata["sep_id"]
-
-    # **Step 2: Retrieve `mistral_output` JSON from Neon**
-    mistral_json = get_mistral_output(sep_id)
-    if not mistral_json:
-        logger.error(f"❌ No document found for SEP ID {sep_id}")
-        return []
-
-    # **Step 3: Extract Eras from JSON**
-    if "associated_eras" in mistral_json:
-        return mistral_json["associated_eras"]
-
-    logger.info(f"🔍 No associated eras found in document {sep_id}")
-    return []
+    return get_document_facets([belief_id], ["eras"])[belief_id]["eras"]
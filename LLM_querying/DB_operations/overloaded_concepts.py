@@ -0,0 +1,392 @@
+import re
+import sys
+import json
+import hashlib
+import logging
+import argparse
+import unicodedata
+from itertools import zip_longest
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Maintenance config
+MERGE_BATCH_SIZE = 500  # groups per Neo4j transaction
+PINECONE_BATCH_SIZE = 100
+PINECONE_DELETE_BATCH_SIZE = 1000
+SYNONYM_THRESHOLD = 0.95  # cosine at or above which two concepts are merged when clustering
+SYNONYM_CANDIDATES = 5  # nearest concepts checked per concept when clustering
+
+
+def normalize_concept_name(name):
+    """Case, accent, punctuation and whitespace-insensitive form of a concept name."""
+    name = unicodedata.normalize("NFKD", name or "")
+    name = "".join(ch for ch in name if not unicodedata.combining(ch))
+    name = re.sub(r"[^\w\s]", " ", name.casefold())
+    return re.sub(r"\s+", " ", name).strip()
+
+
+def name_key(name):
+    """Fixed-size hashed key of a normalized concept name (stored as `name_key` on nodes)."""
+    return hashlib.sha1(normalize_concept_name(name).encode("utf-8")).hexdigest()[:16]
+
+
+def sep_key(sep_id):
+    """Canonical string form of a SEP id, which nodes store as an int, a float or a string."""
+    try:
+        return str(int(float(sep_id)))
+    except (TypeError, ValueError):
+        return str(sep_id)
+
+
+def overloaded_vector_id(sep_ids, name):
+    """Same shape as the original `{sep_id}_overloaded_concept_{hash(name) % 1000000}`, but stable across runs."""
+    return f"{sep_ids[0]}_overloaded_concept_{int(hashlib.md5(name.encode('utf-8')).hexdigest(), 16) % 1000000}"
+
+
+### 🔍 Reading the current state
+CONCEPT_FIELDS = "n.id AS id, n.concept AS name, n.sep_id AS sep_id, n.document_title AS document_title"
+OVERLOADED_FIELDS = ("n.id AS id, n.name AS name, n.sep_ids AS sep_ids, "
+                     "n.document_titles AS document_titles, n.vector_ids AS vector_ids")
+
+
+def _read_nodes(session, where="", **params):
+    nodes = []
+    for record in session.run(f"MATCH (n:Concept) {where} RETURN {CONCEPT_FIELDS}", **params):
+        nodes.append(dict(record, kind="concept"))
+    for record in session.run(f"MATCH (n:Overloaded_Concept) {where} RETURN {OVERLOADED_FIELDS}", **params):
+        nodes.append(dict(record, kind="overloaded"))
+    for node in nodes:
+        node["key"] = name_key(node["name"])
+    return nodes
+
+
+def ensure_name_keys(driver, batch_size=MERGE_BATCH_SIZE):
+    """
+    One-off backfill: indexes `name_key` on Concept / Overloaded_Concept and sets it on every node
+    that lacks it. Later runs can then look duplicates up by key instead of scanning the graph.
+    """
+    with driver.session() as session:
+        for label in ("Concept", "Overloaded_Concept"):
+            session.run(f"CREATE INDEX {label.lower()}_name_key IF NOT EXISTS FOR (n:{label}) ON (n.name_key)").consume()
+            name_field = "concept" if label == "Concept" else "name"
+            missing = [(r["id"], r["name"]) for r in session.run(
+                f"MATCH (n:{label}) WHERE n.name_key IS NULL RETURN n.id AS id, n.{name_field} AS name"
+            )]
+            for i in range(0, len(missing), batch_size):
+                rows = [{"id": node_id, "key": name_key(name)} for node_id, name in missing[i : i + batch_size]]
+                session.execute_write(lambda tx: tx.run(
+                    f"UNWIND $rows AS row MATCH (n:{label} {{id: row.id}}) SET n.name_key = row.key", rows=rows
+                ).consume())
+            logger.info(f"✅ name_key set on {len(missing)} {label} nodes")
+        session.run("CALL db.awaitIndexes()").consume()
+
+
+def load_nodes(driver, concept_ids=None, write_keys=True):
+    """
+    Reads the concept nodes a run needs: every Concept / Overloaded_Concept, or, for an
+    incremental run, `concept_ids` plus every node sharing a `name_key` with them.
+    With `write_keys=False` (dry runs) nothing is written: related nodes are found by scanning
+    and keying names in Python rather than through the stored (possibly unset) `name_key`.
+    """
+    with driver.session() as session:
+        if concept_ids is None:
+            return _read_nodes(session)
+        seeds = _read_nodes(session, "WHERE n.id IN $ids", ids=list(concept_ids))
+        keys = sorted({node["key"] for node in seeds})
+        if write_keys:
+            # Key the seeds too, so later runs find them through the name_key index
+            rows = [{"id": node["id"], "key": node["key"]} for node in seeds]
+            session.execute_write(lambda tx: tx.run(
+                "UNWIND $rows AS row MATCH (n:Concept|Overloaded_Concept {id: row.id}) SET n.name_key = row.key", rows=rows
+            ).consume())
+            related = _read_nodes(session, "WHERE n.name_key IN $keys", keys=keys)
+        else:
+            wanted = set(keys)
+            related = [node for node in _read_nodes(session) if node["key"] in wanted]
+    return list({node["id"]: node for node in seeds + related}.values())
+
+
+### 🧮 Planning merges locally
+def synonym_links(index, node_ids, threshold=SYNONYM_THRESHOLD, candidates=SYNONYM_CANDIDATES):
+    """
+    Pairs of concept IDs whose embeddings (from a local vector index) have cosine similarity of
+    at least `threshold`, found with the blocked kNN used for SIMILAR_TO edges.
+    """
+    from LLM_querying.DB_operations.similarity_edges import top_k_neighbors
+
+    concept_types = ("concept", "overloaded_concept")
+    target_rows = np.asarray([r for r, m in enumerate(index.metadata) if m.get("type") in concept_types], dtype=np.int64)
+    source_rows = np.asarray([index.row_of[i] for i in node_ids if i in index.row_of], dtype=np.int64)
+    no_sep = np.full(len(index.ids), np.nan)
+
+    neighbors, scores = top_k_neighbors(index.vectors, no_sep, source_rows, target_rows,
+                                        [[] for _ in source_rows], k=candidates)
+    links = []
+    for source, row_neighbors, row_scores in zip(source_rows, neighbors, scores):
+        for target, score in zip(row_neighbors, row_scores):
+            if target >= 0 and score >= threshold:
+                links.append((index.ids[source], index.ids[target]))
+    logger.info(f"🔗 {len(links)} near-synonym links at cosine >= {threshold}")
+    return links
+
+
+def plan_merges(nodes, links=()):
+    """
+    Groups nodes sharing a name key (and joined by `links`) and returns one merge per group that
+    needs work: `{"target", "create", "name", "sep_ids", "document_titles", "vector_ids", "absorb"}`.
+    `absorb` lists the (id, kind) nodes that fold into `target` and disappear.
+    """
+    by_id = {node["id"]: node for node in nodes}
+    parent = {node_id: node_id for node_id in by_id}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(a, b):
+        parent[find(a)] = find(b)
+
+    first_by_key = {}
+    for node in nodes:
+        if node["key"] in first_by_key:
+            union(node["id"], first_by_key[node["key"]])
+        else:
+            first_by_key[node["key"]] = node["id"]
+    for a, b in links:
+        if a in by_id and b in by_id:
+            union(a, b)
+
+    groups = {}
+    for node in nodes:
+        groups.setdefault(find(node["id"]), []).append(node)
+
+    merges = []
+    for members in groups.values():
+        overloaded = sorted((n for n in members if n["kind"] == "overloaded"), key=lambda n: n["id"])
+        concepts = sorted((n for n in members if n["kind"] == "concept"), key=lambda n: n["id"])
+        if (not concepts and len(overloaded) < 2) or (not overloaded and len(concepts) < 2):
+            continue  # nothing to merge: a lone concept or a lone overloaded concept
+
+        target = overloaded[0] if overloaded else None
+        sources, vector_ids = [], []
+        for node in overloaded:
+            sources += zip_longest(node["sep_ids"] or [], node["document_titles"] or [])
+            vector_ids += list(node["vector_ids"] or [])
+        for node in concepts:
+            sources.append((node["sep_id"], node["document_title"]))
+            vector_ids.append(node["id"])
+        # A re-extracted section brings back a concept (same sep_id, same vector ID) that an
+        # earlier run already folded in; list each section and vector once
+        by_sep = {}
+        for sep_id, title in sources:
+            by_sep.setdefault(sep_key(sep_id), (sep_id, title))
+        sep_ids, titles = [sep_id for sep_id, _ in by_sep.values()], [title for _, title in by_sep.values()]
+        vector_ids = list(dict.fromkeys(vector_ids))
+
+        name = target["name"] if target else concepts[0]["name"]
+        merges.append({
+            "target": target["id"] if target else overloaded_vector_id(sep_ids, name),
+            "create": target is None,
+            "name": name,
+            "key": name_key(name),
+            "sep_ids": sep_ids,
+            "document_titles": titles,
+            "vector_ids": vector_ids,
+            "master_vector": None if target else concepts[0]["id"],
+            "absorb": [(n["id"], n["kind"]) for n in overloaded[1:] + concepts],
+        })
+    logger.info(f"🧮 Planned {len(merges)} merges "
+                f"({sum(m['create'] for m in merges)} new overloaded concepts, "
+                f"{sum(len(m['absorb']) for m in merges)} nodes absorbed)")
+    return merges
+
+
+### 💾 Applying the delta
+def apply_neo4j(driver, merges, batch_size=MERGE_BATCH_SIZE):
+    """
+    Creates / updates the Overloaded_Concept nodes, moves the SIMILAR_TO edges of absorbed nodes
+    onto them (instead of dropping them) and deletes the absorbed nodes, one transaction per batch.
+    """
+    upsert_query = """
+    UNWIND $merges AS m
+    MERGE (o:Overloaded_Concept {id: m.target})
+    SET o.name = m.name, o.name_key = m.key, o.type = "overloaded_concept",
+        o.sep_ids = m.sep_ids, o.document_titles = m.document_titles, o.vector_ids = m.vector_ids
+    """
+    move_query = """
+    UNWIND $moves AS mv
+    MATCH (o:Overloaded_Concept {{id: mv.target}})
+    MATCH (c:{label} {{id: mv.source}})
+    CALL {{
+        WITH c, o
+        MATCH (c)-[r:SIMILAR_TO]->(x) WHERE x <> o
+        MERGE (o)-[n:SIMILAR_TO]->(x) SET n.weight = coalesce(n.weight, r.weight)
+    }}
+    CALL {{
+        WITH c, o
+        MATCH (x)-[r:SIMILAR_TO]->(c) WHERE x <> o
+        MERGE (x)-[n:SIMILAR_TO]->(o) SET n.weight = coalesce(n.weight, r.weight)
+    }}
+    DETACH DELETE c
+    """
+
+    def write(tx, batch):
+        tx.run(upsert_query, merges=batch).consume()
+        for kind, label in (("concept", "Concept"), ("overloaded", "Overloaded_Concept")):
+            moves = [{"target": m["target"], "source": node_id} for m in batch for node_id, k in m["absorb"] if k == kind]
+            if moves:
+                tx.run(move_query.format(label=label), moves=moves).consume()
+
+    with driver.session() as session:
+        for i in range(0, len(merges), batch_size):
+            batch = merges[i : i + batch_size]
+            session.execute_write(write, batch)
+            logger.info(f"✅ Neo4j: applied {i + len(batch)}/{len(merges)} merges")
+
+
+def apply_pinecone_upserts(index, merges):
+    """Writes the merged vectors: a new one (copied from the master concept) per created group, metadata updates otherwise."""
+    creates = [m for m in merges if m["create"]]
+    for i in range(0, len(creates), PINECONE_BATCH_SIZE):
+        batch = creates[i : i + PINECONE_BATCH_SIZE]
+        fetched = index.fetch(ids=[m["master_vector"] for m in batch]).vectors
+        vectors = []
+        for m in batch:
+            master = fetched.get(m["master_vector"])
+            if master is None:
+                logger.warning(f"⚠️ No vector for {m['master_vector']}, skipping overloaded concept '{m['name']}'")
+                continue
+            vectors.append((m["target"], list(master.values), _overloaded_metadata(m)))
+        if vectors:
+            index.upsert(vectors=vectors)
+        logger.info(f"✅ Pinecone: upserted {len(vectors)} overloaded concept vectors")
+
+    for m in merges:
+        if not m["create"]:
+            index.update(id=m["target"], set_metadata=_overloaded_metadata(m))
+
+
+def _overloaded_metadata(merge):
+    return {
+        "type": "overloaded_concept",
+        "concept": merge["name"],
+        "sep_ids": [sep_key(s) for s in merge["sep_ids"] if s is not None],
+        "document_titles": [t for t in merge["document_titles"] if t is not None],
+        "original_vector_ids": merge["vector_ids"],
+    }
+
+
+def apply_pinecone_deletes(index, merges):
+    stale = [node_id for m in merges for node_id, _ in m["absorb"]]
+    for i in range(0, len(stale), PINECONE_DELETE_BATCH_SIZE):
+        index.delete(ids=stale[i : i + PINECONE_DELETE_BATCH_SIZE])
+    logger.info(f"❌ Pinecone: deleted {len(stale)} absorbed vectors")
+
+
+def prune_sections(driver, index, sep_ids):
+    """
+    Removes deleted SEP sections from the Overloaded_Concept nodes that list them, in Neo4j and in
+    the Pinecone metadata; overloaded concepts left without any section are deleted. Returns
+    (the updated entries, the deleted IDs). The caller stamps the index version.
+    """
+    gone = sorted({sep_key(s) for s in sep_ids})
+    if not gone:
+        return [], []
+    with driver.session() as session:
+        nodes = [dict(record) for record in session.run(f"""
+            MATCH (n:Overloaded_Concept)
+            WHERE any(s IN n.sep_ids WHERE toString(toInteger(toFloat(s))) IN $gone)
+            RETURN {OVERLOADED_FIELDS}
+        """, gone=gone)]
+
+        gone = set(gone)
+        updates, removed = [], []
+        for node in nodes:
+            sources = [(sep_id, title) for sep_id, title in zip_longest(node["sep_ids"] or [], node["document_titles"] or [])
+                       if sep_key(sep_id) not in gone]
+            if not sources:
+                removed.append(node["id"])
+                continue
+            updates.append({
+                "target": node["id"],
+                "name": node["name"],
+                "sep_ids": [sep_id for sep_id, _ in sources],
+                "document_titles": [title for _, title in sources],
+                "vector_ids": [v for v in node["vector_ids"] or [] if v.split("_", 1)[0] not in gone],
+            })
+
+        def write(tx):
+            tx.run("""
+                UNWIND $updates AS m
+                MATCH (o:Overloaded_Concept {id: m.target})
+                SET o.sep_ids = m.sep_ids, o.document_titles = m.document_titles, o.vector_ids = m.vector_ids
+            """, updates=updates).consume()
+            tx.run("UNWIND $ids AS id MATCH (o:Overloaded_Concept {id: id}) DETACH DELETE o", ids=removed).consume()
+
+        session.execute_write(write)
+
+    for m in updates:
+        index.update(id=m["target"], set_metadata=_overloaded_metadata(m))
+    for i in range(0, len(removed), PINECONE_DELETE_BATCH_SIZE):
+        index.delete(ids=removed[i : i + PINECONE_DELETE_BATCH_SIZE])
+    logger.info(f"✂️ Pruned {len(gone)} deleted sections: {len(updates)} overloaded concepts updated, "
+                f"{len(removed)} deleted")
+    return updates, removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally merge duplicate concepts into Overloaded_Concept nodes.")
+    parser.add_argument("--sources", help="only consider these concept IDs (one per line, or a sync manifest)")
+    parser.add_argument("--cluster-index", help="local vector index to also merge near-synonyms by embedding")
+    parser.add_argument("--threshold", type=float, default=SYNONYM_THRESHOLD)
+    parser.add_argument("--plan-out", help="write the planned merges to this JSON file")
+    parser.add_argument("--dry-run", action="store_true", help="plan only, do not touch Neo4j or Pinecone")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+
+    from LLM_querying.DB_operations.neo4j_operations import get_driver
+    from LLM_querying.DB_operations.pinecone_operations import get_pinecone_index, stamp_index_version
+    driver = get_driver()
+
+    source_ids = None
+    if args.sources:
+        with open(args.sources, "r", encoding="utf-8") as f:
+            text = f.read()
+        source_ids = json.loads(text)["nodes_needing_edges"] if args.sources.endswith(".json") else text.split()
+    elif not args.dry_run:
+        ensure_name_keys(driver)
+
+    nodes = load_nodes(driver, source_ids, write_keys=not args.dry_run)
+    links = []
+    if args.cluster_index:
+        from LLM_querying.DB_operations.local_vector_index import LocalVectorIndex
+        index = LocalVectorIndex(args.cluster_index)
+        links = synonym_links(index, source_ids or [n["id"] for n in nodes], threshold=args.threshold)
+        linked = {node_id for link in links for node_id in link} - {n["id"] for n in nodes}
+        if linked:
+            nodes += load_nodes(driver, sorted(linked), write_keys=not args.dry_run)
+
+    merges = plan_merges(nodes, links)
+    if args.plan_out:
+        with open(args.plan_out, "w", encoding="utf-8") as f:
+            json.dump(merges, f, indent=2)
+        logger.info(f"📝 Plan written to {args.plan_out}")
+    if args.dry_run or not merges:
+        return
+
+    pinecone_index = get_pinecone_index()
+    apply_pinecone_upserts(pinecone_index, merges)
+    apply_neo4j(driver, merges)
+    apply_pinecone_deletes(pinecone_index, merges)
+    stamp_index_version(pinecone_index)  # drops search results cached from the old concepts
+    logger.info("🎉 Overloaded concepts up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
 import os
 import logging
 import sys
+import time
+import uuid
+import threading
 from dotenv import load_dotenv
-from pinecone import Pinecone
-from sentence_transformers import SentenceTransformer
+from LLM_querying.embedding_cache import EmbeddingCache
+from LLM_querying.semantic_cache import SemanticCache, SEARCH_CACHE, SEARCH_CACHE_SIZE
+from LLM_querying.DB_operations.metadata_store import MetadataStore, METADATA_STORE_PATH
+from LLM_querying.tracing import span, count
 
 # Load environment variables
 load_dotenv()
@@ -12,10 +17,18 @@ load_dotenv()
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT", "us-east1-gcp")
 PINECONE_INDEX_NAME = "belief-embeddings"
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
 
-# Initialize Pinecone
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index = pc.Index(PINECONE_INDEX_NAME)
+# Vector backend: "pinecone" (remote) or "local" (memory-mapped snapshot, see local_vector_index.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_VECTOR_INDEX_PATH = os.getenv("LOCAL_VECTOR_INDEX_PATH", "local_vector_index")
+
+# Semantic search cache: seconds between checks of the index version it was filled from
+SEARCH_CACHE_VERSION_INTERVAL = float(os.getenv("SEARCH_CACHE_VERSION_INTERVAL", "60"))
+# Version marker written by the sync / merge scripts after they change vectors; kept in its own
+# namespace so searches (default namespace) never see it
+INDEX_VERSION_NAMESPACE = "index-version"
+INDEX_VERSION_ID = "index_version"
 
 # Logging setup
 LOG_FILE = "concept_processing.log"
@@ -32,30 +45,246 @@ logger.info("✅ Logging initialized.")
 
 # Load the SAME model used in PostgreSQL embeddings
 MODEL_NAME = "BAAI/bge-base-en"  # Ensure consistency in embeddings
-model = SentenceTransformer(MODEL_NAME)
+embedding_cache = EmbeddingCache(MODEL_NAME)
+search_cache = SemanticCache(768) if SEARCH_CACHE and SEARCH_CACHE_SIZE > 0 else None
+
+# Heavy resources are created on first use (see `get_model` / `get_index`)
+_model = None
+_pinecone_index = None
+_local_index = None
+_metadata_store = None
+_metadata_store_checked = False
+_model_lock = threading.Lock()
+_index_lock = threading.Lock()
+_metadata_store_lock = threading.Lock()
+_index_version = None
+_index_version_checked = 0.0
+_index_version_lock = threading.Lock()
+
+
+def get_model():
+    """Returns the shared SentenceTransformer, loading it on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                logger.info(f"⏳ Loading embedding model {MODEL_NAME}...")
+                _model = SentenceTransformer(MODEL_NAME)
+    return _model
+
+
+def get_pinecone_index():
+    """Returns the shared remote Pinecone index handle, connecting on first use."""
+    global _pinecone_index
+    if _pinecone_index is None:
+        with _index_lock:
+            if _pinecone_index is None:
+                from pinecone import Pinecone
+                pc = Pinecone(api_key=PINECONE_API_KEY)
+                _pinecone_index = pc.Index(PINECONE_INDEX_NAME)
+                logger.info(f"✅ Connected to Pinecone index {PINECONE_INDEX_NAME}")
+    return _pinecone_index
+
+
+def get_index():
+    """
+    Returns the index used for search and fetch: the remote Pinecone index, or the local
+    snapshot when `VECTOR_BACKEND=local`. Both are created on first use.
+    """
+    global _local_index
+    if VECTOR_BACKEND != "local":
+        return get_pinecone_index()
+    if _local_index is None:
+        with _index_lock:
+            if _local_index is None:
+                from LLM_querying.DB_operations.local_vector_index import LocalVectorIndex
+                _local_index = LocalVectorIndex(LOCAL_VECTOR_INDEX_PATH)
+    return _local_index
+
+
+def get_metadata_store():
+    """
+    Returns the local metadata store at `METADATA_STORE_PATH`, or None if it has not been built
+    or is stale: exported from another version of the index than the one searched (the sync and
+    merge scripts rewrite metadata and delete vectors). The version is checked once when the store
+    is opened and again whenever the search cache re-reads it; if it cannot be read, the store is
+    trusted. A stale store is skipped until it is rebuilt and the process restarted.
+    """
+    global _metadata_store, _metadata_store_checked
+    if not _metadata_store_checked:
+        with _metadata_store_lock:
+            if not _metadata_store_checked:
+                if METADATA_STORE_PATH and os.path.exists(METADATA_STORE_PATH):
+                    store = MetadataStore(METADATA_STORE_PATH)
+                    try:
+                        version = _read_current_index_version()
+                    except Exception as e:
+                        logger.warning(f"⚠️ Could not read the index version, using the metadata store as is: {e}")
+                        version = store.index_version
+                    _metadata_store = store if _metadata_store_matches(store, version) else None
+                _metadata_store_checked = True
+    return _metadata_store
+
+
+def _metadata_store_matches(store, version):
+    if store.index_version == version:
+        return True
+    logger.warning(f"⚠️ Metadata store was exported from index version {store.index_version}, not {version}; "
+                   f"fetching metadata from the index until it is rebuilt")
+    return False
+
+
+def stamp_index_version(index):
+    """Records a new version marker on a Pinecone index; writers call it after changing vectors."""
+    version = uuid.uuid4().hex
+    marker = [1.0] + [0.0] * 767  # Pinecone rejects all-zero vectors
+    index.upsert(vectors=[(INDEX_VERSION_ID, marker, {"version": version})], namespace=INDEX_VERSION_NAMESPACE)
+    return version
+
+
+def read_index_version(index):
+    """(version marker, total vector count) of a Pinecone index; the marker is None if never stamped."""
+    fetched = index.fetch(ids=[INDEX_VERSION_ID], namespace=INDEX_VERSION_NAMESPACE)
+    marker = fetched.vectors.get(INDEX_VERSION_ID) if fetched else None
+    stats = index.describe_index_stats()
+    total = stats["total_vector_count"] if isinstance(stats, dict) else stats.total_vector_count
+    return (marker.metadata.get("version") if marker is not None else None), total
+
+
+def _read_current_index_version():
+    """Reads the version of the searched index (see `get_index_version`); raises if it cannot be read."""
+    index = get_index()
+    version = getattr(index, "version", None)
+    return version if version is not None else read_index_version(index)
+
+
+def get_index_version():
+    """
+    Identifies the contents of the search index: the snapshot version for the local backend; for
+    Pinecone, the marker from `stamp_index_version` plus the total vector count (which catches
+    writers that do not stamp, unless they keep the count unchanged). Re-read at most every
+    `SEARCH_CACHE_VERSION_INTERVAL` seconds; changes the version misses are bounded by the cache TTL.
+    Each successful read also retires the metadata store if it no longer matches.
+    """
+    global _index_version, _index_version_checked, _metadata_store
+    if _index_version is not None and time.monotonic() - _index_version_checked < SEARCH_CACHE_VERSION_INTERVAL:
+        return _index_version
+    with _index_version_lock:
+        if _index_version is None or time.monotonic() - _index_version_checked >= SEARCH_CACHE_VERSION_INTERVAL:
+            try:
+                version = _read_current_index_version()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not read index stats for the search cache: {e}")
+                version = _index_version
+            else:
+                store = _metadata_store
+                if store is not None and not _metadata_store_matches(store, version):
+                    _metadata_store = None
+            _index_version, _index_version_checked = version, time.monotonic()
+    return _index_version
+
+
+def _cached_search(kind, top_k, query_embedding):
+    """Results of an earlier search of the same kind whose query embedding is close enough, or None."""
+    if search_cache is None:
+        return None
+    search_cache.check_version(get_index_version())
+    cached = search_cache.get((kind, top_k), query_embedding)
+    if cached is not None:
+        count("search_cache.hits")
+    return cached
+
+
+def _cache_search(kind, top_k, query_embedding, results):
+    if search_cache is not None:
+        search_cache.put((kind, top_k), query_embedding, results)
+
+
+def get_search_cache_stats():
+    """Returns hit/miss/eviction counters of the semantic search cache (None if disabled)."""
+    return search_cache.stats() if search_cache is not None else None
+
+
+def warmup_pinecone():
+    """Loads the embedding model and connects to Pinecone ahead of the first query."""
+    get_model().encode("warmup")
+    get_index()
+
+
+def encode_query(query_text):
+    """
+    Embeds a query with the shared model, going through the embedding cache first.
+    Returns the embedding as a list of floats.
+    """
+    with span("embed", texts=1) as s:
+        vector = embedding_cache.get(query_text)
+        s.set(cached=int(vector is not None))
+        count("embedding_cache.hits" if vector is not None else "embedding_cache.misses")
+        if vector is None:
+            vector = get_model().encode(query_text)
+            embedding_cache.put(query_text, vector)
+        return [float(x) for x in vector]
+
+
+def encode_queries(query_texts, batch_size=EMBED_BATCH_SIZE, persist=True):
+    """
+    Embeds many queries with a single batched forward pass, skipping those already cached.
+    Returns a dictionary mapping each query text to its embedding (list of floats).
+    With `persist=False` the texts bypass the persistent embedding cache tier.
+    """
+    unique_texts = list(dict.fromkeys(query_texts))
+    with span("embed", texts=len(unique_texts)) as s:
+        vectors = {text: embedding_cache.get(text, persist=persist) for text in unique_texts}
+        missing = [text for text, vector in vectors.items() if vector is None]
+        s.set(cached=len(unique_texts) - len(missing))
+        count("embedding_cache.hits", len(unique_texts) - len(missing))
+        count("embedding_cache.misses", len(missing))
+
+        if missing:
+            logger.info(f"🧮 Encoding {len(missing)} queries in one batch ({len(unique_texts) - len(missing)} cached)")
+            encoded = list(zip(missing, get_model().encode(missing, batch_size=batch_size)))
+            embedding_cache.put_many(encoded, persist=persist)
+            vectors.update(encoded)
+
+    return {text: [float(x) for x in vector] for text, vector in vectors.items()}
+
+
+def get_embedding_cache_stats():
+    """Returns hit/miss counters of the query embedding cache."""
+    return embedding_cache.stats()
 
 
-def vector_search_beliefs(query_text, top_k=5):
+def vector_search_beliefs(query_text, top_k=5, query_embedding=None):
     """
     Searches Pinecone for the closest belief matches to the query text.
     Returns ONLY belief IDs.
+    Pass `query_embedding` to skip encoding when the vector was already computed (e.g. batched).
     """
     logger.info(f"🔍 Searching for beliefs related to: {query_text}")
 
-    # Generate embedding using the model
-    query_embedding = model.encode(query_text).tolist()
+    # Generate embedding using the model (unless it was precomputed upstream)
+    if query_embedding is None:
+        query_embedding = encode_query(query_text)
 
     if len(query_embedding) != 768:
         logger.error(f"❌ Query vector is {len(query_embedding)}D but should be 768D!")
         return []
 
+    cached = _cached_search("beliefs", top_k, query_embedding)
+    if cached is not None:
+        logger.info(f"♻️ Reusing {len(cached)} cached belief matches.")
+        return cached
+
     # Search Pinecone with filter for 'belief' type
-    results = index.query(
-        vector=query_embedding,
-        top_k=top_k,
-        include_metadata=True,
-        filter={"type": {"$eq": "belief"}}
-    )
+    with span("pinecone.query", kind="beliefs", top_k=top_k) as s:
+        results = get_index().query(
+            vector=query_embedding,
+            top_k=top_k,
+            include_metadata=True,
+            filter={"type": {"$eq": "belief"}}
+        )
+        s.set(matches=len(results.get("matches", [])))
 
     belief_ids = [match["id"] for match in results.get("matches", [])]
 
@@ -64,29 +293,39 @@ def vector_search_beliefs(query_text, top_k=5):
     else:
         logger.info("❌ No belief matches found.")
 
+    _cache_search("beliefs", top_k, query_embedding, belief_ids)
     return belief_ids
 
 
-def vector_search_concepts(query_text, top_k=5):
+def vector_search_concepts(query_text, top_k=5, query_embedding=None):
     """
     Searches Pinecone for the closest concept or overloaded concept matches to the query text.
     Returns ONLY concept or overloaded concept IDs.
+    Pass `query_embedding` to skip encoding when the vector was already computed (e.g. batched).
     """
     logger.info(f"🔍 Searching for concepts related to: {query_text}")
 
-    query_embedding = model.encode(query_text).tolist()
+    if query_embedding is None:
+        query_embedding = encode_query(query_text)
 
     if len(query_embedding) != 768:
         logger.error(f"❌ Query vector is {len(query_embedding)}D but should be 768D!")
         return []
 
+    cached = _cached_search("concepts", top_k, query_embedding)
+    if cached is not None:
+        logger.info(f"♻️ Reusing {len(cached)} cached concept matches.")
+        return cached
+
     # Search Pinecone with filter for concepts and overloaded concepts
-    results = index.query(
-        vector=query_embedding,
-        top_k=top_k,
-        include_metadata=True,
-        filter={"type": {"$in": ["concept", "overloaded_concept"]}}
-    )
+    with span("pinecone.query", kind="concepts", top_k=top_k) as s:
+        results = get_index().query(
+            vector=query_embedding,
+            top_k=top_k,
+            include_metadata=True,
+            filter={"type": {"$in": ["concept", "overloaded_concept"]}}
+        )
+        s.set(matches=len(results.get("matches", [])))
 
     concept_ids = [match["id"] for match in results.get("matches", [])]
 
@@ -95,27 +334,37 @@ def vector_search_concepts(query_text, top_k=5):
     else:
         logger.info("❌ No concept matches found.")
 
+    _cache_search("concepts", top_k, query_embedding, concept_ids)
     return concept_ids
 
 
-def vector_search_all(query_text, top_k=5):
+def vector_search_all(query_text, top_k=5, query_embedding=None):
     """
     Searches Pinecone for the closest matches to the query text across ALL types (beliefs, concepts, overloaded concepts).
     Returns a dictionary containing lists of IDs.
+    Pass `query_embedding` to skip encoding when the vector was already computed (e.g. batched).
     """
     logger.info(f"🔍 Searching across ALL types for: {query_text}")
 
-    query_embedding = model.encode(query_text).tolist()
+    if query_embedding is None:
+        query_embedding = encode_query(query_text)
 
     if len(query_embedding) != 768:
         logger.error(f"❌ Query vector is {len(query_embedding)}D but should be 768D!")
         return {"beliefs": [], "concepts": []}
 
-    results = index.query(
-        vector=query_embedding,
-        top_k=top_k,
-        include_metadata=True
-    )
+    cached = _cached_search("all", top_k, query_embedding)
+    if cached is not None:
+        logger.info(f"♻️ Reusing cached matches ({len(cached['beliefs'])} beliefs, {len(cached['concepts'])} concepts).")
+        return cached
+
+    with span("pinecone.query", kind="all", top_k=top_k) as s:
+        results = get_index().query(
+            vector=query_embedding,
+            top_k=top_k,
+            include_metadata=True
+        )
+        s.set(matches=len(results.get("matches", [])))
 
     beliefs = []
     concepts = []
@@ -132,6 +381,7 @@ def vector_search_all(query_text, top_k=5):
     else:
         logger.info("❌ No matches found.")
 
+    _cache_search("all", top_k, query_embedding, {"beliefs": beliefs, "concepts": concepts})
     return {"beliefs": beliefs, "concepts": concepts}
 
 
@@ -142,7 +392,7 @@ def print_metadata(item_id):
     logger.info(f"🔍 Retrieving metadata for ID: {item_id}")
 
     # Query Pinecone for the specific ID
-    result = index.fetch(ids=[item_id])
+    result = get_index().fetch(ids=[item_id])
 
     # Access metadata correctly
     if result and item_id in result.vectors:
@@ -155,12 +405,21 @@ def print_metadata(item_id):
 
 def get_metadata(item_id):
     """
-    Retrieves metadata from Pinecone for a given ID and returns it as a dictionary.
+    Retrieves metadata for a given ID and returns it as a dictionary.
+    Reads the local metadata store first and only fetches from Pinecone on a miss.
     """
+    store = get_metadata_store()
+    if store is not None:
+        metadata = store.get(item_id)
+        if metadata is not None:
+            count("metadata_store.hits")
+            return metadata
+
     logger.info(f"🔍 Retrieving metadata for ID: {item_id}")
 
     # Query Pinecone for the specific ID
-    result = index.fetch(ids=[item_id])
+    with span("pinecone.fetch", ids=1):
+        result = get_index().fetch(ids=[item_id])
 
     # Access metadata correctly
     if result and item_id in result.vectors:
@@ -168,3 +427,36 @@ def get_metadata(item_id):
     else:
         logger.info(f"❌ No metadata found for ID: {item_id}")
         return None
+
+
+def get_metadata_batch(item_ids):
+    """
+    Retrieves metadata for many IDs from the local metadata store, fetching any it lacks
+    from Pinecone with a single call. Returns a dictionary mapping each found ID to its metadata.
+    """
+    unique_ids = list(dict.fromkeys(item_ids))
+    if not unique_ids:
+        return {}
+
+    local = {}
+    store = get_metadata_store()
+    if store is not None:
+        local = store.get_many(unique_ids)
+        count("metadata_store.hits", len(local))
+        unique_ids = [vid for vid in unique_ids if vid not in local]
+        if not unique_ids:
+            return local
+
+    logger.info(f"🔍 Retrieving metadata for {len(unique_ids)} IDs")
+
+    with span("pinecone.fetch", ids=len(unique_ids)):
+        result = get_index().fetch(ids=unique_ids)
+    if not result:
+        return local
+
+    found = {vid: vdata.metadata for vid, vdata in result.vectors.items()}
+    missing = len(unique_ids) - len(found)
+    if missing:
+        logger.info(f"❌ No metadata found for {missing} of {len(unique_ids)} IDs")
+    local.update(found)
+    return local
@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import logging
+import argparse
+
+import numpy as np
+
+from LLM_querying.DB_operations.local_vector_index import LocalVectorIndex
+
+logger = logging.getLogger(__name__)
+
+# Edge construction config (defaults mirror graph_construction.ipynb: for every node, its single
+# most similar belief and single most similar concept from a different SEP entry)
+EDGE_MEMORY_BUDGET_MB = int(os.getenv("EDGE_MEMORY_BUDGET_MB", "512"))
+EDGES_PER_GROUP = 1
+EDGE_WRITE_BATCH_SIZE = 10000  # edges per Neo4j transaction
+
+# Target groups: each source gets its top-k neighbours from every group
+TARGET_GROUPS = {"belief": ("belief",), "concept": ("concept", "overloaded_concept")}
+TYPE_LABELS = {"belief": "Belief", "concept": "Concept", "overloaded_concept": "Overloaded_Concept"}
+
+
+def _sep_ids(metadata):
+    """All SEP entries a node belongs to (overloaded concepts span several)."""
+    sep_ids = metadata.get("sep_ids")
+    if isinstance(sep_ids, list) and sep_ids:
+        return [float(s) for s in sep_ids]
+    sep_id = metadata.get("sep_id")
+    return [float(sep_id)] if sep_id is not None else []
+
+
+# Bytes held per (source, target) pair of a block: similarity (float32), its argpartition
+# result (int64), the exclusion mask and the bool temporary it is OR-ed with
+BYTES_PER_PAIR = 4 + 8 + 1 + 1
+
+
+def block_sizes(num_sources, num_targets, dim, memory_budget_mb):
+    """
+    Source/target block sizes whose peak working set (both vector blocks plus every per-pair
+    temporary of one block, see `BYTES_PER_PAIR`) fits in `memory_budget_mb`.
+    """
+    budget = memory_budget_mb * 1024 * 1024
+    source_block = max(1, min(num_sources, 1024))
+    per_target = 4 * dim + BYTES_PER_PAIR * source_block
+    target_block = max(1, min(num_targets, (budget - 4 * dim * source_block) // per_target))
+    return source_block, target_block
+
+
+def top_k_neighbors(vectors, sep_keys, source_rows, target_rows, exclude, k=EDGES_PER_GROUP,
+                    memory_budget_mb=EDGE_MEMORY_BUDGET_MB):
+    """
+    Blocked exact cosine kNN. For each source row returns its `k` most similar target rows,
+    skipping targets whose SEP key is in the source's exclusion list.
+
+    Args:
+        vectors: [N, dim] array (may be memory-mapped).
+        sep_keys: float [N], primary SEP ID per row (NaN if unknown).
+        source_rows, target_rows: int arrays of row indices.
+        exclude: list of SEP-ID lists, aligned with `source_rows`.
+
+    Returns:
+        (neighbors int [S, k], scores float32 [S, k]); missing neighbours are -1 / -inf.
+    """
+    num_sources, num_targets = len(source_rows), len(target_rows)
+    best_rows = np.full((num_sources, k), -1, dtype=np.int64)
+    best_scores = np.full((num_sources, k), -np.inf, dtype=np.float32)
+    if not num_sources or not num_targets:
+        return best_rows, best_scores
+
+    source_block, target_block = block_sizes(num_sources, num_targets, vectors.shape[1], memory_budget_mb)
+
+    def normalized(rows):
+        block = np.asarray(vectors[rows], dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True) + 1e-12
+        return block
+
+    primary = np.asarray([e[0] if e else np.nan for e in exclude])
+    multi = [i for i, e in enumerate(exclude) if len(e) > 1]
+
+    for s0 in range(0, num_sources, source_block):
+        s_rows = source_rows[s0 : s0 + source_block]
+        s_vectors = normalized(s_rows)
+        s_primary = primary[s0 : s0 + source_block]
+        s_multi = [i - s0 for i in multi if s0 <= i < s0 + len(s_rows)]
+        block_best_rows = best_rows[s0 : s0 + len(s_rows)]
+        block_best_scores = best_scores[s0 : s0 + len(s_rows)]
+
+        for t0 in range(0, num_targets, target_block):
+            t_rows = target_rows[t0 : t0 + target_block]
+            # Negated in place, so the ascending argpartition below needs no negated copy
+            scores = s_vectors @ normalized(t_rows).T
+            np.negative(scores, out=scores)
+
+            t_keys = sep_keys[t_rows]
+            mask = s_primary[:, None] == t_keys[None, :]
+            mask |= s_rows[:, None] == t_rows[None, :]
+            for i in s_multi:
+                mask[i] |= np.isin(t_keys, exclude[s0 + i])
+            scores[mask] = np.inf
+
+            # Merge this block's top-k into the running top-k
+            kk = min(k, scores.shape[1])
+            candidates = np.argpartition(scores, kk - 1, axis=1)[:, :kk]
+            candidate_scores = -np.take_along_axis(scores, candidates, axis=1)
+            merged_scores = np.concatenate([block_best_scores, candidate_scores], axis=1)
+            merged_rows = np.concatenate([block_best_rows, t_rows[candidates]], axis=1)
+            order = np.argsort(-merged_scores, axis=1, kind="stable")[:, :k]
+            block_best_scores[:] = np.take_along_axis(merged_scores, order, axis=1)
+            block_best_rows[:] = np.take_along_axis(merged_rows, order, axis=1)
+            del scores, mask, candidates  # free before the next block allocates its own
+
+        logger.info(f"✅ kNN for {min(s0 + source_block, num_sources)}/{num_sources} sources")
+
+    return best_rows, best_scores
+
+
+def build_similarity_edges(index, k=EDGES_PER_GROUP, memory_budget_mb=EDGE_MEMORY_BUDGET_MB, source_ids=None):
+    """
+    Computes SIMILAR_TO edges for every belief / concept / overloaded concept in a local vector
+    index (or only for `source_ids`). Returns a list of (source_id, target_id, weight) tuples.
+    """
+    types = [m.get("type") for m in index.metadata]
+    sep_keys = np.asarray([(_sep_ids(m) or [np.nan])[0] for m in index.metadata], dtype=np.float64)
+
+    node_rows = np.asarray([r for r, t in enumerate(types) if t in TYPE_LABELS], dtype=np.int64)
+    if source_ids is not None:
+        wanted = {index.row_of[i] for i in source_ids if i in index.row_of}
+        node_rows = np.asarray([r for r in node_rows if r in wanted], dtype=np.int64)
+    exclude = [_sep_ids(index.metadata[r]) for r in node_rows]
+    logger.info(f"📌 Building edges for {len(node_rows)} nodes")
+
+    edges = []
+    for group, group_types in TARGET_GROUPS.items():
+        target_rows = np.asarray([r for r, t in enumerate(types) if t in group_types], dtype=np.int64)
+        logger.info(f"🔍 Nearest {group} neighbours among {len(target_rows)} targets")
+        neighbors, scores = top_k_neighbors(index.vectors, sep_keys, node_rows, target_rows, exclude,
+                                            k=k, memory_budget_mb=memory_budget_mb)
+        for source, row_neighbors, row_scores in zip(node_rows, neighbors, scores):
+            for target, score in zip(row_neighbors, row_scores):
+                if target >= 0 and np.isfinite(score):
+                    edges.append((index.ids[source], index.ids[target], float(score)))
+
+    logger.info(f"🎉 Computed {len(edges)} edges")
+    return edges
+
+
+def write_edges_to_neo4j(driver, edges, types_by_id, batch_size=EDGE_WRITE_BATCH_SIZE, replace=False):
+    """
+    Bulk-loads edges with one label-qualified `UNWIND ... MERGE` per label pair and transaction.
+    With `replace`, existing SIMILAR_TO relationships are deleted first.
+    """
+    with driver.session() as session:
+        if replace:
+            while True:
+                deleted = session.run("""
+                    MATCH ()-[r:SIMILAR_TO]->()
+                    WITH r LIMIT 50000
+                    DELETE r
+                    RETURN count(r) AS deleted
+                """).single()["deleted"]
+                if deleted == 0:
+                    break
+                logger.info(f"❌ Deleted {deleted} relationships...")
+
+        by_labels = {}
+        for a, b, weight in edges:
+            labels = (TYPE_LABELS[types_by_id[a]], TYPE_LABELS[types_by_id[b]])
+            by_labels.setdefault(labels, []).append({"a": a, "b": b, "w": weight})
+
+        written = 0
+        for (label_a, label_b), rows in by_labels.items():
+            query = f"""
+                UNWIND $edges AS e
+                MATCH (a:{label_a} {{id: e.a}})
+                MATCH (b:{label_b} {{id: e.b}})
+                MERGE (a)-[r:SIMILAR_TO]->(b)
+                SET r.weight = e.w
+            """
+            for i in range(0, len(rows), batch_size):
+                batch = rows[i : i + batch_size]
+                session.execute_write(lambda tx: tx.run(query, edges=batch).consume())
+                written += len(batch)
+                logger.info(f"✅ Wrote {written}/{len(edges)} edges")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build SIMILAR_TO edges with blocked local kNN and load them into Neo4j.")
+    parser.add_argument("index_dir", help="local vector index snapshot (see local_vector_index.py)")
+    parser.add_argument("-k", type=int, default=EDGES_PER_GROUP, help="neighbours per target group (belief, concept)")
+    parser.add_argument("--memory-mb", type=int, default=EDGE_MEMORY_BUDGET_MB, help="working-set budget for the kNN blocks")
+    parser.add_argument("--sources", help="only build edges for the IDs in this file (one per line, or a sync manifest)")
+    parser.add_argument("--edges-out", help="also write the edges to this TSV file")
+    parser.add_argument("--no-neo4j", action="store_true", help="compute edges without writing them to Neo4j")
+    parser.add_argument("--replace", action="store_true", help="delete all existing SIMILAR_TO edges first")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+
+    source_ids = None
+    if args.sources:
+        with open(args.sources, "r", encoding="utf-8") as f:
+            text = f.read()
+        source_ids = json.loads(text)["nodes_needing_edges"] if args.sources.endswith(".json") else text.split()
+
+    index = LocalVectorIndex(args.index_dir)
+    edges = build_similarity_edges(index, k=args.k, memory_budget_mb=args.memory_mb, source_ids=source_ids)
+
+    if args.edges_out:
+        with open(args.edges_out, "w", encoding="utf-8") as f:
+            for a, b, weight in edges:
+                f.write(f"{a}\t{b}\t{weight:.6f}\n")
+        logger.info(f"📝 Edges written to {args.edges_out}")
+
+    if not args.no_neo4j:
+        from LLM_querying.DB_operations.neo4j_operations import get_driver
+        types_by_id = {vid: meta.get("type") for vid, meta in zip(index.ids, index.metadata)}
+        write_edges_to_neo4j(get_driver(), edges, types_by_id, replace=args.replace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import os, json, time, random, atexit, asyncio, logging, weakref
+import httpx
+from LLM_querying import mistral_api
+from LLM_querying.mistral_api import (
+    MISTRAL_API_KEY, MISTRAL_MODEL, MISTRAL_TEMPERATURE, SYSTEM_PROMPT,
+    MISTRAL_CONNECT_TIMEOUT, MISTRAL_READ_TIMEOUT, MISTRAL_MAX_RETRIES, MISTRAL_BACKOFF_BASE,
+    RETRY_STATUS_CODES, _build_request, estimate_tokens,
+)
+from LLM_querying.response_cache import cache_key
+from LLM_querying.tracing import span, count
+
+logger = logging.getLogger(__name__)
+
+# Concurrency and rate-limit config (0 disables a limit)
+MISTRAL_MAX_CONCURRENCY = int(os.getenv("MISTRAL_MAX_CONCURRENCY", "16"))
+MISTRAL_REQUESTS_PER_MINUTE = float(os.getenv("MISTRAL_REQUESTS_PER_MINUTE", "120"))
+MISTRAL_TOKENS_PER_MINUTE = float(os.getenv("MISTRAL_TOKENS_PER_MINUTE", "500000"))
+MISTRAL_EXPECTED_COMPLETION_TOKENS = int(os.getenv("MISTRAL_EXPECTED_COMPLETION_TOKENS", "512"))
+
+
+class MistralRateLimitError(RuntimeError):
+    """Raised when Mistral keeps rate-limiting a request after all retries."""
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at `per_minute / 60` units per second.
+    `pause(seconds)` blocks every acquirer, e.g. when the server answers with `Retry-After`.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                wait = self.blocked_until - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class _LoopState:
+    """HTTP client, semaphore and limiters bound to one event loop."""
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(MISTRAL_READ_TIMEOUT, connect=MISTRAL_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=MISTRAL_MAX_CONCURRENCY or None,
+                                max_keepalive_connections=MISTRAL_MAX_CONCURRENCY or None),
+            headers={"Authorization": f"Bearer {MISTRAL_API_KEY}", "Content-Type": "application/json"},
+        )
+        self.semaphore = asyncio.Semaphore(MISTRAL_MAX_CONCURRENCY) if MISTRAL_MAX_CONCURRENCY else None
+        self.requests = TokenBucket(MISTRAL_REQUESTS_PER_MINUTE) if MISTRAL_REQUESTS_PER_MINUTE else None
+        self.tokens = TokenBucket(MISTRAL_TOKENS_PER_MINUTE) if MISTRAL_TOKENS_PER_MINUTE else None
+        self.closer = None
+
+
+_states = weakref.WeakKeyDictionary()
+
+
+async def _close_on_shutdown(client):
+    """
+    Parked at its `yield` for the life of the loop; `loop.shutdown_asyncgens()` (run by
+    `asyncio.run` before closing the loop) finalizes it, closing the client inside the loop.
+    """
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+async def _get_state():
+    loop = asyncio.get_running_loop()
+    state = _states.get(loop)
+    if state is None:
+        state = _states[loop] = _LoopState()
+        state.closer = _close_on_shutdown(state.client)
+        await state.closer.__anext__()
+    return state
+
+
+async def aclose():
+    """Closes the HTTP client of the running event loop."""
+    state = _states.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state.closer.aclose()
+
+
+@atexit.register
+def _close_remaining_clients():
+    """Fallback for loops that were never shut down through `shutdown_asyncgens`."""
+    for loop, state in list(_states.items()):
+        if loop.is_closed() or loop.is_running():
+            continue
+        try:
+            loop.run_until_complete(state.closer.aclose())
+        except Exception as e:
+            logger.debug(f"Could not close Mistral client at exit: {e}")
+    _states.clear()
+
+
+def _retry_after(response, attempt):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    return MISTRAL_BACKOFF_BASE * (2 ** attempt) * (1 + random.random() * 0.25)
+
+
+async def _post_with_limits(state, data, token_estimate):
+    for attempt in range(MISTRAL_MAX_RETRIES + 1):
+        if state.requests:
+            await state.requests.acquire(1)
+        if state.tokens:
+            await state.tokens.acquire(token_estimate)
+
+        try:
+            if state.semaphore:
+                async with state.semaphore:
+                    r = await state.client.post(mistral_api.MISTRAL_URL, json=data)
+            else:
+                r = await state.client.post(mistral_api.MISTRAL_URL, json=data)
+        except (httpx.TransportError, httpx.TimeoutException) as e:
+            if attempt == MISTRAL_MAX_RETRIES:
+                raise
+            delay = _retry_after(None, attempt)
+            count("mistral.retries")
+            logger.warning(f"⚠️ Mistral request failed ({e}); retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+            continue
+
+        if r.status_code not in RETRY_STATUS_CODES:
+            return r
+
+        delay = _retry_after(r, attempt)
+        if r.status_code == 429:
+            # Back every in-flight request off, not just this one
+            for bucket in (state.requests, state.tokens):
+                if bucket:
+                    bucket.pause(delay)
+        if attempt == MISTRAL_MAX_RETRIES:
+            if r.status_code == 429:
+                raise MistralRateLimitError(f"Mistral still rate-limiting after {MISTRAL_MAX_RETRIES} retries")
+            return r
+        count("mistral.retries")
+        logger.warning(f"⚠️ Mistral returned {r.status_code}; retrying in {delay:.1f}s...")
+        await asyncio.sleep(delay)
+
+
+async def acall_mistral_chat(prompt: str, use_cache: bool = True,
+                             model: str = MISTRAL_MODEL, temperature: float = MISTRAL_TEMPERATURE) -> str:
+    """
+    Asyncio-native counterpart of `call_mistral_chat`. Requests share one client per event loop,
+    a global concurrency semaphore and request/token-per-minute buckets.
+    """
+    with span("mistral.chat", model=model, prompt_chars=len(prompt)) as s:
+        key = None
+        response_cache = mistral_api.response_cache
+        if use_cache and response_cache is not None:
+            key = cache_key(model=model, temperature=temperature, system=SYSTEM_PROMPT, prompt=prompt)
+            # Disk I/O off the event loop
+            cached = await asyncio.to_thread(response_cache.get, key)
+            if cached is not None:
+                s.set(cache_hit=True, response_chars=len(cached))
+                count("mistral.cache_hits")
+                return cached
+
+        data = _build_request(prompt, model, temperature)
+        token_estimate = estimate_tokens(SYSTEM_PROMPT + prompt) + MISTRAL_EXPECTED_COMPLETION_TOKENS
+        r = await _post_with_limits(await _get_state(), data, token_estimate)
+
+        try:
+            response_json = r.json()
+        except Exception:
+            logger.error(f"❌ Failed to parse Mistral response as JSON. Raw response text: {r.text}")
+            raise
+
+        if "choices" not in response_json:
+            logger.error(f"⚠️ Mistral response missing 'choices':\n{json.dumps(response_json, indent=2)}")
+            raise KeyError("Missing 'choices' in Mistral response")
+
+        content = response_json["choices"][0]["message"]["content"]
+        s.set(cache_hit=False, response_chars=len(content))
+        if key is not None:
+            await asyncio.to_thread(response_cache.put, key, content)
+        return content
@@ -0,0 +1,104 @@
+import os
+import re
+import logging
+
+import numpy as np
+
+from LLM_querying.mistral_api import estimate_tokens
+from LLM_querying.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# Context packing config
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))  # 1.0 = pure relevance, 0.0 = pure diversity
+CONTEXT_DUP_THRESHOLD = float(os.getenv("CONTEXT_DUP_THRESHOLD", "0.95"))  # cosine above which chunks are near-duplicates
+
+SEP_HEADER = re.compile(r"^\[SEP ([^\s\]]+) - ")
+CONCEPT_HEADER = re.compile(r"^\[Concept: ([^\]]+)\]")
+
+
+def chunk_key(chunk):
+    """Identity of a chunk: its SEP entry or concept for snippets, the full text otherwise."""
+    match = SEP_HEADER.match(chunk)
+    if match:
+        return f"sep:{match.group(1)}"
+    match = CONCEPT_HEADER.match(chunk)
+    if match:
+        return f"concept:{match.group(1).strip().casefold()}"
+    return chunk
+
+
+def dedupe_chunks(chunks):
+    """Keeps the first chunk per SEP entry / concept / exact text, preserving order."""
+    seen = set()
+    unique = []
+    for chunk in chunks:
+        key = chunk_key(chunk)
+        if key not in seen:
+            seen.add(key)
+            unique.append(chunk)
+    return unique
+
+
+def _normalized(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12)
+
+
+def mmr_order(question_vector, chunk_vectors, mmr_lambda=CONTEXT_MMR_LAMBDA, dup_threshold=CONTEXT_DUP_THRESHOLD):
+    """
+    Orders chunks by maximal marginal relevance to the question, dropping any chunk whose
+    similarity to an already selected one is at least `dup_threshold`. Returns row indices.
+    """
+    chunks = _normalized(chunk_vectors)
+    relevance = chunks @ _normalized([question_vector])[0]
+    similarity = chunks @ chunks.T
+
+    remaining = list(range(len(chunks)))
+    selected = []
+    while remaining:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        best = int(np.argmax(scores))
+        row = remaining.pop(best)
+        if redundancy[best] >= dup_threshold:
+            continue  # near-duplicate of something already selected
+        selected.append(row)
+    return selected
+
+
+@traced("pack_context")
+def pack_context(question, chunks, encode=None, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Dedupes context chunks by SEP/concept ID and by near-duplicate embedding, ranks them for
+    relevance and diversity (MMR) and keeps as many as fit in `token_budget`.
+    `encode` maps a list of texts to a {text: vector} dictionary; without it (or if encoding fails)
+    chunks keep their original order.
+    """
+    unique = dedupe_chunks(chunks)
+
+    ordered = unique
+    if encode is not None and len(unique) > 1:
+        try:
+            vectors = encode([question] + unique)
+            order = mmr_order(vectors[question], [vectors[c] for c in unique])
+            ordered = [unique[i] for i in order]
+        except Exception as e:
+            logger.warning(f"⚠️ Embedding-based packing failed, keeping original order: {e}")
+
+    packed = []
+    used = 0
+    for chunk in ordered:
+        cost = estimate_tokens(chunk)
+        if used + cost > token_budget:
+            continue  # a shorter chunk further down may still fit
+        packed.append(chunk)
+        used += cost
+
+    logger.info(f"📦 Packed {len(packed)}/{len(chunks)} chunks (~{used} tokens, budget {token_budget})")
+    return packed
@@ -0,0 +1,102 @@
+import os
+import re
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Embedding cache config
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))  # in-memory entries
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")  # optional SQLite file for the persistent tier
+
+
+def normalize_text(text):
+    """Collapses whitespace and case so trivially different targets share one entry (bge lowercases anyway)."""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of query embeddings keyed by model name and normalized text.
+    Tier 1 is a size-bounded in-memory LRU; tier 2 is an optional SQLite file of float32 blobs
+    that survives restarts. Both tiers are thread-safe. Pass `persist=False` for texts unlikely to
+    recur across restarts (e.g. context chunks) to keep them in memory only.
+    """
+
+    def __init__(self, model_name, max_size=EMBEDDING_CACHE_SIZE, db_path=EMBEDDING_CACHE_PATH):
+        self.model_name = model_name
+        self.max_size = max_size
+        self.db_path = db_path
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT, dim INTEGER, vector BLOB)"
+            )
+            self._db.commit()
+            logger.info(f"✅ Persistent embedding cache at {db_path}")
+
+    def _key(self, text):
+        return hashlib.sha1(f"{self.model_name}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, text, persist=True):
+        """Returns the cached float32 vector for `text`, or None (`persist=False` skips the SQLite tier)."""
+        key = self._key(text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._stats["hits"] += 1
+                return vector
+
+            if persist and self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector)
+                    self._stats["disk_hits"] += 1
+                    return vector
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, text, vector, persist=True):
+        self.put_many([(text, vector)], persist=persist)
+
+    def put_many(self, items, persist=True):
+        """Stores (text, vector) pairs, writing the SQLite tier in a single transaction."""
+        rows = [(self._key(text), np.asarray(vector, dtype=np.float32)) for text, vector in items]
+        with self._lock:
+            for key, vector in rows:
+                self._remember(key, vector)
+            if persist and self._db is not None and rows:
+                with self._db:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, model, dim, vector) VALUES (?, ?, ?, ?)",
+                        [(key, self.model_name, len(vector), vector.tobytes()) for key, vector in rows],
+                    )
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["size"] = len(self._memory)
+        snapshot["max_size"] = self.max_size
+        snapshot["persistent"] = self._db is not None
+        return snapshot
@@ -1,40 +1,204 @@
-import os, requests
+import os, json, time, random, threading, requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from LLM_querying.response_cache import ResponseCache, cache_key
+from LLM_querying.tracing import span, count, context_bound
 load_dotenv()
 
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
+MISTRAL_URL = os.getenv("MISTRAL_URL", "https://api.mistral.ai/v1/chat/completions")
+MISTRAL_MODEL = "mistral-medium-2312"
+MISTRAL_TEMPERATURE = 0.4
+SYSTEM_PROMPT = "Use only the context to answer. Always cite SEP IDs if relevant."
 
-def call_mistral_chat(prompt: str) -> str:
-    import json
-    import requests
+# HTTP config
+MISTRAL_CONNECT_TIMEOUT = float(os.getenv("MISTRAL_CONNECT_TIMEOUT", "10"))
+MISTRAL_READ_TIMEOUT = float(os.getenv("MISTRAL_READ_TIMEOUT", "120"))
+MISTRAL_MAX_RETRIES = int(os.getenv("MISTRAL_MAX_RETRIES", "4"))
+MISTRAL_BACKOFF_BASE = float(os.getenv("MISTRAL_BACKOFF_BASE", "1.0"))  # seconds, doubled per attempt
+MISTRAL_POOL_SIZE = int(os.getenv("MISTRAL_POOL_SIZE", "10"))
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
 
-    url = "https://api.mistral.ai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {MISTRAL_API_KEY}",
-        "Content-Type": "application/json"
-    }
+# Response cache config (disabled unless a directory is set)
+MISTRAL_CACHE_DIR = os.getenv("MISTRAL_CACHE_DIR")
+MISTRAL_CACHE_TTL = float(os.getenv("MISTRAL_CACHE_TTL", str(7 * 24 * 3600)))
+MISTRAL_CACHE_MAX_ENTRIES = int(os.getenv("MISTRAL_CACHE_MAX_ENTRIES", "10000"))
+
+_session = None
+_session_lock = threading.Lock()
+response_cache = (
+    ResponseCache(MISTRAL_CACHE_DIR, ttl=MISTRAL_CACHE_TTL, max_entries=MISTRAL_CACHE_MAX_ENTRIES)
+    if MISTRAL_CACHE_DIR else None
+)
+
+
+def get_session() -> requests.Session:
+    """Returns the shared keep-alive session, so calls reuse pooled TCP/TLS connections."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=MISTRAL_POOL_SIZE))
+                session.headers.update({
+                    "Authorization": f"Bearer {MISTRAL_API_KEY}",
+                    "Content-Type": "application/json"
+                })
+                _session = session
+    return _session
+
+
+def _retry_delay(attempt, response=None):
+    """Honours `Retry-After` when the server sends one, otherwise exponential backoff with jitter."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+    return MISTRAL_BACKOFF_BASE * (2 ** attempt) * (1 + random.random() * 0.25)
+
+
+def _post_with_retries(data, stream=False):
+    session = get_session()
+    timeout = (MISTRAL_CONNECT_TIMEOUT, MISTRAL_READ_TIMEOUT)
+
+    for attempt in range(MISTRAL_MAX_RETRIES + 1):
+        try:
+            r = session.post(MISTRAL_URL, json=data, timeout=timeout, stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == MISTRAL_MAX_RETRIES:
+                raise
+            delay = _retry_delay(attempt)
+            count("mistral.retries")
+            print(f"⚠️ Mistral request failed ({e}); retrying in {delay:.1f}s...")
+            time.sleep(delay)
+            continue
+
+        if r.status_code in RETRY_STATUS_CODES and attempt < MISTRAL_MAX_RETRIES:
+            delay = _retry_delay(attempt, r)
+            count("mistral.retries")
+            print(f"⚠️ Mistral returned {r.status_code}; retrying in {delay:.1f}s...")
+            r.close()
+            time.sleep(delay)
+            continue
+
+        return r
+
+
+def estimate_tokens(text):
+    """Rough token count (≈4 characters per token), good enough for budgeting."""
+    return max(1, len(text) // 4)
+
+
+def _build_request(prompt, model, temperature):
     messages = [
-        {"role": "system", "content": "Use only the context to answer. Always cite SEP IDs if relevant."},
+        {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": prompt}
     ]
-    data = {
-        "model": "mistral-medium-2312",
+    return {
+        "model": model,
         "messages": messages,
-        "temperature": 0.4
+        "temperature": temperature
     }
 
-    r = requests.post(url, headers=headers, json=data)
 
-    try:
-        response_json = r.json()
-    except Exception as e:
-        print("❌ Failed to parse Mistral response as JSON.")
-        print("Raw response text:", r.text)
-        raise
+def call_mistral_chat(prompt: str, use_cache: bool = True,
+                      model: str = MISTRAL_MODEL, temperature: float = MISTRAL_TEMPERATURE,
+                      stream: bool = False):
+    """
+    Sends a single-turn chat request to Mistral and returns the completion text.
+    With `stream=True`, returns a generator of text deltas instead (see `stream_mistral_chat`).
+    """
+    if stream:
+        return stream_mistral_chat(prompt, use_cache=use_cache, model=model, temperature=temperature)
+
+    with span("mistral.chat", model=model, prompt_chars=len(prompt)) as s:
+        data = _build_request(prompt, model, temperature)
+
+        key = None
+        if use_cache and response_cache is not None:
+            key = cache_key(model=model, temperature=temperature, system=SYSTEM_PROMPT, prompt=prompt)
+            cached = response_cache.get(key)
+            if cached is not None:
+                s.set(cache_hit=True, response_chars=len(cached))
+                count("mistral.cache_hits")
+                return cached
+
+        r = _post_with_retries(data)
+
+        try:
+            response_json = r.json()
+        except Exception as e:
+            print("❌ Failed to parse Mistral response as JSON.")
+            print("Raw response text:", r.text)
+            raise
+
+        if "choices" not in response_json:
+            print("⚠️ Mistral response missing 'choices':")
+            print(json.dumps(response_json, indent=2))
+            raise KeyError("Missing 'choices' in Mistral response")
+
+        content = response_json["choices"][0]["message"]["content"]
+        s.set(cache_hit=False, response_chars=len(content))
+        if key is not None:
+            response_cache.put(key, content)
+        return content
+
+
+@context_bound
+def stream_mistral_chat(prompt: str, use_cache: bool = True,
+                        model: str = MISTRAL_MODEL, temperature: float = MISTRAL_TEMPERATURE):
+    """
+    Streams a chat completion using the API's server-sent events (`stream: true`).
+    Yields text deltas as they arrive; a cached response is yielded as a single delta.
+    """
+    with span("mistral.stream", model=model, prompt_chars=len(prompt)) as s:
+        key = None
+        if use_cache and response_cache is not None:
+            key = cache_key(model=model, temperature=temperature, system=SYSTEM_PROMPT, prompt=prompt)
+            cached = response_cache.get(key)
+            if cached is not None:
+                s.set(cache_hit=True, response_chars=len(cached))
+                count("mistral.cache_hits")
+                yield cached
+                return
+
+        data = _build_request(prompt, model, temperature)
+        data["stream"] = True
+
+        r = _post_with_retries(data, stream=True)
+        if r.status_code != 200:
+            print(f"❌ Mistral streaming request failed with status {r.status_code}.")
+            print("Raw response text:", r.text)
+            r.raise_for_status()
+            raise RuntimeError(f"Unexpected Mistral status {r.status_code}")
+
+        parts = []
+        started = time.perf_counter()
+        r.encoding = "utf-8"  # text/event-stream comes without a charset; requests would assume ISO-8859-1
+        with r:
+            for line in r.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue  # blank keep-alives, comments and other SSE fields
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+
+                event = json.loads(payload)
+                if "choices" not in event:
+                    print("⚠️ Mistral stream event missing 'choices':")
+                    print(json.dumps(event, indent=2))
+                    raise KeyError("Missing 'choices' in Mistral stream event")
 
-    if "choices" not in response_json:
-        print("⚠️ Mistral response missing 'choices':")
-        print(json.dumps(response_json, indent=2))
-        raise KeyError("Missing 'choices' in Mistral response")
+                delta = event["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    if not parts:
+                        s.set(first_token_seconds=round(time.perf_counter() - started, 6))
+                    parts.append(delta)
+                    yield delta
 
-    return response_json["choices"][0]["message"]["content"]
+        s.set(cache_hit=False, response_chars=sum(len(p) for p in parts))
+        if key is not None:
+            response_cache.put(key, "".join(parts))
@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Eviction trims the cache to this fraction of `max_entries`, so the directory is scanned
+# once per ~10% of max_entries new entries rather than on every put
+EVICT_TO_FRACTION = 0.9
+
+
+def cache_key(**fields):
+    """Content address of a request: SHA-256 over its canonical JSON encoding."""
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk, content-addressed cache of LLM responses.
+    One JSON file per entry; entries older than `ttl` seconds are ignored and removed,
+    and the oldest entries are evicted once more than `max_entries` are stored (the entry count is
+    tracked in memory; other processes sharing the directory are picked up at the next eviction scan).
+    """
+
+    def __init__(self, directory, ttl=None, max_entries=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+        self._count = self._scan_count() if max_entries else 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._stats["misses"] += 1
+                return None
+
+            if self.ttl is not None and time.time() - entry.get("created", 0) > self.ttl:
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                try:
+                    os.remove(path)
+                    self._count -= 1
+                except OSError:
+                    pass
+                return None
+
+            self._stats["hits"] += 1
+            return entry.get("content")
+
+    def put(self, key, content):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            is_new = not os.path.exists(path)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"created": time.time(), "content": content}, f)
+            os.replace(tmp_path, path)
+            if is_new:
+                self._count += 1
+            if self.max_entries and self._count > self.max_entries:
+                self._evict()
+
+    def _scan_count(self):
+        return sum(1 for e in os.scandir(self.directory) if e.name.endswith(".json"))
+
+    def _evict(self):
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        self._count = len(entries)
+        overflow = len(entries) - int(self.max_entries * EVICT_TO_FRACTION)
+        if len(entries) <= self.max_entries or overflow <= 0:
+            return
+        for entry in sorted(entries, key=lambda e: e.stat().st_mtime)[:overflow]:
+            try:
+                os.remove(entry.path)
+                self._count -= 1
+                self._stats["evictions"] += 1
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,145 @@
+import os
+import copy
+import time
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Semantic search cache config. Off unless SEARCH_CACHE=1: the reuse threshold has not been
+# calibrated against bge-base-en scores, and a false hit returns another query's documents
+SEARCH_CACHE = os.getenv("SEARCH_CACHE", "0") != "0"
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))  # cached searches per process
+SEARCH_CACHE_THRESHOLD = float(os.getenv("SEARCH_CACHE_THRESHOLD", "0.97"))  # cosine at which a cached search is reused
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))  # seconds
+SEARCH_CACHE_LSH_TABLES = int(os.getenv("SEARCH_CACHE_LSH_TABLES", "8"))
+SEARCH_CACHE_LSH_BITS = int(os.getenv("SEARCH_CACHE_LSH_BITS", "12"))
+
+
+class _Entry:
+    __slots__ = ("namespace", "vector", "value", "created", "signatures")
+
+    def __init__(self, namespace, vector, value, created, signatures):
+        self.namespace = namespace
+        self.vector = vector
+        self.value = value
+        self.created = created
+        self.signatures = signatures
+
+
+class SemanticCache:
+    """
+    Cache of search results keyed by query embedding: a lookup hits when a cached query of the
+    same namespace (search kind, top_k, ...) has cosine similarity of at least `threshold`.
+
+    Cached embeddings are indexed by random-hyperplane LSH (`num_tables` tables of `num_bits`-bit
+    signatures), so a lookup only compares against the few entries sharing a bucket; with the
+    defaults a neighbour at cosine 0.97 shares at least one bucket ~98% of the time.
+    Entries are evicted least-recently-used beyond `max_size` and ignored after `ttl` seconds;
+    `check_version` drops everything when the underlying index changes. Thread-safe.
+    """
+
+    def __init__(self, dim, max_size=SEARCH_CACHE_SIZE, threshold=SEARCH_CACHE_THRESHOLD, ttl=SEARCH_CACHE_TTL,
+                 num_tables=SEARCH_CACHE_LSH_TABLES, num_bits=SEARCH_CACHE_LSH_BITS, seed=0):
+        self.dim = dim
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl
+
+        self._planes = np.random.default_rng(seed).standard_normal((num_tables * num_bits, dim)).astype(np.float32)
+        self._num_tables = num_tables
+        self._bit_weights = (1 << np.arange(num_bits, dtype=np.int64))
+
+        self._entries = OrderedDict()  # entry id -> _Entry, least recently used first
+        self._buckets = {}  # (table, namespace, signature) -> set of entry ids
+        self._ids = itertools.count()
+        self._version = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+    def _normalized(self, vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        return vector / (np.linalg.norm(vector) + 1e-12)
+
+    def _signatures(self, vector):
+        bits = (self._planes @ vector > 0).reshape(self._num_tables, -1)
+        return [int(s) for s in bits.astype(np.int64) @ self._bit_weights]
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        for table, signature in enumerate(entry.signatures):
+            bucket = self._buckets.get((table, entry.namespace, signature))
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[(table, entry.namespace, signature)]
+
+    def get(self, namespace, vector):
+        """Returns a copy of the cached value of the most similar query above the threshold, or None."""
+        vector = self._normalized(vector)
+        signatures = self._signatures(vector)
+        now = time.time()
+
+        with self._lock:
+            candidates = set()
+            for table, signature in enumerate(signatures):
+                candidates |= self._buckets.get((table, namespace, signature), set())
+
+            best_id, best_score = None, self.threshold
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if self.ttl and now - entry.created > self.ttl:
+                    self._remove(entry_id)
+                    self._stats["expired"] += 1
+                    continue
+                score = float(entry.vector @ vector)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self._stats["hits"] += 1
+            return copy.deepcopy(self._entries[best_id].value)
+
+    def put(self, namespace, vector, value):
+        vector = self._normalized(vector)
+        signatures = self._signatures(vector)
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = _Entry(namespace, vector, copy.deepcopy(value), time.time(), signatures)
+            for table, signature in enumerate(signatures):
+                self._buckets.setdefault((table, namespace, signature), set()).add(entry_id)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def check_version(self, version):
+        """Clears the cache if `version` (any comparable snapshot identifier) differs from the last one seen."""
+        with self._lock:
+            if version == self._version:
+                return
+            if self._version is not None and self._entries:
+                logger.info(f"♻️ Index version changed ({self._version} → {version}); dropping {len(self._entries)} cached searches")
+                self._stats["invalidations"] += 1
+            self._entries.clear()
+            self._buckets.clear()
+            self._version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["size"] = len(self._entries)
+        snapshot["max_size"] = self.max_size
+        snapshot["threshold"] = self.threshold
+        return snapshot
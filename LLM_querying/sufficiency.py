@@ -0,0 +1,93 @@
+import os
+import logging
+import threading
+
+import numpy as np
+
+from LLM_querying.thought_planner import collect_search_targets
+
+logger = logging.getLogger(__name__)
+
+# Local sufficiency estimator config. Off by default: the thresholds below are not yet calibrated
+# for bge-base embeddings, whose cosine scores bunch up high even for loosely related text.
+SUFFICIENCY_FAST_PATH = os.getenv("SUFFICIENCY_FAST_PATH", "0") != "0"
+ASPECT_MATCH_THRESHOLD = float(os.getenv("SUFFICIENCY_ASPECT_MATCH", "0.80"))  # cosine for "aspect covered"
+SUFFICIENT_COVERAGE = float(os.getenv("SUFFICIENCY_HIGH", "0.90"))  # at or above: YES without the LLM
+INSUFFICIENT_COVERAGE = float(os.getenv("SUFFICIENCY_LOW", "0.30"))  # at or below: NO without the LLM
+
+_stats_lock = threading.Lock()
+sufficiency_stats = {"local_yes": 0, "local_no": 0, "llm_judgments": 0}
+
+
+def collect_plan_aspects(plan):
+    """
+    Returns the sub-aspects a plan looks for: the targets of its `search_*` steps. Other targets
+    (thinker names, graph expansions) describe how to search, not what the answer must cover.
+    """
+    return [t for t in collect_search_targets(plan.get("steps", [])) if t.strip()]
+
+
+def coverage_score(aspects, context_chunks, encode):
+    """
+    Fraction of aspects whose best-matching context chunk has cosine similarity of at least
+    `ASPECT_MATCH_THRESHOLD`. `encode` maps a list of texts to a {text: vector} dictionary.
+    Returns None when there are no aspects to score against.
+    """
+    aspects = list(dict.fromkeys(aspects))
+    if not aspects:
+        return None
+    if not context_chunks:
+        return 0.0
+
+    vectors = encode(aspects + list(context_chunks))
+    aspect_matrix = np.asarray([vectors[a] for a in aspects], dtype=np.float32)
+    chunk_matrix = np.asarray([vectors[c] for c in context_chunks], dtype=np.float32)
+
+    aspect_matrix /= np.linalg.norm(aspect_matrix, axis=1, keepdims=True) + 1e-12
+    chunk_matrix /= np.linalg.norm(chunk_matrix, axis=1, keepdims=True) + 1e-12
+
+    best = (aspect_matrix @ chunk_matrix.T).max(axis=1)
+    return float((best >= ASPECT_MATCH_THRESHOLD).mean())
+
+
+def estimate_sufficiency(aspects, context_chunks, encode):
+    """
+    Cheap local judgment: True / False when the coverage score is decisive, None when it is
+    ambiguous and the LLM judge should be asked.
+    """
+    if not SUFFICIENCY_FAST_PATH:
+        return None
+
+    try:
+        score = coverage_score(aspects, context_chunks, encode)
+    except Exception as e:
+        logger.warning(f"⚠️ Local sufficiency estimate failed, deferring to LLM: {e}")
+        return None
+
+    if score is None:
+        return None
+
+    if score >= SUFFICIENT_COVERAGE:
+        verdict = True
+    elif score <= INSUFFICIENT_COVERAGE:
+        verdict = False
+    else:
+        logger.info(f"🤔 Coverage {score:.2f} is ambiguous, asking the LLM judge")
+        return None
+
+    with _stats_lock:
+        sufficiency_stats["local_yes" if verdict else "local_no"] += 1
+        skipped = sufficiency_stats["local_yes"] + sufficiency_stats["local_no"]
+    logger.info(f"⚡ Coverage {score:.2f} → {'YES' if verdict else 'NO'} locally "
+                f"({skipped} LLM judgments skipped so far)")
+    return verdict
+
+
+def record_llm_judgment():
+    with _stats_lock:
+        sufficiency_stats["llm_judgments"] += 1
+
+
+def get_sufficiency_stats():
+    with _stats_lock:
+        return dict(sufficiency_stats)
@@ -1,11 +1,21 @@
-from LLM_querying.thought_planner import decompose_question
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from LLM_querying.thought_planner import decompose_question, adecompose_question, collect_search_targets
 from LLM_querying.tools import *
 from LLM_querying.rag_engine import build_rag_prompt
 from LLM_querying.mistral_api import call_mistral_chat
+from LLM_querying.async_mistral_api import acall_mistral_chat
+from LLM_querying.context_packer import dedupe_chunks, pack_context
+from LLM_querying.sufficiency import collect_plan_aspects, estimate_sufficiency, record_llm_judgment
+from LLM_querying.tracing import span, traced, start_trace, propagate, context_bound
 
-def is_context_sufficient(question, context_chunks):
+# Max number of plan steps executed concurrently in each loop
+STEP_PARALLELISM = int(os.getenv("AGENT_STEP_PARALLELISM", "4"))
+
+def build_sufficiency_prompt(question, context_chunks):
     joined = "\n\n".join(context_chunks)
-    prompt = f"""
+    return f"""
 <context>
 {joined}
 </context>
@@ -16,12 +26,42 @@ Question: {question}
 
 Respond with YES or NO only.
 """
-    response = call_mistral_chat(prompt).strip().upper()
-    return response.startswith("YES")
 
-def revise_search_plan(question, context_chunks):
+def encode_context(texts):
+    """Embeds context chunks (and aspects) for packing and sufficiency scoring, in memory only."""
+    return encode_queries(texts, persist=False)
+
+def is_context_sufficient(question, context_chunks, aspects=None):
+    """
+    Decides whether the context answers the question. When the plan's sub-aspects are given,
+    a local embedding-coverage estimate is tried first and the LLM is only asked if it is ambiguous.
+    """
+    with span("sufficiency_check", chunks=len(context_chunks)) as s:
+        if aspects:
+            verdict = estimate_sufficiency(aspects, context_chunks, encode_context)
+            if verdict is not None:
+                s.set(source="local", verdict=verdict)
+                return verdict
+        record_llm_judgment()
+        response = call_mistral_chat(build_sufficiency_prompt(question, context_chunks)).strip().upper()
+        s.set(source="llm", verdict=response.startswith("YES"))
+        return response.startswith("YES")
+
+async def ais_context_sufficient(question, context_chunks, aspects=None):
+    with span("sufficiency_check", chunks=len(context_chunks)) as s:
+        if aspects:
+            verdict = await asyncio.to_thread(estimate_sufficiency, aspects, context_chunks, encode_context)
+            if verdict is not None:
+                s.set(source="local", verdict=verdict)
+                return verdict
+        record_llm_judgment()
+        response = (await acall_mistral_chat(build_sufficiency_prompt(question, context_chunks))).strip().upper()
+        s.set(source="llm", verdict=response.startswith("YES"))
+        return response.startswith("YES")
+
+def build_revision_prompt(question, context_chunks):
     context = "\n\n".join(context_chunks)
-    prompt = f"""
+    return f"""
 <context>
 {context}
 </context>
@@ -32,98 +72,222 @@ The user question is: {question}
 You do not yet have enough information. Suggest a revised search direction or query.
 Respond with a short updated natural language query.
 """
-    return call_mistral_chat(prompt).strip()
 
-def generate_final_answer(question, context_chunks):
+@traced("revise_search_plan")
+def revise_search_plan(question, context_chunks):
+    return call_mistral_chat(build_revision_prompt(question, context_chunks)).strip()
+
+@traced("revise_search_plan")
+async def arevise_search_plan(question, context_chunks):
+    return (await acall_mistral_chat(build_revision_prompt(question, context_chunks))).strip()
+
+def print_final_context(context_chunks):
     print("\n🧠 Final context used:\n")
     for chunk in context_chunks:
         print(f"- {chunk[:200]}...\n")  # print preview of each chunk
+
+@traced("generate_final_answer")
+def generate_final_answer(question, context_chunks):
+    print_final_context(context_chunks)
     prompt = build_rag_prompt(context_chunks, question)
     return call_mistral_chat(prompt).strip()
 
-def loop_until_ready(question, max_loops=3):
+@traced("generate_final_answer")
+async def agenerate_final_answer(question, context_chunks):
+    print_final_context(context_chunks)
+    prompt = build_rag_prompt(context_chunks, question)
+    return (await acall_mistral_chat(prompt)).strip()
+
+def generate_final_answer_stream(question, context_chunks):
+    """
+    Streaming variant of `generate_final_answer`: yields answer tokens as Mistral produces them.
+    """
+    print_final_context(context_chunks)
+    prompt = build_rag_prompt(context_chunks, question)
+    yield from call_mistral_chat(prompt, stream=True)
+
+def run_step(step, embeddings=None):
+    """
+    Executes a single plan step and returns the context chunks it produced, in order.
+    `embeddings` maps search targets to precomputed query vectors.
+    """
+    embeddings = embeddings or {}
+    lookup = lambda t: embeddings.get(t) if isinstance(t, str) else None
+    new_chunks = []
+    action = step["action"]
+    target = step["target"]
+
+    if action == "search_beliefs":
+        for snippet in get_belief_contents(search_beliefs(target, query_embedding=lookup(target))):
+            if snippet: new_chunks.append(snippet)
+
+    elif action == "search_concepts":
+        targets = target if isinstance(target, list) else [target]
+        concept_ids = [cid for t in targets for cid in search_concepts(t, query_embedding=lookup(t))]
+        for snippet in get_concept_contents(concept_ids):
+            if snippet: new_chunks.append(snippet)
+
+    elif action in ("expand_concepts", "expand_beliefs"):
+        targets = target if isinstance(target, list) else [target]
+        expand_batch = expand_concepts_batch if action == "expand_concepts" else expand_beliefs_batch
+        try:
+            expanded = expand_batch(targets)
+            for t in targets:
+                if expanded.get(t):
+                    new_chunks.append(f"Expanded: {expanded[t]}")
+        except Exception as e:
+            print(f"⚠️ {action} failed for {target}: {e}")
+
+    elif action == "get_concept_path":
+        if isinstance(target, list) and len(target) == 2:
+            try:
+                path = get_concept_path(target[0], target[1])
+                if path:
+                    new_chunks.append(f"Path: {path}")
+            except Exception as e:
+                print(f"⚠️ get_concept_path failed for {target}: {e}")
+
+    return new_chunks
+
+@traced("run_steps")
+def run_steps(steps, max_workers=STEP_PARALLELISM):
+    """
+    Executes independent plan steps concurrently on a thread pool.
+    Chunks are returned in plan order regardless of completion order; a failing step
+    only loses its own chunks.
+    """
+    if not steps:
+        return []
+
+    # Embed all search targets of the plan in one batched forward pass
+    embeddings = {}
+    targets = collect_search_targets(steps)
+    if targets:
+        try:
+            embeddings = encode_queries(targets)
+        except Exception as e:
+            print(f"⚠️ Batched encoding failed, falling back to per-step encoding: {e}")
+
+    def safe_run(step):
+        with span(f"step.{step.get('action')}", target=str(step.get("target"))[:80]) as s:
+            try:
+                chunks = run_step(step, embeddings)
+            except Exception as e:
+                print(f"⚠️ {step.get('action')} failed for {step.get('target')}: {e}")
+                chunks = []
+            s.set(chunks=len(chunks))
+            return chunks
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(steps)))) as executor:
+        # Each worker runs in a copy of this context, so step spans join the caller's trace
+        results = list(executor.map(propagate(safe_run), steps))
+
+    return [chunk for step_chunks in results for chunk in step_chunks]
+
+def gather_context(question, max_loops=3, max_workers=STEP_PARALLELISM):
+    """
+    Runs the plan → search → sufficiency loop, yielding progress events as dictionaries.
+    The generator's return value is the packed (deduplicated, ranked, token-budgeted) context.
+    """
     context_chunks = []
+    question_aspects = []
     current_query = question
     loops = 0
 
     while loops < max_loops:
         print(f"\n🔁 Loop {loops+1}: Planning for — {current_query}")
+        yield {"type": "loop", "loop": loops + 1, "query": current_query}
         plan = decompose_question(current_query)
+        yield {"type": "plan", "steps": plan.get("steps", [])}
+        question_aspects = question_aspects or collect_plan_aspects(plan)
+
+        new_chunks = run_steps(plan.get("steps", []), max_workers=max_workers)
+        context_chunks = dedupe_chunks(context_chunks + new_chunks)
+        packed = pack_context(question, context_chunks, encode=encode_context)
+        yield {"type": "context", "new_chunks": len(new_chunks), "total_chunks": len(context_chunks),
+               "packed_chunks": len(packed)}
+
+        if is_context_sufficient(question, packed, aspects=question_aspects):
+            print("\n✅ Context sufficient. Generating final answer...")
+            yield {"type": "sufficient", "loop": loops + 1}
+            return packed
+
+        print("\n⚠️ Context insufficient. Revising plan...")
+        current_query = revise_search_plan(question, packed)
+        yield {"type": "revised", "query": current_query}
+        loops += 1
+
+    print("\n🚨 Max loops reached. Generating best-effort answer...")
+    yield {"type": "max_loops", "loops": loops}
+    return pack_context(question, context_chunks, encode=encode_context)
+
+def loop_until_ready(question, max_loops=3, max_workers=STEP_PARALLELISM, with_trace=False):
+    """
+    Runs the agent loop and returns the final answer, or `(answer, trace)` with `with_trace=True`
+    (see `LLM_querying.tracing.Trace`: per-stage durations, sizes and cache hits of this request).
+    """
+    with start_trace("loop_until_ready", question=question) as trace:
+        events = gather_context(question, max_loops=max_loops, max_workers=max_workers)
+        while True:
+            try:
+                next(events)
+            except StopIteration as done:
+                context_chunks = done.value
+                break
+
+        answer = generate_final_answer(question, context_chunks)
+    return (answer, trace) if with_trace else answer
+
+@context_bound
+def loop_until_ready_stream(question, max_loops=3, max_workers=STEP_PARALLELISM):
+    """
+    Streaming variant of `loop_until_ready`. Yields agent progress events, then one
+    `{"type": "token"}` event per answer delta, and finally `{"type": "done", "answer": ..., "trace": ...}`.
+    """
+    with start_trace("loop_until_ready_stream", question=question) as trace:
+        context_chunks = yield from gather_context(question, max_loops=max_loops, max_workers=max_workers)
+
+        yield {"type": "answer_start"}
+        parts = []
+        for token in generate_final_answer_stream(question, context_chunks):
+            parts.append(token)
+            yield {"type": "token", "text": token}
+
+    yield {"type": "done", "answer": "".join(parts).strip(), "trace": trace.to_dict()}
+
+async def aloop_until_ready(question, max_loops=3, max_workers=STEP_PARALLELISM, with_trace=False):
+    """
+    Async variant of `loop_until_ready`. LLM calls go through the rate-limited async client,
+    and the (blocking) database steps run in a worker thread, so one process can multiplex
+    many questions on a single event loop.
+    """
+    with start_trace("aloop_until_ready", question=question) as trace:
+        answer = await _aanswer(question, max_loops, max_workers)
+    return (answer, trace) if with_trace else answer
+
+async def _aanswer(question, max_loops, max_workers):
+    context_chunks = []
+    question_aspects = []
+    current_query = question
+    loops = 0
+
+    while loops < max_loops:
+        print(f"\n🔁 Loop {loops+1}: Planning for — {current_query}")
+        plan = await adecompose_question(current_query)
+        question_aspects = question_aspects or collect_plan_aspects(plan)
+
+        new_chunks = await asyncio.to_thread(run_steps, plan.get("steps", []), max_workers)
+        context_chunks = dedupe_chunks(context_chunks + new_chunks)
+        packed = await asyncio.to_thread(pack_context, question, context_chunks, encode_context)
 
-        new_chunks = []
-
-        for step in plan.get("steps", []):
-            action = step["action"]
-            target = step["target"]
-
-            if action == "search_beliefs":
-                for bid in search_beliefs(target):
-                    snippet = get_belief_content(bid)
-                    if snippet: new_chunks.append(snippet)
-
-            elif action == "search_concepts":
-                if isinstance(target, list):
-                    for t in target:
-                        for cid in search_concepts(t):
-                            snippet = get_concept_content(cid)
-                            if snippet: new_chunks.append(snippet)
-                else:
-                    for cid in search_concepts(target):
-                        snippet = get_concept_content(cid)
-                        if snippet: new_chunks.append(snippet)
-
-            elif action == "expand_concepts":
-                if isinstance(target, list):
-                    for t in target:
-                        try:
-                            result = expand_concepts(t)
-                            if result:
-                                new_chunks.append(f"Expanded: {result}")
-                        except Exception as e:
-                            print(f"⚠️ expand_concepts failed for {t}: {e}")
-                else:
-                    try:
-                        result = expand_concepts(target)
-                        if result:
-                            new_chunks.append(f"Expanded: {result}")
-                    except Exception as e:
-                        print(f"⚠️ expand_concepts failed for {target}: {e}")
-
-            elif action == "expand_beliefs":
-                if isinstance(target, list):
-                    for t in target:
-                        try:
-                            result = expand_beliefs(t)
-                            if result:
-                                new_chunks.append(f"Expanded: {result}")
-                        except Exception as e:
-                            print(f"⚠️ expand_beliefs failed for {t}: {e}")
-                else:
-                    try:
-                        result = expand_beliefs(target)
-                        if result:
-                            new_chunks.append(f"Expanded: {result}")
-                    except Exception as e:
-                        print(f"⚠️ expand_beliefs failed for {target}: {e}")
-
-            elif action == "get_concept_path":
-                if isinstance(target, list) and len(target) == 2:
-                    try:
-                        path = get_concept_path(target[0], target[1])
-                        if path:
-                            new_chunks.append(f"Path: {path}")
-                    except Exception as e:
-                        print(f"⚠️ get_concept_path failed for {target}: {e}")
-
-        context_chunks.extend(new_chunks)
-
-        if is_context_sufficient(question, context_chunks):
+        if await ais_context_sufficient(question, packed, aspects=question_aspects):
             print("\n✅ Context sufficient. Generating final answer...")
-            return generate_final_answer(question, context_chunks)
+            return await agenerate_final_answer(question, packed)
 
         print("\n⚠️ Context insufficient. Revising plan...")
-        current_query = revise_search_plan(question, context_chunks)
+        current_query = await arevise_search_plan(question, packed)
         loops += 1
 
     print("\n🚨 Max loops reached. Generating best-effort answer...")
-    return generate_final_answer(question, context_chunks)
\ No newline at end of file
+    packed = await asyncio.to_thread(pack_context, question, context_chunks, encode_context)
+    return await agenerate_final_answer(question, packed)
@@ -2,16 +2,13 @@ import json
 import re
 import logging
 from LLM_querying.mistral_api import call_mistral_chat
+from LLM_querying.async_mistral_api import acall_mistral_chat
+from LLM_querying.tracing import span
 
 logger = logging.getLogger(__name__)
 
-def decompose_question(question: str) -> dict:
-    """
-    Uses Mistral to break down a philosophical question into a structured reasoning/search plan.
-    Returns a dictionary with a list of {action, target} steps.
-    Also logs detailed trace information.
-    """
-    prompt = f"""
+def build_plan_prompt(question: str) -> str:
+    return f"""
 You are a philosophical research planner.
 
 Your task is to break down the user's question into concrete information-gathering steps
@@ -36,25 +33,67 @@ Only return a JSON object with this format:
 User Question: {question}
 """
 
-    logger.info("🔁 Decomposing question — %s", question)
 
-    try:
-        response = call_mistral_chat(prompt)
-        logger.info("🧠 Mistral raw output:\n%s", response)
-
-        match = re.search(r"\{.*\}", response, re.DOTALL)
-        if match:
-            try:
-                steps = json.loads(match.group())
-                logger.info("🧭 Decomposed Plan:\n%s", json.dumps(steps, indent=2))
-                return steps
-            except json.JSONDecodeError as e:
-                logger.warning("❌ JSON parsing error: %s", str(e))
-                logger.debug("Raw matched block:\n%s", match.group())
-                return {"steps": []}
-        else:
-            logger.warning("⚠️ No JSON block found in response.")
+def parse_plan(response: str) -> dict:
+    """Extracts the JSON plan from Mistral's raw output; returns an empty plan if it can't be parsed."""
+    logger.info("🧠 Mistral raw output:\n%s", response)
+
+    match = re.search(r"\{.*\}", response, re.DOTALL)
+    if match:
+        try:
+            steps = json.loads(match.group())
+            logger.info("🧭 Decomposed Plan:\n%s", json.dumps(steps, indent=2))
+            return steps
+        except json.JSONDecodeError as e:
+            logger.warning("❌ JSON parsing error: %s", str(e))
+            logger.debug("Raw matched block:\n%s", match.group())
             return {"steps": []}
-    except Exception as e:
-        logger.error("❌ Error during decompose_question: %s", str(e))
+    else:
+        logger.warning("⚠️ No JSON block found in response.")
         return {"steps": []}
+
+
+def collect_search_targets(steps):
+    """
+    Returns every text that a plan's search steps will embed, including list-valued targets.
+    """
+    texts = []
+    for step in steps:
+        if step.get("action") in ("search_beliefs", "search_concepts"):
+            target = step.get("target")
+            for t in (target if isinstance(target, list) else [target]):
+                if isinstance(t, str):
+                    texts.append(t)
+    return texts
+
+
+def decompose_question(question: str) -> dict:
+    """
+    Uses Mistral to break down a philosophical question into a structured reasoning/search plan.
+    Returns a dictionary with a list of {action, target} steps.
+    Also logs detailed trace information.
+    """
+    logger.info("🔁 Decomposing question — %s", question)
+
+    with span("decompose_question") as s:
+        try:
+            plan = parse_plan(call_mistral_chat(build_plan_prompt(question)))
+        except Exception as e:
+            logger.error("❌ Error during decompose_question: %s", str(e))
+            plan = {"steps": []}
+        s.set(steps=len(plan.get("steps", [])))
+        return plan
+
+
+async def adecompose_question(question: str) -> dict:
+    """Async variant of `decompose_question` built on the rate-limited async Mistral client."""
+    logger.info("🔁 Decomposing question — %s", question)
+
+    with span("decompose_question") as s:
+        try:
+            plan = parse_plan(await acall_mistral_chat(build_plan_prompt(question)))
+        except Exception as e:
+            logger.error("❌ Error during adecompose_question: %s", str(e))
+            plan = {"steps": []}
+        s.set(steps=len(plan.get("steps", [])))
+        return plan
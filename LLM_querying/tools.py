@@ -1,36 +1,80 @@
 from LLM_querying.DB_operations.pinecone_operations import *
 from LLM_querying.DB_operations.neon_operations import *
 from LLM_querying.DB_operations.neo4j_operations import *
+from LLM_querying.DB_operations.graph_snapshot import get_graph_snapshot, use_local_graph
+from LLM_querying.DB_operations.distance_oracle import get_distance_oracle, find_distance_oracle
+from LLM_querying.tracing import traced
 
 
-def search_beliefs(query, top_k=5):
-    return vector_search_beliefs(query, top_k=top_k)
+def warmup(pinecone=True, neon=True, neo4j=True):
+    """
+    Preloads the embedding model and opens the Pinecone, Neon and Neo4j connections.
+    Everything is otherwise created lazily on first use; servers can call this at startup.
+    """
+    if pinecone:
+        warmup_pinecone()
+    if neon:
+        warmup_neon()
+    if neo4j:
+        warmup_neo4j()
 
 
-def search_concepts(query, top_k=5):
-    return vector_search_concepts(query, top_k=top_k)
+def search_beliefs(query, top_k=5, query_embedding=None):
+    return vector_search_beliefs(query, top_k=top_k, query_embedding=query_embedding)
+
+
+def search_concepts(query, top_k=5, query_embedding=None):
+    return vector_search_concepts(query, top_k=top_k, query_embedding=query_embedding)
 
 
 def get_belief_content(belief_id):
-    metadata = get_metadata(belief_id)
-    sep_id = metadata.get("sep_id") if metadata else None
-    if sep_id:
-        title = get_title(sep_id) or "Untitled"
-        content = get_content(sep_id)
+    return get_belief_contents([belief_id])[0]
+
+
+@traced("tools.get_belief_contents")
+def get_belief_contents(belief_ids):
+    """
+    Batch variant of `get_belief_content`: one Pinecone fetch and one Neon query for all IDs.
+    Returns snippets in input order, with None where nothing was found.
+    """
+    metadata = get_metadata_batch(belief_ids)
+    sep_ids = [(metadata.get(bid) or {}).get("sep_id") for bid in belief_ids]
+    documents = get_titles_and_contents(sep_ids)
+
+    snippets = []
+    for sep_id in sep_ids:
+        title, content = documents.get(sep_id, (None, None)) if sep_id else (None, None)
         if content:
-            return f"[SEP {sep_id} - {title}]\n{content[:600]}"
-    return None
+            snippets.append(f"[SEP {sep_id} - {title or 'Untitled'}]\n{content[:600]}")
+        else:
+            snippets.append(None)
+    return snippets
+
 
 def get_concept_content(concept_id):
-    metadata = get_metadata(concept_id)
-    name = metadata.get("name") if metadata else None
-    description = metadata.get("description") if metadata else None
+    return get_concept_contents([concept_id])[0]
+
 
-    if name and description:
-        return f"[Concept: {name}]\n{description[:600]}"
-    elif name:
-        return f"[Concept: {name}]\n(No description available)"
-    return None
+@traced("tools.get_concept_contents")
+def get_concept_contents(concept_ids):
+    """
+    Batch variant of `get_concept_content`: one Pinecone fetch for all IDs.
+    Returns snippets in input order, with None where nothing was found.
+    """
+    metadata = get_metadata_batch(concept_ids)
+
+    snippets = []
+    for cid in concept_ids:
+        name = (metadata.get(cid) or {}).get("name")
+        description = (metadata.get(cid) or {}).get("description")
+
+        if name and description:
+            snippets.append(f"[Concept: {name}]\n{description[:600]}")
+        elif name:
+            snippets.append(f"[Concept: {name}]\n(No description available)")
+        else:
+            snippets.append(None)
+    return snippets
 
 
 def get_document_metadata(belief_id):
@@ -63,17 +107,40 @@ def get_associated_eras_from_belief(belief_id):
 
 
 def expand_concepts(concept_id, top_k=5):
-    
-    return get_nearest_concept(concept_id, top_k=top_k)
+    return expand_concepts_batch([concept_id], top_k=top_k)[concept_id]
 
 
 def expand_beliefs(belief_id, top_k=5):
-    return get_nearest_belief(belief_id, top_k=top_k)
+    return expand_beliefs_batch([belief_id], top_k=top_k)[belief_id]
+
+
+@traced("tools.expand_concepts_batch")
+def expand_concepts_batch(concept_ids, top_k=5):
+    if use_local_graph():
+        return get_graph_snapshot().nearest_concepts(concept_ids, top_k=top_k)
+    return get_nearest_concepts(concept_ids, top_k=top_k)
+
+
+@traced("tools.expand_beliefs_batch")
+def expand_beliefs_batch(belief_ids, top_k=5):
+    if use_local_graph():
+        return get_graph_snapshot().nearest_beliefs(belief_ids, top_k=top_k)
+    return get_nearest_beliefs(belief_ids, top_k=top_k)
 
 
+@traced("tools.get_concept_path")
 def get_concept_path(concept1_id, concept2_id):
-    return get_shortest_path(concept1_id, concept2_id)
+    if use_local_graph():
+        return get_distance_oracle().shortest_path(concept1_id, concept2_id)
+    # An oracle built from a snapshot answers unreachable pairs without the Neo4j search
+    oracle = find_distance_oracle()
+    if oracle is not None and oracle.known_unreachable(concept1_id, concept2_id):
+        return []
+    return get_shortest_path(concept1_id, concept2_id, max_length=CONCEPT_PATH_MAX_HOPS)
 
 
+@traced("tools.get_neighbors_within_distance")
 def get_neighbors_within_distance(node_id, distance):
+    if use_local_graph():
+        return get_graph_snapshot().within_distance(node_id, distance)
     return get_nodes_within_distance(node_id, distance)
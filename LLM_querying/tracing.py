@@ -0,0 +1,345 @@
+import os
+import json
+import atexit
+import time
+import uuid
+import bisect
+import inspect
+import logging
+import functools
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Tracing config
+TRACE_HISTOGRAMS = os.getenv("TRACE_HISTOGRAMS", "0") != "0"  # aggregate span durations across requests
+TRACE_HISTOGRAMS_PATH = os.getenv("TRACE_HISTOGRAMS_PATH")  # if set, histograms are exported there at exit
+HISTOGRAM_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# The trace of the request being served, and the innermost open span (parent of new spans)
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed stage of a request; `attrs` holds sizes, counts and cache outcomes."""
+
+    __slots__ = ("id", "name", "parent", "start", "duration", "attrs")
+
+    def __init__(self, span_id, name, parent, start, attrs):
+        self.id = span_id
+        self.name = name
+        self.parent = parent
+        self.start = start
+        self.duration = None
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {"id": self.id, "name": self.name, "parent": self.parent, "start": round(self.start, 6),
+                "duration": round(self.duration or 0.0, 6), "attrs": self.attrs}
+
+
+class _NoopSpan:
+    """Handed out when no trace is active and histograms are off, so instrumentation costs next to nothing."""
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """
+    Spans and counters recorded while serving one request. Thread-safe: spans from worker
+    threads (see `propagate`) land in the same trace.
+    """
+
+    def __init__(self, name, **attrs):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.duration = None
+        self.spans = []
+        self.counters = {}
+        self._t0 = time.perf_counter()
+        self._span_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.perf_counter() - self._t0
+
+    def open_span(self, name, parent, attrs):
+        with self._lock:
+            return Span(next(self._span_ids), name, parent, self.elapsed(), attrs)
+
+    def add_span(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def finish(self):
+        self.duration = self.elapsed()
+
+    def summary(self):
+        """Per span name: calls, total and max seconds, largest total first."""
+        summary = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            entry = summary.setdefault(span.name, {"calls": 0, "total": 0.0, "max": 0.0})
+            entry["calls"] += 1
+            entry["total"] += span.duration or 0.0
+            entry["max"] = max(entry["max"], span.duration or 0.0)
+        ordered = sorted(summary.items(), key=lambda item: -item[1]["total"])
+        return {name: {"calls": e["calls"], "total": round(e["total"], 6), "max": round(e["max"], 6)}
+                for name, e in ordered}
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+            counters = dict(self.counters)
+        return {
+            "id": self.id,
+            "name": self.name,
+            "attrs": self.attrs,
+            "started_at": self.started_at,
+            "duration": round(self.duration if self.duration is not None else self.elapsed(), 6),
+            "summary": self.summary(),
+            "counters": counters,
+            "spans": [span.to_dict() for span in spans],
+        }
+
+    def format(self):
+        """Compact text table of `summary()` for logs."""
+        lines = [f"🧭 Trace {self.id} ({self.name}): {self.duration or self.elapsed():.3f}s"]
+        for name, entry in self.summary().items():
+            lines.append(f"   ➤ {name:<32} {entry['calls']:>4}× {entry['total'] * 1000:>9.1f} ms "
+                         f"(max {entry['max'] * 1000:.1f} ms)")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"   ➤ {name:<32} {value:>4}")
+        return "\n".join(lines)
+
+
+class Histograms:
+    """Cumulative per-span-name duration histograms (fixed buckets), aggregated across requests."""
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = {"counts": [0] * (len(self.buckets) + 1), "count": 0, "sum": 0.0}
+            series["counts"][index] += 1
+            series["count"] += 1
+            series["sum"] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {"buckets": list(self.buckets),
+                    "series": {name: dict(s, counts=list(s["counts"])) for name, s in self._series.items()}}
+
+    def to_prometheus(self, metric="phil_rag_span_seconds"):
+        """Prometheus text exposition format, one labelled histogram per span name."""
+        snapshot = self.snapshot()
+        lines = [f"# TYPE {metric} histogram"]
+        for name, series in sorted(snapshot["series"].items()):
+            cumulative = 0
+            for bound, observed in zip(snapshot["buckets"] + ["+Inf"], series["counts"]):
+                cumulative += observed
+                lines.append(f'{metric}_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{span="{name}"}} {series["sum"]:.6f}')
+            lines.append(f'{metric}_count{{span="{name}"}} {series["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+histograms = Histograms()
+
+
+class _SpanContext:
+    """Context manager behind `span()`; a plain class keeps the no-trace path cheap."""
+
+    __slots__ = ("name", "attrs", "trace", "span", "token", "started")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.trace = _current_trace.get()
+        if self.trace is None and not TRACE_HISTOGRAMS:
+            self.span = None
+            return _NOOP_SPAN
+        self.started = time.perf_counter()
+        if self.trace is None:
+            self.span = Span(0, self.name, None, 0.0, self.attrs)
+            self.token = None
+        else:
+            self.span = self.trace.open_span(self.name, _current_span.get(), self.attrs)
+            self.token = _current_span.set(self.span.id)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is None:
+            return False
+        self.span.duration = time.perf_counter() - self.started
+        if exc_type is not None:
+            self.span.attrs["error"] = exc_type.__name__
+        if self.token is not None:
+            _reset(_current_span, self.token)
+        if self.trace is not None:
+            self.trace.add_span(self.span)
+        if TRACE_HISTOGRAMS:
+            histograms.observe(self.name, self.span.duration)
+        return False
+
+
+def _reset(var, token):
+    try:
+        var.reset(token)
+    except ValueError:
+        # Token from another context, e.g. a generator (not `context_bound`) finalized elsewhere;
+        # that context owns the value, so leave the current one alone
+        pass
+
+
+def span(name, **attrs):
+    """
+    Times a block as a span of the current trace (`with span("neon.titles", ids=3) as s: ... s.set(rows=2)`).
+    Without an active trace (and with histograms off) it does nothing.
+    """
+    return _SpanContext(name, attrs)
+
+
+def traced(name):
+    """Decorator form of `span` for whole functions (plain or async)."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _SpanContext(name, {}):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _SpanContext(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, amount=1):
+    """Adds to a per-request counter (e.g. cache hits) of the current trace, if any."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(name, amount)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(name, **attrs):
+    """
+    Makes a new `Trace` current for the duration of the block and yields it.
+    Nested calls (e.g. a traced helper inside a traced request) reuse the outer trace.
+    """
+    outer = _current_trace.get()
+    if outer is not None:
+        yield outer
+        return
+
+    trace = Trace(name, **attrs)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        trace.finish()
+        _reset(_current_span, span_token)
+        _reset(_current_trace, trace_token)
+        logger.debug(trace.format())
+
+
+def context_bound(gen_func):
+    """
+    Decorator for generator functions that open spans or traces across `yield`s: every step
+    runs inside one dedicated copy of the context current at the first step, so the open trace
+    and span never leak to the consumer between items, and are reset in the context that set
+    them even when the consumer abandons the generator.
+    """
+    @functools.wraps(gen_func)
+    def wrapper(*args, **kwargs):
+        context = contextvars.copy_context()
+        gen = gen_func(*args, **kwargs)
+        step, value = gen.send, None
+        try:
+            while True:
+                try:
+                    item = context.run(step, value)
+                except StopIteration as done:
+                    return done.value
+                try:
+                    step, value = gen.send, (yield item)
+                except GeneratorExit:
+                    raise
+                except BaseException as exc:
+                    step, value = gen.throw, exc
+        finally:
+            context.run(gen.close)
+    return wrapper
+
+
+def propagate(func):
+    """
+    Wraps `func` so it runs in a copy of the caller's context: spans opened in thread-pool
+    workers then join the caller's trace under the caller's current span.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+
+def export_histograms(path=None):
+    """
+    Writes the aggregated histograms to `path` (default `TRACE_HISTOGRAMS_PATH`), as Prometheus
+    text if it ends in `.prom` and JSON otherwise.
+    """
+    path = path or TRACE_HISTOGRAMS_PATH
+    if not path:
+        raise ValueError("No histogram export path given and TRACE_HISTOGRAMS_PATH is not set")
+    with open(path, "w", encoding="utf-8") as f:
+        if path.endswith(".prom"):
+            f.write(histograms.to_prometheus())
+        else:
+            json.dump(histograms.snapshot(), f, indent=2)
+    logger.info(f"📝 Span histograms written to {path}")
+    return path
+
+
+if TRACE_HISTOGRAMS and TRACE_HISTOGRAMS_PATH:
+    atexit.register(export_histograms)
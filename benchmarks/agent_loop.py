@@ -0,0 +1,542 @@
+"""
+Offline benchmark for the agent loop and the tools layer.
+
+Pinecone, Neo4j, Neon (psycopg2), the embedding model and Mistral are replaced by in-process
+stand-ins that sleep for a sampled latency and answer from a synthetic corpus, so
+`loop_until_ready` can be measured without any live service. Reports per-stage and end-to-end
+p50/p95/p99 latency and throughput:
+
+    python benchmarks/agent_loop.py --questions 40 --concurrency 4
+    python benchmarks/agent_loop.py --mistral-latency 0.8:0.3 --index-latency 0.04:0.01 --json run.json
+    python benchmarks/agent_loop.py --compare run.json   # exit code 1 if a stage's p95 regressed
+
+Latencies are given as MEAN or MEAN:STDDEV seconds (lognormal when a stddev is given).
+Plans can be scripted with --plans FILE (a JSON list of plans, used round-robin).
+The semantic search cache is off so searches reach the index stand-in; --search-cache N enables it
+(cleared after warmup) and reports its hit rate.
+"""
+import argparse
+import contextlib
+import functools
+import hashlib
+import io
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# The stand-ins replace the remote backends, so the local ones must stay off
+os.environ["VECTOR_BACKEND"] = "pinecone"
+os.environ["GRAPH_BACKEND"] = "neo4j"
+os.environ.pop("MISTRAL_CACHE_DIR", None)
+os.environ.pop("EMBEDDING_CACHE_PATH", None)
+# Every sufficiency check goes to the scripted LLM judge (so --insufficient-rate applies)
+# unless --sufficiency-fast-path is given
+os.environ["SUFFICIENCY_FAST_PATH"] = "0"
+# Repeated scripted targets would be answered from the semantic search cache, hiding the index
+# stand-in; --search-cache N turns it on (and the report then includes its hit rate)
+os.environ["SEARCH_CACHE"] = "0"
+
+from mistral_standin import DEFAULT_PLAN, scripted_response, start_standin
+
+DIM = 768
+QUESTIONS = [
+    "What is the relationship between Kantian autonomy and Nietzsche's will to power?",
+    "How do compatibilists reconcile free will with determinism?",
+    "Is virtue ethics compatible with moral realism?",
+    "What role does intentionality play in theories of consciousness?",
+    "How did the logical positivists understand the meaning of metaphysical statements?",
+    "Can a social contract ground political obligation without consent?",
+]
+
+# Stages timed in `thinker_agent` (agent loop) and in the tools layer it calls
+AGENT_STAGES = ("decompose_question", "run_steps", "pack_context", "is_context_sufficient",
+                "revise_search_plan", "generate_final_answer")
+TOOL_STAGES = ("encode_queries", "search_beliefs", "search_concepts", "get_belief_contents",
+               "get_concept_contents", "expand_concepts_batch", "expand_beliefs_batch", "get_concept_path")
+
+
+class Latency:
+    """A latency distribution: constant, or lognormal with the given mean and standard deviation."""
+
+    def __init__(self, mean=0.0, stddev=0.0, seed=None):
+        self.mean = mean
+        self.stddev = stddev
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        if stddev > 0 and mean > 0:
+            variance = math.log(1 + (stddev / mean) ** 2)
+            self._mu, self._sigma = math.log(mean) - variance / 2, math.sqrt(variance)
+
+    @classmethod
+    def parse(cls, spec, seed=None):
+        mean, _, stddev = spec.partition(":")
+        return cls(float(mean), float(stddev or 0), seed=seed)
+
+    def sample(self):
+        if self.stddev <= 0 or self.mean <= 0:
+            return self.mean
+        with self._lock:
+            return self._random.lognormvariate(self._mu, self._sigma)
+
+    def sleep(self):
+        delay = self.sample()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _seeded_vector(text):
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+### 🧪 Stand-ins
+class FakeEncoder:
+    """SentenceTransformer stand-in: deterministic text-seeded unit vectors, one sleep per call."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        self.latency.sleep()
+        if isinstance(texts, str):
+            return _seeded_vector(texts)
+        return np.stack([_seeded_vector(t) for t in texts]) if texts else np.zeros((0, DIM), np.float32)
+
+
+class SyntheticCorpus:
+    """Beliefs, concepts and SEP documents with the metadata shapes of the real stores."""
+
+    def __init__(self, num_documents=200, beliefs_per_document=5, concepts_per_document=3, seed=0):
+        rng = random.Random(seed)
+        self.ids, self.metadata, self.documents = [], [], {}
+        for doc in range(num_documents):
+            sep_id = 10000 + doc
+            title = f"Synthetic Entry {doc}"
+            beliefs = [f"Belief {b} of {title}" for b in range(beliefs_per_document)]
+            concepts = [f"concept {doc}-{c}" for c in range(concepts_per_document)]
+            self.documents[sep_id] = {
+                "title": title,
+                "content": " ".join(rng.choice(("being", "reason", "virtue", "will", "mind")) for _ in range(300)),
+                "mistral_output": {
+                    "key_beliefs": [{"belief": b} for b in beliefs],
+                    "key_concepts": [{"name": c} for c in concepts],
+                    "associated_thinkers": [f"Thinker {rng.randrange(50)}"],
+                    "associated_eras": [rng.choice(("Ancient", "Medieval", "Modern", "Contemporary"))],
+                },
+            }
+            for b, belief in enumerate(beliefs):
+                self.ids.append(f"{sep_id}_belief_{b}")
+                self.metadata.append({"sep_id": float(sep_id), "document_title": title, "type": "belief",
+                                      "belief": belief, "justification": "", "related_concepts": concepts})
+            for c, concept in enumerate(concepts):
+                self.ids.append(f"{sep_id}_concept_{c}")
+                self.metadata.append({"sep_id": float(sep_id), "document_title": title, "type": "concept",
+                                      "concept": concept, "name": concept, "description": f"{concept} in {title}"})
+
+        self.vectors = np.stack([_seeded_vector(vid) for vid in self.ids])
+        self.types = np.asarray([m["type"] for m in self.metadata])
+        self.row_of = {vid: row for row, vid in enumerate(self.ids)}
+        self.rng = rng
+        self._rng_lock = threading.Lock()
+
+    def sample_ids(self, kind, count):
+        rows = np.flatnonzero(self.types == kind)
+        with self._rng_lock:
+            return [self.ids[r] for r in self.rng.sample(list(rows), min(count, len(rows)))]
+
+
+class FakeIndex:
+    """Pinecone `Index` stand-in supporting the `query` and `fetch` calls the tools layer makes."""
+
+    def __init__(self, corpus, latency):
+        self.corpus = corpus
+        self.latency = latency
+
+    def query(self, vector, top_k=5, include_metadata=False, filter=None):
+        self.latency.sleep()
+        scores = self.corpus.vectors @ np.asarray(vector, dtype=np.float32)
+        if filter:
+            allowed = filter["type"].get("$in") or [filter["type"].get("$eq")]
+            scores = np.where(np.isin(self.corpus.types, allowed), scores, -np.inf)
+        top = np.argsort(-scores)[:top_k]
+        return {"matches": [{"id": self.corpus.ids[r], "score": float(scores[r]),
+                             "metadata": self.corpus.metadata[r] if include_metadata else {}} for r in top]}
+
+    def describe_index_stats(self):
+        return {"total_vector_count": len(self.corpus.ids), "dimension": DIM}
+
+    def fetch(self, ids, namespace=None):
+        self.latency.sleep()
+        if namespace:  # only the default namespace holds vectors here (no version marker)
+            return SimpleNamespace(vectors={})
+        rows = [self.corpus.row_of[i] for i in ids if i in self.corpus.row_of]
+        return SimpleNamespace(vectors={
+            self.corpus.ids[r]: SimpleNamespace(id=self.corpus.ids[r], metadata=self.corpus.metadata[r]) for r in rows
+        })
+
+
+class FakeResult:
+    def __init__(self, records):
+        self._records = records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def peek(self):
+        return self._records[0] if self._records else None
+
+    def single(self):
+        return self._records[0] if self._records else None
+
+    def consume(self):
+        return None
+
+
+class FakeNeo4jSession:
+    """Neo4j session stand-in: answers the tools-layer queries from their parameters, one sleep per `run`."""
+
+    def __init__(self, corpus, latency):
+        self.corpus = corpus
+        self.latency = latency
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    def run(self, query, **params):
+        self.latency.sleep()
+        if "concept_ids" in params:
+            return FakeResult([{"concept_id": cid, "ids": self.corpus.sample_ids("concept", params["top_k"])}
+                               for cid in params["concept_ids"]])
+        if "belief_ids" in params:
+            return FakeResult([{"belief_id": bid, "ids": self.corpus.sample_ids("belief", params["top_k"])}
+                               for bid in params["belief_ids"]])
+        if "node1_id" in params:
+            middle = self.corpus.sample_ids("concept", 2)
+            return FakeResult([{"path_ids": [params["node1_id"], *middle, params["node2_id"]]}])
+        if "node_id" in params:
+            return FakeResult([{"id": i} for i in self.corpus.sample_ids("concept", 10)])
+        return FakeResult([])
+
+
+class FakeNeo4jDriver:
+    def __init__(self, corpus, latency):
+        self.corpus = corpus
+        self.latency = latency
+
+    def session(self, **kwargs):
+        return FakeNeo4jSession(self.corpus, self.latency)
+
+    def verify_connectivity(self):
+        self.latency.sleep()
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    """psycopg2 cursor stand-in for the `sep_embeddings` queries in neon_operations."""
+
+    def __init__(self, corpus, latency):
+        self.corpus = corpus
+        self.latency = latency
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    def execute(self, query, params=None):
+        self.latency.sleep()
+        documents = self.corpus.documents
+        if query.strip() == "SELECT 1":
+            self._rows = [(1,)]
+        elif "mistral_output ->" in query:
+            *keys, ids = params
+            self._rows = [(i, *(documents[i]["mistral_output"].get(k) for k in keys)) for i in ids if i in documents]
+        elif "ANY(%s)" in query:
+            self._rows = [(i, documents[i]["title"], documents[i]["content"]) for i in params[0] if i in documents]
+        else:
+            column = query.split()[1]
+            document = documents.get(int(float(params[0])))
+            self._rows = [(document[column],)] if document and column in document else []
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class FakeConnection:
+    """psycopg2 connection stand-in handed out by the real `NeonConnectionPool`."""
+
+    def __init__(self, corpus, latency):
+        self.corpus = corpus
+        self.latency = latency
+        self.closed = 0
+
+    def cursor(self):
+        return FakeCursor(self.corpus, self.latency)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+def scripted_responder(plans, insufficient_rate, latency, seed=0):
+    """
+    Wraps the stand-in's canned replies with round-robin plans, a scripted sufficiency verdict
+    and a sampled time to first byte.
+    """
+    plan_cycle = itertools.cycle(plans)
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def respond(request):
+        latency.sleep()
+        prompt = request["messages"][-1]["content"]
+        with lock:
+            if "philosophical research planner" in prompt:
+                return json.dumps(next(plan_cycle))
+            if "Respond with YES or NO only" in prompt:
+                return "NO" if rng.random() < insufficient_rate else "YES"
+        return scripted_response(request)
+
+    return respond
+
+
+### 📏 Measurement
+class StageRecorder:
+    """Collects wall-clock durations per stage from wrapped functions (thread-safe)."""
+
+    def __init__(self):
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.timings.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    low, high = math.floor(position), math.ceil(position)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def summarize(timings):
+    values = sorted(timings)
+    return {
+        "calls": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": sum(values) / len(values) if values else 0.0,
+    }
+
+
+def install_standins(args, recorder):
+    """Points every backend of the tools layer at the stand-ins and wraps the timed stages."""
+    import LLM_querying.mistral_api as mistral_api
+    import LLM_querying.sufficiency as sufficiency
+    import LLM_querying.thinker_agent as thinker_agent
+    from LLM_querying.DB_operations import neo4j_operations, neon_operations, pinecone_operations
+    from LLM_querying.semantic_cache import SemanticCache
+
+    corpus = SyntheticCorpus(num_documents=args.documents)
+    pinecone_operations._model = FakeEncoder(Latency.parse(args.encode_latency, seed=1))
+    pinecone_operations._pinecone_index = FakeIndex(corpus, Latency.parse(args.index_latency, seed=2))
+    pinecone_operations._metadata_store, pinecone_operations._metadata_store_checked = None, True
+    pinecone_operations.search_cache = SemanticCache(DIM, max_size=args.search_cache) if args.search_cache else None
+    neo4j_operations._driver = FakeNeo4jDriver(corpus, Latency.parse(args.neo4j_latency, seed=3))
+
+    neon_latency = Latency.parse(args.neon_latency, seed=4)
+    pool = neon_operations.NeonConnectionPool("standin://neon")
+    pool._connect = lambda: FakeConnection(corpus, neon_latency)
+    neon_operations._pool = pool
+
+    plans = [DEFAULT_PLAN]
+    if args.plans:
+        with open(args.plans, "r", encoding="utf-8") as f:
+            plans = json.load(f)
+    responder = scripted_responder(plans, args.insufficient_rate, Latency.parse(args.mistral_latency, seed=5))
+    server = start_standin(responder=responder, token_delay=args.token_delay)
+    mistral_api.MISTRAL_URL = server.url
+    mistral_api.response_cache = None
+    sufficiency.SUFFICIENCY_FAST_PATH = args.sufficiency_fast_path
+
+    for stage in AGENT_STAGES + TOOL_STAGES:
+        setattr(thinker_agent, stage, recorder.wrap(stage, getattr(thinker_agent, stage)))
+    return thinker_agent, server
+
+
+def run_benchmark(args):
+    recorder = StageRecorder()
+    thinker_agent, server = install_standins(args, recorder)
+    from LLM_querying.DB_operations import pinecone_operations
+    logging.disable(logging.INFO)  # per-call logs would dominate the timings
+
+    questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.questions)]
+    end_to_end, failures = [], []
+
+    def ask(question):
+        start = time.perf_counter()
+        try:
+            thinker_agent.loop_until_ready(question, max_loops=args.max_loops)
+        except Exception as e:
+            failures.append(repr(e))
+            return
+        end_to_end.append(time.perf_counter() - start)
+
+    with contextlib.redirect_stdout(io.StringIO()):  # the agent prints its progress
+        for question in questions[: args.warmup]:
+            ask(question)
+        end_to_end.clear()
+        recorder.timings.clear()
+        if pinecone_operations.search_cache is not None:
+            pinecone_operations.search_cache.clear()  # start cold; warmup answers would all be hits
+        warm_stats = pinecone_operations.get_search_cache_stats()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(ask, questions))
+        wall_time = time.perf_counter() - started
+    server.shutdown()
+    logging.disable(logging.NOTSET)
+
+    stages = {stage: summarize(recorder.timings[stage])
+              for stage in AGENT_STAGES + TOOL_STAGES if recorder.timings.get(stage)}
+    search_cache = None
+    if warm_stats is not None:
+        stats = pinecone_operations.get_search_cache_stats()
+        hits, misses = stats["hits"] - warm_stats["hits"], stats["misses"] - warm_stats["misses"]
+        search_cache = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0}
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+        "questions": len(end_to_end),
+        "failures": failures,
+        "wall_time": wall_time,
+        "throughput_qps": len(end_to_end) / wall_time if wall_time else 0.0,
+        "end_to_end": summarize(end_to_end),
+        "stages": stages,
+        "search_cache": search_cache,
+    }
+
+
+def print_report(results):
+    print(f"{'stage':<24}{'calls':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    rows = list(results["stages"].items()) + [("end-to-end", results["end_to_end"])]
+    for stage, s in rows:
+        print(f"{stage:<24}{s['calls']:>7}{s['p50'] * 1000:>10.1f}{s['p95'] * 1000:>10.1f}"
+              f"{s['p99'] * 1000:>10.1f}{s['mean'] * 1000:>10.1f}")
+    print(f"\n{results['questions']} questions in {results['wall_time']:.2f}s "
+          f"({results['throughput_qps']:.2f} questions/s, concurrency {results['config']['concurrency']})")
+    if results.get("search_cache"):
+        c = results["search_cache"]
+        print(f"🔎 Search cache: {c['hits']} hits, {c['misses']} misses ({c['hit_rate']:.0%} hit rate)")
+    if results["failures"]:
+        print(f"⚠️ {len(results['failures'])} failed: {results['failures'][:3]}")
+
+
+def compare(results, baseline, tolerance):
+    """Prints p95 changes against a baseline run; returns the stages that got slower than `tolerance` allows."""
+    regressions = []
+    print(f"\n{'stage':<24}{'base p95':>10}{'p95':>10}{'change':>9}")
+    current = dict(results["stages"], **{"end-to-end": results["end_to_end"]})
+    previous = dict(baseline["stages"], **{"end-to-end": baseline["end_to_end"]})
+    for stage, s in current.items():
+        if stage not in previous or not previous[stage]["p95"]:
+            continue
+        change = s["p95"] / previous[stage]["p95"] - 1
+        flag = "  ❌" if change > tolerance else ""
+        print(f"{stage:<24}{previous[stage]['p95'] * 1000:>10.1f}{s['p95'] * 1000:>10.1f}{change:>+9.0%}{flag}")
+        if change > tolerance:
+            regressions.append(stage)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=24)
+    parser.add_argument("--concurrency", type=int, default=1, help="questions in flight at once")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed questions run first")
+    parser.add_argument("--max-loops", type=int, default=3)
+    parser.add_argument("--documents", type=int, default=200, help="SEP entries in the synthetic corpus")
+    parser.add_argument("--plans", help="JSON list of scripted plans, used round-robin")
+    parser.add_argument("--insufficient-rate", type=float, default=0.3,
+                        help="share of LLM sufficiency checks answered NO")
+    parser.add_argument("--sufficiency-fast-path", action="store_true",
+                        help="let the local coverage estimate answer decisive sufficiency checks")
+    parser.add_argument("--search-cache", type=int, default=0, metavar="N",
+                        help="enable the semantic search cache with N entries (off by default)")
+    parser.add_argument("--encode-latency", default="0.01:0.003")
+    parser.add_argument("--index-latency", default="0.03:0.01")
+    parser.add_argument("--neo4j-latency", default="0.02:0.008")
+    parser.add_argument("--neon-latency", default="0.015:0.005")
+    parser.add_argument("--mistral-latency", default="0.3:0.1")
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline results JSON to compare p95s against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown before flagging")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ p95 regressed by more than {args.tolerance:.0%} in: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
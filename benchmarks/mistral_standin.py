@@ -0,0 +1,112 @@
+"""
+Local stand-in for the Mistral chat completions endpoint.
+
+Serves both plain JSON completions and `stream: true` server-sent events, with scripted
+responses and configurable latency, so the agent can be exercised without the real API:
+
+    python benchmarks/mistral_standin.py --port 8765 --token-delay 0.02
+    MISTRAL_URL=http://127.0.0.1:8765/v1/chat/completions python test.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PLAN = {
+    "steps": [
+        {"action": "search_beliefs", "target": "Kant on moral autonomy"},
+        {"action": "search_concepts", "target": ["autonomy", "free will"]},
+        {"action": "get_concept_path", "target": ["autonomy", "will to power"]},
+    ]
+}
+DEFAULT_ANSWER = (
+    "Autonomy, for Kant, is the will's capacity to give itself the moral law [SEP 13769]. "
+    "Nietzsche rejects this picture, recasting valuation as an expression of will to power."
+)
+
+
+def scripted_response(request):
+    """Picks a canned reply from the shape of the prompt (planner, sufficiency check, revision, answer)."""
+    prompt = request["messages"][-1]["content"]
+    if "philosophical research planner" in prompt:
+        return json.dumps(DEFAULT_PLAN)
+    if "Respond with YES or NO only" in prompt:
+        return "YES"
+    if "Respond with a short updated natural language query" in prompt:
+        return "Kantian autonomy versus Nietzschean will to power"
+    return DEFAULT_ANSWER
+
+
+def make_handler(responder=scripted_response, latency=0.0, token_delay=0.0):
+    class MistralStandinHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            content = responder(request)
+            time.sleep(latency)
+
+            if not request.get("stream"):
+                body = json.dumps({
+                    "model": request.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+                }, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            # Chunked transfer encoding, like the real API, so each event is flushed to the client;
+            # raw UTF-8 and no charset in the Content-Type, also like the real API
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in content.split(" "):
+                event = {"choices": [{"index": 0, "delta": {"content": token + " "}}]}
+                self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n")
+                time.sleep(token_delay)
+            self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def _write_chunk(self, text):
+            data = text.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+    return MistralStandinHandler
+
+
+def start_standin(port=0, responder=scripted_response, latency=0.0, token_delay=0.0):
+    """Starts the stand-in on a background thread; returns the server (`server.url` is the endpoint)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(responder, latency, token_delay))
+    server.daemon_threads = True
+    server.url = f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first byte")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed tokens")
+    args = parser.parse_args()
+
+    server = start_standin(args.port, latency=args.latency, token_delay=args.token_delay)
+    print(f"Mistral stand-in listening on {server.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
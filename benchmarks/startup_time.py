@@ -0,0 +1,153 @@
+"""
+Startup-time benchmark for the lazily initialized tools layer.
+
+Measures, in fresh interpreters:
+  - cold import of `LLM_querying.tools` (what every worker / CLI pays now)
+  - eager import: the same import plus everything the modules used to do at import time before
+    initialization became lazy (import the client libraries and the model library, load the
+    model, open the Pinecone, Neon and Neo4j connections)
+
+By default the eager run needs no services: as in agent_loop.py, the model and the connections
+are in-process fakes, so it only measures import and initialization-code overhead. The costs lazy
+initialization mostly avoids are opt-in:
+  --real-model      construct the real SentenceTransformer (the weights must be cached or downloadable)
+  --real-services   connect to Pinecone, Neon and Neo4j with the credentials in .env
+
+Usage:
+    python benchmarks/startup_time.py [--runs 5] [--lazy-only] [--real-model] [--real-services]
+"""
+import argparse
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_ONLY = """
+import time
+start = time.perf_counter()
+import LLM_querying.tools
+print(time.perf_counter() - start)
+"""
+
+EAGER_IMPORT = """
+import os
+import time
+start = time.perf_counter()
+REAL_MODEL = os.environ.get("STARTUP_REAL_MODEL") == "1"
+REAL_SERVICES = os.environ.get("STARTUP_REAL_SERVICES") == "1"
+
+class FakeModel:
+    def __init__(self, *args, **kwargs):
+        pass
+    def encode(self, texts, **kwargs):
+        return [0.0] * 768 if isinstance(texts, str) else [[0.0] * 768 for _ in texts]
+
+class FakePinecone:
+    def __init__(self, *args, **kwargs):
+        pass
+    def Index(self, name):
+        return object()
+
+class FakeDriver:
+    def verify_connectivity(self):
+        pass
+
+class FakeCursor:
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def execute(self, query, params=None):
+        pass
+
+class FakeConnection:
+    closed = 0
+    def cursor(self):
+        return FakeCursor()
+    def commit(self):
+        pass
+    def rollback(self):
+        pass
+    def close(self):
+        pass
+
+import pinecone, neo4j, psycopg2
+if not REAL_SERVICES:
+    pinecone.Pinecone = FakePinecone
+    neo4j.GraphDatabase.driver = lambda *args, **kwargs: FakeDriver()
+    psycopg2.connect = lambda *args, **kwargs: FakeConnection()
+try:
+    import sentence_transformers
+    if not REAL_MODEL:
+        sentence_transformers.SentenceTransformer = FakeModel
+except ImportError:
+    sentence_transformers = None
+
+import LLM_querying.tools as tools
+from LLM_querying.DB_operations import pinecone_operations
+if sentence_transformers is None:
+    pinecone_operations._model = FakeModel()
+tools.warmup()
+print(time.perf_counter() - start)
+"""
+
+def snippet_env(real_model=False, real_services=False):
+    # The stand-ins replace the remote backends, so the local ones must stay off
+    env = dict(os.environ, VECTOR_BACKEND="pinecone", GRAPH_BACKEND="neo4j",
+               STARTUP_REAL_MODEL="1" if real_model else "0", STARTUP_REAL_SERVICES="1" if real_services else "0")
+    if not real_services:
+        env["NEON_URL"] = "standin://neon"
+    return env
+
+
+def time_snippet(snippet, runs, env=None):
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", snippet],
+            cwd=REPO_ROOT,
+            env=env or snippet_env(),
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "benchmark run failed")
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def report(label, timings):
+    print(f"{label:<44} median {statistics.median(timings):7.3f}s   "
+          f"min {min(timings):7.3f}s   max {max(timings):7.3f}s   ({len(timings)} runs)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--lazy-only", action="store_true", help="skip the eager import measurement")
+    parser.add_argument("--real-model", action="store_true", help="load the real embedding model in the eager run")
+    parser.add_argument("--real-services", action="store_true",
+                        help="connect to the real Pinecone, Neon and Neo4j in the eager run")
+    args = parser.parse_args()
+    has_model_library = importlib.util.find_spec("sentence_transformers") is not None
+    if args.real_model and not has_model_library:
+        parser.error("--real-model needs sentence-transformers installed")
+
+    report("import (lazy)", time_snippet(IMPORT_ONLY, args.runs))
+    if not args.lazy_only:
+        model = "real model" if args.real_model else "fake model"
+        services = "real services" if args.real_services else "fake services"
+        report(f"import (eager, {model}, {services})",
+               time_snippet(EAGER_IMPORT, args.runs, snippet_env(args.real_model, args.real_services)))
+        if not (args.real_model and args.real_services):
+            print("ℹ️ Fakes only time import and initialization code; use --real-model / --real-services "
+                  "to include loading the weights and connecting")
+        if not has_model_library:
+            print("⚠️ sentence_transformers is not installed; the eager run does not include its import")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import requests
+from datetime import datetime, timezone
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from upload_to_neon import get_connection
+from vectorize_upload_json import JSON_DIRECTORY, iter_sections, section_hash, StageStats
+
+# The index version marker is shared with the query side (LLM_querying)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv()
+
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+PINECONE_INDEX_NAME = "belief-embeddings"
+NEO4J_URI = os.getenv("NEO4J_URI")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
+MISTRAL_URL = "https://api.mistral.ai/v1/chat/completions"
+EXTRACTION_MODEL = "mistral-medium-2312"
+
+# Same model as the query side (LLM_querying) and revectorize.ipynb
+MODEL_NAME = "BAAI/bge-base-en"
+ENCODE_BATCH_SIZE = 64
+UPSERT_BATCH_SIZE = 100
+
+MANIFEST_DIR = "sync_manifests"
+VECTOR_KINDS = ("belief", "concept")  # vector ID infixes owned by this script
+PENDING_HASH_PREFIX = "pending:"  # stored instead of the hash until a section's vectors are rebuilt
+MAX_DELETE_FRACTION = 0.05  # larger deletions need --allow-mass-delete (usually a wrong or partial --json-dir)
+
+EXTRACTION_PROMPT = """
+You are an AI tasked with extracting structured philosophical knowledge from a given text.
+Your goal is to **categorize the entry and extract key information in a structured format.**
+Be **as detailed as possible while remaining concise.**
+**Always return a single JSON object, never multiple JSON objects.**
+
+## **Input:**
+{content}
+
+## **Output Format (JSON):**
+{{
+    "category": "thinker" | "concept" | "era",
+    "metadata": {{
+        "name": "...",
+        "description": "...",
+        "time_period": "..."
+    }},
+    "key_beliefs": [
+        {{ "belief": "...", "justification": "...", "related_concepts": ["...", "..."] }}
+    ],
+    "key_concepts": [
+        {{ "name": "...", "definition": "...", "related_fields": ["...", "..."] }}
+    ],
+    "associated_thinkers": ["...", "..."],
+    "associated_eras": ["...", "..."]
+}}
+**NEVER return multiple JSON objects.**
+**NO output except for the JSON.**
+"""
+
+
+### 🔍 Diff
+def load_stored_hashes(conn):
+    """Returns {(title, section): (id, hash)} for every stored section, without loading content."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, title, section, hash FROM sep_embeddings")
+        return {(title, section): (row_id, row_hash) for row_id, title, section, row_hash in cur.fetchall()}
+
+
+def diff_sections(scraped, stored):
+    """
+    Compares scraped (title, section, content) triples with stored hashes.
+    Returns (new, changed, deleted, unchanged_count); `changed` and `deleted` carry the stored row id.
+    Repeated (title, section) pairs keep their first occurrence (the hash column is UNIQUE).
+    """
+    new, changed = [], []
+    seen = set()
+    unchanged = duplicates = 0
+    for title, section, content in scraped:
+        key = (title, section)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        current = stored.get(key)
+        content_hash = section_hash(title, section, content)
+        if current is None:
+            new.append({"title": title, "section": section, "content": content, "hash": content_hash})
+        elif current[1] != content_hash:
+            changed.append({"id": current[0], "title": title, "section": section, "content": content,
+                            "hash": content_hash})
+        else:
+            unchanged += 1
+
+    deleted = [{"id": row_id, "title": title, "section": section}
+               for (title, section), (row_id, _) in stored.items() if (title, section) not in seen]
+    if duplicates:
+        print(f"⚠️ Skipped {duplicates} duplicate (title, section) entries in the scrape")
+    return new, changed, deleted, unchanged
+
+
+### 🧠 Re-embedding & re-extraction
+def load_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MODEL_NAME)
+
+
+def embed(model, texts):
+    return model.encode(texts, batch_size=ENCODE_BATCH_SIZE).tolist() if texts else []
+
+
+def _first_json_object(text):
+    """Parses the first JSON object in an LLM response, ignoring any surrounding text."""
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    while start != -1:
+        try:
+            return decoder.raw_decode(text, start)[0]
+        except json.JSONDecodeError:
+            start = text.find("{", start + 1)
+    return None
+
+
+def extract_document(content, max_retries=5):
+    """
+    Runs the mistralify extraction prompt on one section; returns the parsed JSON or None.
+    Never raises on API or network errors, so one bad section cannot abort a long sync.
+    """
+    data = {
+        "model": EXTRACTION_MODEL,
+        "messages": [
+            {"role": "system", "content": "Extract structured philosophical knowledge. Your response should always be a single valid JSON object."},
+            {"role": "user", "content": EXTRACTION_PROMPT.format(content=content)},
+        ],
+        "temperature": 0.4,
+    }
+    headers = {"Authorization": f"Bearer {MISTRAL_API_KEY}", "Content-Type": "application/json"}
+    for attempt in range(max_retries):
+        try:
+            response = requests.post(MISTRAL_URL, headers=headers, json=data, timeout=120)
+        except requests.RequestException as e:
+            print(f"⚠️ Mistral request failed ({e}); retrying")
+            time.sleep(2 ** attempt)
+            continue
+        if response.status_code == 429 or response.status_code >= 500:
+            time.sleep(2 ** attempt)
+            continue
+        try:
+            response.raise_for_status()
+            return _first_json_object(response.json()["choices"][0]["message"]["content"])
+        except (requests.RequestException, ValueError, KeyError, IndexError, TypeError) as e:
+            print(f"❌ Extraction failed: {e!r}")
+            return None
+    return None
+
+
+def stable_hash(text):
+    """Process-independent replacement for `hash(text) % 10**8` used by the original vector IDs."""
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest(), 16) % 10**8
+
+
+def build_vectors(sep_id, document_title, mistral_json):
+    """Belief and concept (vector_id, text_to_embed, metadata) triples, as in revectorize.ipynb."""
+    items = []
+    for belief in mistral_json.get("key_beliefs", []):
+        if not isinstance(belief, dict) or not belief.get("belief", "").strip():
+            continue
+        belief_text = belief["belief"].strip()
+        justification = belief.get("justification", "").strip()
+        related_concepts = ", ".join(
+            (c.get("name", "") if isinstance(c, dict) else str(c)).strip() for c in belief.get("related_concepts", [])
+        )
+        items.append((
+            f"{sep_id}_belief_{stable_hash(belief_text)}",
+            f"{belief_text}. Justification: {justification}. Related concepts: {related_concepts}",
+            {"sep_id": sep_id, "document_title": document_title, "type": "belief", "belief": belief_text,
+             "justification": justification, "related_concepts": related_concepts},
+        ))
+    for concept in mistral_json.get("key_concepts", []):
+        if not isinstance(concept, dict) or not concept.get("name", "").strip():
+            continue
+        concept_text = concept["name"].strip()
+        items.append((
+            f"{sep_id}_concept_{stable_hash(concept_text)}",
+            concept_text,
+            {"sep_id": sep_id, "document_title": document_title, "type": "concept", "concept": concept_text},
+        ))
+    return items
+
+
+### 💾 Applying changes
+def reserve_ids(conn, count):
+    """Draws `count` ids from the sep_embeddings id sequence, so vectors can be keyed before rows are inserted."""
+    if not count:
+        return []
+    with conn.cursor() as cur:
+        cur.execute("SELECT nextval(pg_get_serial_sequence('sep_embeddings', 'id')) FROM generate_series(1, %s)", (count,))
+        ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    return ids
+
+
+def apply_neon(conn, new, changed, deleted, embeddings, outputs):
+    """
+    Upserts new/changed sections with their hash, embedding and `mistral_output` and deletes vanished
+    ones, in one transaction. Runs last, so a section's new hash is only stored once its vectors and
+    nodes are written; sections without an output get a pending hash, so the next sync sees them as
+    changed and rebuilds them. Changed sections without an output keep their old `mistral_output`,
+    which is what their kept vectors and nodes were built from; new ones get NULL.
+    """
+    def output(s):
+        return json.dumps(outputs[s["id"]]) if s["id"] in outputs else None
+
+    def stored_hash(s):
+        return s["hash"] if s["id"] in outputs else PENDING_HASH_PREFIX + s["hash"]
+
+    with conn.cursor() as cur:
+        if changed:
+            execute_values(cur, """
+                UPDATE sep_embeddings AS t
+                SET content = v.content, hash = v.hash, embedding = v.embedding::vector, mistral_output = COALESCE(v.output::jsonb, t.mistral_output)
+                FROM (VALUES %s) AS v (id, content, hash, embedding, output)
+                WHERE t.id = v.id
+            """, [(s["id"], s["content"], stored_hash(s), str(embeddings[s["hash"]]), output(s)) for s in changed])
+        if new:
+            execute_values(cur, """
+                INSERT INTO sep_embeddings (id, title, section, content, hash, embedding, mistral_output)
+                VALUES %s
+            """, [(s["id"], s["title"], s["section"], s["content"], stored_hash(s), str(embeddings[s["hash"]]), output(s))
+                  for s in new],
+                template="(%s, %s, %s, %s, %s, %s::vector, %s::jsonb)")
+        if deleted:
+            cur.execute("DELETE FROM sep_embeddings WHERE id = ANY(%s)", ([s["id"] for s in deleted],))
+    conn.commit()
+
+
+def list_vector_ids(index, sep_ids):
+    """
+    Belief and concept vector IDs of the given documents (`<sep_id>_belief_*`, `<sep_id>_concept_*`).
+    `<sep_id>_overloaded_concept_*` vectors are left alone: they are maintained by overloaded_concepts.py
+    (`prune_sections` drops deleted sections from them).
+    """
+    vector_ids = []
+    for sep_id in sep_ids:
+        for kind in VECTOR_KINDS:
+            for page in index.list(prefix=f"{sep_id}_{kind}_"):
+                vector_ids.extend(page if isinstance(page, list) else [page])
+    return vector_ids
+
+
+def apply_pinecone(index, stale_ids, vectors):
+    """Deletes and upserts vectors, then stamps a new index version so cached searches are dropped."""
+    for i in range(0, len(stale_ids), 1000):
+        index.delete(ids=stale_ids[i : i + 1000])
+    for i in range(0, len(vectors), UPSERT_BATCH_SIZE):
+        index.upsert(vectors[i : i + UPSERT_BATCH_SIZE])
+    if stale_ids or vectors:
+        from LLM_querying.DB_operations.pinecone_operations import stamp_index_version
+        stamp_index_version(index)
+
+
+def apply_neo4j(driver, stale_ids, vectors):
+    """Drops stale Belief/Concept nodes (and their edges) and MERGEs the new ones."""
+    by_label = {"Belief": [], "Concept": []}
+    for vector_id, _, metadata in vectors:
+        by_label["Belief" if metadata["type"] == "belief" else "Concept"].append({"id": vector_id, "metadata": metadata})
+
+    with driver.session() as session:
+        for label in ("Belief", "Concept"):
+            if stale_ids:
+                session.run(f"UNWIND $ids AS id MATCH (n:{label} {{id: id}}) DETACH DELETE n", ids=stale_ids)
+            for i in range(0, len(by_label[label]), 500):
+                session.run(f"""
+                    UNWIND $items AS item
+                    MERGE (n:{label} {{id: item.id}})
+                    SET n += item.metadata
+                """, items=by_label[label][i : i + 500])
+
+
+def write_manifest(manifest, manifest_dir=MANIFEST_DIR):
+    os.makedirs(manifest_dir, exist_ok=True)
+    path = os.path.join(manifest_dir, f"sync_{manifest['started_at'].replace(':', '').replace('-', '')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"📝 Change manifest written to {path}")
+    return path
+
+
+def has_json_files(json_directory):
+    return os.path.isdir(json_directory) and any(name.endswith(".json") for name in os.listdir(json_directory))
+
+
+def run_sync(json_directory=JSON_DIRECTORY, dry_run=False, skip_extraction=False, allow_mass_delete=False):
+    """
+    Brings Neon, Pinecone and Neo4j in line with a new scrape, touching only sections whose
+    (title + section + content) hash changed, new sections and vanished ones.
+    Deleting more than `MAX_DELETE_FRACTION` of the stored sections needs `allow_mass_delete`;
+    otherwise the deletions are held back (and listed in the manifest) and the rest is applied.
+    """
+    # Every stored section would look deleted
+    if not has_json_files(json_directory):
+        raise ValueError(f"No JSON files found in {json_directory}; refusing to sync")
+
+    started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    conn = get_connection()
+    stored = load_stored_hashes(conn)
+    print(f"📌 {len(stored)} sections stored in Neon")
+
+    new, changed, deleted, unchanged = diff_sections(iter_sections(json_directory, StageStats("read", "sections")), stored)
+    print(f"🔍 {len(new)} new, {len(changed)} changed, {len(deleted)} deleted, {unchanged} unchanged")
+
+    manifest = {
+        "started_at": started_at,
+        "dry_run": dry_run,
+        "unchanged": unchanged,
+        "new": [{"title": s["title"], "section": s["section"], "hash": s["hash"]} for s in new],
+        "changed": [{"id": s["id"], "title": s["title"], "section": s["section"], "hash": s["hash"]} for s in changed],
+        "deleted": deleted,
+        "deletions_refused": False,
+    }
+    if deleted and len(deleted) > MAX_DELETE_FRACTION * len(stored) and not allow_mass_delete:
+        print(f"⛔ {len(deleted)} of {len(stored)} stored sections would be deleted; not deleting any. "
+              f"Check --json-dir, or pass --allow-mass-delete if the scrape really dropped them")
+        manifest["deletions_refused"] = True
+        deleted = []
+    if dry_run or not (new or changed or deleted):
+        write_manifest(manifest)
+        conn.close()
+        return manifest
+
+    for s, row_id in zip(new, reserve_ids(conn, len(new))):
+        s["id"] = row_id
+    manifest["new"] = [dict(entry, id=s["id"]) for entry, s in zip(manifest["new"], new)]
+    conn.close()  # extraction can take hours; reconnect for the final Neon step
+
+    # Nothing is written until extraction is done; sections whose extraction fails are left
+    # untouched everywhere (old hash, old vectors) and are picked up again by the next sync.
+    touched = new + changed
+    outputs, failed = {}, []
+    if not skip_extraction:
+        for s in touched:
+            output = extract_document(s["content"])
+            if output is None:
+                failed.append(s["id"])
+            else:
+                outputs[s["id"]] = output
+        if failed:
+            print(f"⚠️ Extraction failed for {len(failed)} sections; leaving them for the next sync")
+    failed_ids = set(failed)
+    new = [s for s in new if s["id"] not in failed_ids]
+    changed = [s for s in changed if s["id"] not in failed_ids]
+    touched = new + changed
+
+    model = load_model()
+    section_vectors = embed(model, [s["content"] for s in touched])
+
+    from pinecone import Pinecone
+    from neo4j import GraphDatabase
+    from LLM_querying.DB_operations.overloaded_concepts import prune_sections
+    from LLM_querying.DB_operations.pinecone_operations import stamp_index_version
+    index = Pinecone(api_key=PINECONE_API_KEY).Index(PINECONE_INDEX_NAME)
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+
+    # With --skip-extraction there is nothing to replace a changed section's vectors with, so they
+    # stay until the next full sync; vanished sections lose theirs either way
+    stale_ids = list_vector_ids(index, [s["id"] for s in changed if s["id"] in outputs] + [s["id"] for s in deleted])
+
+    items = [item for s in touched if s["id"] in outputs for item in build_vectors(s["id"], s["title"], outputs[s["id"]])]
+    item_vectors = embed(model, [text for _, text, _ in items])
+    vectors = [(vector_id, vector, metadata) for (vector_id, _, metadata), vector in zip(items, item_vectors)]
+    vector_ids = {vector_id for vector_id, _, _ in vectors}
+    stale_ids = [vid for vid in stale_ids if vid not in vector_ids]  # re-upserted IDs are overwritten, not deleted
+
+    apply_pinecone(index, stale_ids, vectors)
+    print(f"✅ Pinecone: {len(stale_ids)} vectors deleted, {len(vectors)} upserted")
+    apply_neo4j(driver, stale_ids, vectors)
+    print(f"✅ Neo4j: {len(stale_ids)} nodes deleted, {len(vectors)} merged")
+    pruned, dropped = prune_sections(driver, index, [s["id"] for s in deleted])
+    if pruned or dropped:
+        stamp_index_version(index)
+        print(f"✅ Overloaded concepts: {len(pruned)} pruned of deleted sections, {len(dropped)} deleted")
+
+    conn = get_connection()
+    apply_neon(conn, new, changed, deleted, {s["hash"]: v for s, v in zip(touched, section_vectors)}, outputs)
+    print(f"✅ Neon: {len(new)} sections inserted, {len(changed)} updated, {len(deleted)} deleted")
+
+    manifest.update({
+        "vectors_deleted": stale_ids,
+        "vectors_upserted": sorted(vector_ids),
+        "extraction_failed": failed,
+        "extraction_pending": [s["id"] for s in touched if s["id"] not in outputs],
+        "overloaded_pruned": [m["target"] for m in pruned],
+        "overloaded_deleted": dropped,
+        # New nodes have no SIMILAR_TO edges yet; run the edge builder for these IDs
+        "nodes_needing_edges": sorted(vector_ids),
+    })
+    write_manifest(manifest)
+
+    driver.close()
+    conn.close()
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-ingest only new, changed and deleted SEP sections.")
+    parser.add_argument("--json-dir", default=JSON_DIRECTORY)
+    parser.add_argument("--dry-run", action="store_true", help="only compute and write the change manifest")
+    parser.add_argument("--allow-mass-delete", action="store_true",
+                        help=f"apply deletions even when they exceed {MAX_DELETE_FRACTION:.0%} of the stored sections")
+    parser.add_argument("--skip-extraction", action="store_true",
+                        help="skip Mistral: store new/changed sections in Neon with a pending hash; changed ones "
+                             "keep their old mistral_output and vectors, new ones get none. The next full "
+                             "sync re-extracts them. Deleted sections are still removed everywhere")
+    args = parser.parse_args()
+
+    run_sync(args.json_dir, dry_run=args.dry_run, skip_extraction=args.skip_extraction,
+             allow_mass_delete=args.allow_mass_delete)
@@ -1,6 +1,11 @@
 import os
+import io
+import json
+import itertools
 import psycopg2
+from psycopg2 import sql
 from psycopg2.extras import execute_values
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -37,17 +42,178 @@ def batch_insert(table_name, columns, data, batch_size=10000):
     Args:
         table_name (str): Name of the table.
         columns (tuple): Column names (e.g., ("col1", "col2")).
-        data (list of tuples): Data to insert.
+        data (iterable of tuples): Data to insert (a list or any generator).
         batch_size (int): Number of rows per batch (default: 10,000).
     """
     query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES %s"
 
     with get_connection() as conn, conn.cursor() as cur:
-        for i in range(0, len(data), batch_size):
-            batch = data[i : i + batch_size]
+        for i, batch in enumerate(_chunks(data, batch_size), start=1):
             execute_values(cur, query, batch)
             conn.commit()
-            print(f"Inserted batch {i // batch_size + 1} of {len(data) // batch_size + 1}")
+            print(f"Inserted batch {i} ({len(batch)} rows)")
+
+
+### 🚚 Streaming COPY loader
+COPY_READ_SIZE = 1 << 16  # bytes handed to COPY per read
+COPY_COMMIT_ROWS = 100000  # rows per COPY statement / transaction
+_END = object()
+
+
+def _chunks(rows, size):
+    """Splits any iterable into lists of at most `size` items, holding one list at a time."""
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _lazy_chunks(rows, size):
+    """
+    Splits any iterable into iterators over at most `size` items, without buffering any of them.
+    Each chunk must be consumed before the next one is requested (COPY reads it to the end).
+    """
+    iterator = iter(rows)
+    for first in iterator:
+        yield itertools.chain((first,), itertools.islice(iterator, size - 1))
+
+
+def _copy_value(value):
+    """
+    Text for one CSV field; `None` becomes NULL, dicts/lists become JSON (valid for jsonb and pgvector).
+    numpy arrays and scalars (e.g. sentence-transformers embeddings) are converted to Python values first.
+    """
+    if value is None:
+        return None
+    if hasattr(value, "tolist"):  # ndarray -> list, numpy scalar -> int/float/bool, without importing numpy
+        value = value.tolist()
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+class CopyStream(io.RawIOBase):
+    """
+    File-like object that renders rows from an iterator as CSV on demand, so `COPY FROM STDIN`
+    pulls data with a buffer of roughly one read (plus one row) regardless of input size.
+    """
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = bytearray()
+        self.rows = 0
+
+    def readable(self):
+        return True
+
+    def _render(self, row):
+        # Quote every non-NULL field so empty strings stay distinct from NULL (an unquoted empty field)
+        fields = [_copy_value(v) for v in row]
+        line = ",".join("" if f is None else '"' + f.replace('"', '""') + '"' for f in fields)
+        return (line + "\n").encode("utf-8")
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, _END)
+            if row is _END:
+                break
+            self._buffer += self._render(row)
+            self.rows += 1
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+def _copy_chunk(cur, table, columns, rows):
+    stream = CopyStream(rows)
+    statement = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+        sql.Identifier(table), sql.SQL(", ").join(map(sql.Identifier, columns))
+    )
+    cur.copy_expert(statement.as_string(cur), stream, size=COPY_READ_SIZE)
+    return stream.rows
+
+
+def stream_load(table_name, columns, rows, conflict_columns=None, update_columns=None,
+                commit_every=COPY_COMMIT_ROWS, conn=None):
+    """
+    Streams rows from any iterable into a table with `COPY FROM STDIN`, committing every
+    `commit_every` rows. Client memory stays constant no matter how many rows there are.
+
+    Args:
+        table_name (str): Target table.
+        columns (tuple): Column names, in row order.
+        rows (iterable of tuples): Rows to load; generators are consumed lazily.
+        conflict_columns (tuple): If given, rows are COPYed into a temporary staging table and
+            upserted with `ON CONFLICT (conflict_columns)`.
+        update_columns (tuple): Columns overwritten on conflict (default: do nothing on conflict).
+        commit_every (int): Rows per COPY statement / transaction.
+        conn: Existing connection to use (a new one is opened and closed otherwise).
+
+    Returns:
+        int: Number of rows sent to the database.
+    """
+    own_connection = conn is None
+    conn = conn or get_connection()
+    loaded = 0
+    try:
+        with conn.cursor() as cur:
+            for chunk in _lazy_chunks(rows, commit_every):
+                if conflict_columns:
+                    loaded += _upsert_chunk(cur, table_name, columns, chunk, conflict_columns, update_columns)
+                else:
+                    loaded += _copy_chunk(cur, table_name, columns, chunk)
+                conn.commit()
+                print(f"🔄 Loaded {loaded} rows into {table_name}...")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_connection:
+            conn.close()
+    return loaded
+
+
+def _upsert_chunk(cur, table, columns, rows, conflict_columns, update_columns):
+    staging = f"{table}_staging"
+    cur.execute(sql.SQL("CREATE TEMP TABLE IF NOT EXISTS {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS").format(
+        sql.Identifier(staging), sql.Identifier(table)
+    ))
+    copied = _copy_chunk(cur, staging, columns, rows)
+
+    column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+    if update_columns:
+        action = sql.SQL("DO UPDATE SET {}").format(sql.SQL(", ").join(
+            sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in update_columns
+        ))
+    else:
+        action = sql.SQL("DO NOTHING")
+    # DISTINCT ON keeps the last copy of a repeated key; ON CONFLICT cannot touch one row twice
+    conflict_list = sql.SQL(", ").join(map(sql.Identifier, conflict_columns))
+    cur.execute(sql.SQL(
+        "INSERT INTO {} ({}) SELECT DISTINCT ON ({}) {} FROM {} ORDER BY {}, ctid DESC ON CONFLICT ({}) {}"
+    ).format(
+        sql.Identifier(table), column_list, conflict_list, column_list, sql.Identifier(staging),
+        conflict_list, conflict_list, action
+    ))
+    return copied
+
+
+def parallel_stream_load(table_name, columns, partitions, workers=4, **kwargs):
+    """
+    Loads several independent row iterables (e.g. one generator per input file) concurrently,
+    each over its own connection via `stream_load`. Returns the total number of rows loaded.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(stream_load, table_name, columns, part, **kwargs) for part in partitions]
+        total = sum(f.result() for f in futures)
+    print(f"🎉 Loaded {total} rows into {table_name} from {len(futures)} partitions")
+    return total
 
 if __name__ == "__main__":
     check_db_version()
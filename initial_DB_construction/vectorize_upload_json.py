@@ -1,14 +1,19 @@
 import os
 import json
-import psycopg2
-import numpy as np
+import time
+import queue
 import hashlib
+import argparse
+import threading
+import multiprocessing
+from collections import deque
+import psycopg2
+from psycopg2.extras import execute_values
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
 
 # PostgreSQL Connection Settings
 DB_NAME = "phil_rag"
-DB_USER = "rohansharma" 
+DB_USER = "rohansharma"
 DB_PASSWORD = "password"  # Ensure it's correct
 DB_HOST = "postgres"  # Change to "postgres" if running inside Docker
 DB_PORT = "5432"
@@ -16,104 +21,357 @@ DB_PORT = "5432"
 # Directory containing JSON files
 JSON_DIRECTORY = "/Volumes/BigDrive/phil_rag"
 
-# Load Embedding Model
-model = SentenceTransformer("all-MiniLM-L6-v2")
+# Embedding Model
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Pipelined mode config (see `run_pipeline`)
+ENCODE_BATCH_SIZE = 64  # sections per model.encode call
+WRITE_BATCH_SIZE = 500  # rows per INSERT ... VALUES page / commit
+QUEUE_DEPTH = 8  # batches buffered between stages
+
+INSERT_SQL = """
+    INSERT INTO sep_embeddings (title, section, content, embedding, hash)
+    VALUES %s
+    ON CONFLICT (hash) DO NOTHING;
+"""
+
+
+def load_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MODEL_NAME)
+
 
 # Connect to PostgreSQL
-conn = psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
-cur = conn.cursor()
-print("✅ Connected to PostgreSQL")
+def get_connection():
+    return psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+
 
 # Ensure table exists before inserting (prevent errors)
-cur.execute("""
-    CREATE TABLE IF NOT EXISTS sep_embeddings (
-        id SERIAL PRIMARY KEY,
-        embedding VECTOR(768),  -- Adjust size if needed
-        title TEXT NOT NULL,
-        section TEXT NOT NULL,
-        content TEXT NOT NULL,
-        hash TEXT NOT NULL UNIQUE
-    );
-""")
-conn.commit()
-
-# Get last processed file & section
-cur.execute("SELECT title, section FROM sep_embeddings ORDER BY id DESC LIMIT 1;")
-last_processed = cur.fetchone()
-last_processed_title = last_processed[0] if last_processed else None
-last_processed_section = last_processed[1] if last_processed else None
-
-# Delete incomplete data for the last title (ensures clean restart)
-if last_processed_title:
-    print(f"🗑️ Removing incomplete entries for: {last_processed_title}")
-    cur.execute("DELETE FROM sep_embeddings WHERE title = %s;", (last_processed_title,))
+def ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS sep_embeddings (
+                id SERIAL PRIMARY KEY,
+                embedding VECTOR(768),  -- Adjust size if needed
+                title TEXT NOT NULL,
+                section TEXT NOT NULL,
+                content TEXT NOT NULL,
+                hash TEXT NOT NULL UNIQUE
+            );
+        """)
     conn.commit()
 
-# Insert function with conflict handling
-insert_count = 0
-BATCH_SIZE = 100
 
-def insert_into_db(title, section, content, embedding):
-    global insert_count
-    content_hash = hashlib.md5((title + section + content).encode("utf-8")).hexdigest()
+def section_hash(title, section, content):
+    return hashlib.md5((title + section + content).encode("utf-8")).hexdigest()
 
-    sql = """
-    INSERT INTO sep_embeddings (title, section, content, embedding, hash)
-    VALUES (%s, %s, %s, %s, %s)
-    ON CONFLICT (hash) DO NOTHING;
-    """  
-    try:
-        cur.execute(sql, (title, section, content, embedding, content_hash))
-        insert_count += 1
 
-        if insert_count % BATCH_SIZE == 0:
+### 🐢 Original resumable mode: one section at a time
+def run_resume(json_directory=JSON_DIRECTORY):
+    model = load_model()
+    conn = get_connection()
+    cur = conn.cursor()
+    print("✅ Connected to PostgreSQL")
+    ensure_table(conn)
+
+    # Get last processed file & section
+    cur.execute("SELECT title, section FROM sep_embeddings ORDER BY id DESC LIMIT 1;")
+    last_processed = cur.fetchone()
+    last_processed_title = last_processed[0] if last_processed else None
+    last_processed_section = last_processed[1] if last_processed else None
+
+    # Delete incomplete data for the last title (ensures clean restart)
+    if last_processed_title:
+        print(f"🗑️ Removing incomplete entries for: {last_processed_title}")
+        cur.execute("DELETE FROM sep_embeddings WHERE title = %s;", (last_processed_title,))
+        conn.commit()
+
+    # Insert function with conflict handling
+    insert_count = 0
+    BATCH_SIZE = 100
+
+    def insert_into_db(title, section, content, embedding):
+        nonlocal insert_count
+        content_hash = section_hash(title, section, content)
+
+        sql = """
+        INSERT INTO sep_embeddings (title, section, content, embedding, hash)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (hash) DO NOTHING;
+        """
+        try:
+            cur.execute(sql, (title, section, content, embedding, content_hash))
+            insert_count += 1
+
+            if insert_count % BATCH_SIZE == 0:
+                conn.commit()
+                print(f"🔄 Committed {insert_count} inserts so far...")
+
+        except Exception as e:
+            print(f"❌ Error inserting {title} - {section}: {e}")
+
+    # Get JSON files
+    json_files = sorted([f for f in os.listdir(json_directory) if f.endswith(".json")])
+    total_files = len(json_files)
+
+    print(f"📂 Found {total_files} JSON files. Resuming from: {last_processed_title if last_processed_title else 'Start'}")
+
+    resume_file = False if last_processed_title else True
+    resume_section = False if last_processed_section else True
+
+    # Process JSON Files
+    for filename in tqdm(json_files, desc="📊 Processing JSON files", unit="file"):
+        file_path = os.path.join(json_directory, filename)
+
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        title = data.get("title", "Unknown Title")
+
+        # Skip already processed files
+        if not resume_file:
+            if title == last_processed_title:
+                resume_file = True  # Found last processed file, resume now
+            continue  # Skip until we reach the last processed file
+
+        sections = data.get("sections", {})
+
+        print(f"\n📜 Processing Title: {title} with {len(sections)} sections")
+
+        for section_name, section_text in tqdm(sections.items(), desc=f"⚡ Processing Sections ({filename})", leave=False, unit="section"):
+            if len(section_text.strip()) > 0:
+                if not resume_section:
+                    if section_name == last_processed_section:
+                        resume_section = True
+                    continue  # Skip until we reach the last processed section
+
+                embedding = model.encode(section_text).tolist()
+                insert_into_db(title, section_name, section_text, embedding)
+
+    # Final commit after last batch
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    print(f"🎉 ✅ Vectorization and storage complete! Total inserted: {insert_count}")
+
+
+### 🚀 Pipelined mode: reader → batched encoder → bulk writer
+class StageStats:
+    """Items processed and time spent working (not waiting on other stages) by one pipeline stage."""
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.count = 0
+        self.busy = 0.0
+
+    def add(self, count, seconds):
+        self.count += count
+        self.busy += seconds
+
+    def report(self, wall_time):
+        busy_rate = self.count / self.busy if self.busy else 0.0
+        wall_rate = self.count / wall_time if wall_time else 0.0
+        return (f"   ➤ {self.name}: {self.count} {self.unit}, {busy_rate:.1f} {self.unit}/s while busy "
+                f"({self.busy:.1f}s), {wall_rate:.1f} {self.unit}/s overall")
+
+
+def iter_sections(json_directory, stats):
+    """Streams (title, section, content) for every non-empty section, one JSON file in memory at a time."""
+    json_files = sorted(f for f in os.listdir(json_directory) if f.endswith(".json"))
+    print(f"📂 Found {len(json_files)} JSON files")
+
+    for filename in json_files:
+        start = time.perf_counter()
+        with open(os.path.join(json_directory, filename), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        title = data.get("title", "Unknown Title")
+        sections = [(title, name, text) for name, text in data.get("sections", {}).items() if text.strip()]
+        stats.add(len(sections), time.perf_counter() - start)
+        yield from sections
+
+
+def _batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_worker_model = None
+
+
+def _init_encoder_worker():
+    global _worker_model
+    _worker_model = load_model()
+
+
+def _encode_in_worker(texts):
+    return _worker_model.encode(texts, batch_size=len(texts)).tolist()
+
+
+def encode_sections(sections, stats, batch_size=ENCODE_BATCH_SIZE, workers=0):
+    """
+    Yields (title, section, content, embedding) rows, encoding `batch_size` sections per call.
+    With `workers > 0` batches are spread over that many processes, each holding its own model.
+    """
+    batches = _batched(sections, batch_size)
+
+    if not workers:
+        model = load_model()
+        for batch in batches:
+            start = time.perf_counter()
+            vectors = model.encode([s[2] for s in batch], batch_size=batch_size).tolist()
+            stats.add(len(batch), time.perf_counter() - start)
+            for section, vector in zip(batch, vectors):
+                yield (*section, vector)
+        return
+
+    # Pool.imap reads its input eagerly; the semaphore keeps only a few batches in flight
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    pending = deque()
+    # Set when the consumer stops early, so the pool's feeder thread (blocked on the semaphore
+    # in texts()) exits instead of hanging Pool.terminate()
+    stop = threading.Event()
+
+    def texts():
+        for batch in batches:
+            while not in_flight.acquire(timeout=0.1):
+                if stop.is_set():
+                    return
+            if stop.is_set():
+                return
+            pending.append(batch)
+            yield [s[2] for s in batch]
+
+    with multiprocessing.get_context("spawn").Pool(workers, initializer=_init_encoder_worker) as pool:
+        results = pool.imap(_encode_in_worker, texts())
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    vectors = next(results)
+                except StopIteration:
+                    break
+                batch = pending.popleft()
+                in_flight.release()
+                stats.add(len(batch), time.perf_counter() - start)
+                for section, vector in zip(batch, vectors):
+                    yield (*section, vector)
+        finally:
+            stop.set()
+
+
+def write_rows(conn, rows, stats, batch_size=WRITE_BATCH_SIZE):
+    """Inserts (title, section, content, embedding) rows with one multi-row INSERT and commit per batch."""
+    inserted = 0
+    with conn.cursor() as cur:
+        for batch in _batched(rows, batch_size):
+            start = time.perf_counter()
+            values = [(title, section, content, embedding, section_hash(title, section, content))
+                      for title, section, content, embedding in batch]
+            execute_values(cur, INSERT_SQL, values, page_size=len(values))
+            inserted += max(cur.rowcount, 0)
             conn.commit()
-            print(f"🔄 Committed {insert_count} inserts so far...")
+            stats.add(len(batch), time.perf_counter() - start)
+    return inserted
+
+
+_DONE = object()
+
+
+def _feed(iterable, out_queue, errors):
+    try:
+        for item in iterable:
+            out_queue.put(item)
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        out_queue.put(_DONE)
 
-    except Exception as e:
-        print(f"❌ Error inserting {title} - {section}: {e}")
 
-# Get JSON files
-json_files = sorted([f for f in os.listdir(JSON_DIRECTORY) if f.endswith(".json")])
-total_files = len(json_files)
+def _drain(in_queue):
+    while True:
+        item = in_queue.get()
+        if item is _DONE:
+            return
+        yield item
 
-print(f"📂 Found {total_files} JSON files. Resuming from: {last_processed_title if last_processed_title else 'Start'}")
 
-resume_file = False if last_processed_title else True
-resume_section = False if last_processed_section else True
+def run_pipeline(json_directory=JSON_DIRECTORY, encode_batch_size=ENCODE_BATCH_SIZE, workers=0,
+                 write_batch_size=WRITE_BATCH_SIZE):
+    """
+    Re-vectorizes every section with the reader, encoder and writer running concurrently,
+    connected by bounded queues. Existing rows (same hash) are left untouched.
+    """
+    conn = get_connection()
+    print("✅ Connected to PostgreSQL")
+    ensure_table(conn)
 
-# Process JSON Files
-for filename in tqdm(json_files, desc="📊 Processing JSON files", unit="file"):
-    file_path = os.path.join(JSON_DIRECTORY, filename)
+    read_stats = StageStats("read", "sections")
+    encode_stats = StageStats("encode", "sections")
+    write_stats = StageStats("write", "rows")
+    errors = []
+    result = {}
 
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    sections_queue = queue.Queue(maxsize=QUEUE_DEPTH * encode_batch_size)
+    rows_queue = queue.Queue(maxsize=QUEUE_DEPTH * write_batch_size)
 
-    title = data.get("title", "Unknown Title")  
+    def writer():
+        try:
+            result["inserted"] = write_rows(conn, _drain(rows_queue), write_stats, batch_size=write_batch_size)
+        except BaseException as e:
+            errors.append(e)
+            for _ in _drain(rows_queue):
+                pass  # keep the encoder from blocking on a full queue
 
-    # Skip already processed files
-    if not resume_file:
-        if title == last_processed_title:
-            resume_file = True  # Found last processed file, resume now
-        continue  # Skip until we reach the last processed file
+    started = time.perf_counter()
+    reader_thread = threading.Thread(
+        target=_feed, args=(iter_sections(json_directory, read_stats), sections_queue, errors), daemon=True
+    )
+    writer_thread = threading.Thread(target=writer, daemon=True)
+    reader_thread.start()
+    writer_thread.start()
+
+    try:
+        with tqdm(desc="⚡ Encoding sections", unit="section") as progress:
+            for row in encode_sections(_drain(sections_queue), encode_stats,
+                                       batch_size=encode_batch_size, workers=workers):
+                rows_queue.put(row)
+                progress.update(1)
+                if errors:
+                    break
+    finally:
+        rows_queue.put(_DONE)
+        writer_thread.join()
+        conn.close()
 
-    sections = data.get("sections", {})
+    if errors:
+        raise errors[0]
 
-    print(f"\n📜 Processing Title: {title} with {len(sections)} sections")
+    wall_time = time.perf_counter() - started
+    print(f"🎉 ✅ Vectorization and storage complete in {wall_time:.1f}s! "
+          f"Total inserted: {result.get('inserted', 0)}")
+    for stats in (read_stats, encode_stats, write_stats):
+        print(stats.report(wall_time))
 
-    for section_name, section_text in tqdm(sections.items(), desc=f"⚡ Processing Sections ({filename})", leave=False, unit="section"):
-        if len(section_text.strip()) > 0:
-            if not resume_section:
-                if section_name == last_processed_section:
-                    resume_section = True
-                continue  # Skip until we reach the last processed section
-            
-            embedding = model.encode(section_text).tolist()
-            insert_into_db(title, section_name, section_text, embedding)
 
-# Final commit after last batch
-conn.commit()
-cur.close()
-conn.close()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed SEP sections and store them in PostgreSQL.")
+    parser.add_argument("--json-dir", default=JSON_DIRECTORY)
+    parser.add_argument("--pipeline", action="store_true", help="batched, pipelined ingestion instead of resume mode")
+    parser.add_argument("--batch-size", type=int, default=ENCODE_BATCH_SIZE, help="sections per encode call")
+    parser.add_argument("--workers", type=int, default=0, help="encoder processes (0 = encode in this process)")
+    parser.add_argument("--write-batch-size", type=int, default=WRITE_BATCH_SIZE, help="rows per INSERT/commit")
+    args = parser.parse_args()
 
-print(f"🎉 ✅ Vectorization and storage complete! Total inserted: {insert_count}")
+    if args.pipeline:
+        run_pipeline(args.json_dir, encode_batch_size=args.batch_size, workers=args.workers,
+                     write_batch_size=args.write_batch_size)
+    else:
+        run_resume(args.json_dir)
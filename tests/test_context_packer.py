@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+
+from LLM_querying.context_packer import chunk_key, dedupe_chunks, mmr_order, pack_context
+
+
+def fixed_encoder(vectors):
+    """`encode` callable returning the given vector per text (and the question's)."""
+    def encode(texts):
+        return {text: vectors[text] for text in texts}
+    return encode
+
+
+class DedupeTest(unittest.TestCase):
+    def test_keys(self):
+        self.assertEqual(chunk_key("[SEP 42 - Kant] Autonomy is..."), "sep:42")
+        self.assertEqual(chunk_key("[Concept: Virtue ] Excellence of character"), "concept:virtue")
+        self.assertEqual(chunk_key("plain text"), "plain text")
+
+    def test_keeps_first_per_key_in_order(self):
+        chunks = ["[SEP 1 - A] first", "[Concept: Virtue] x", "[SEP 1 - A] second", "[Concept: virtue] y", "z", "z"]
+        self.assertEqual(dedupe_chunks(chunks), ["[SEP 1 - A] first", "[Concept: Virtue] x", "z"])
+
+
+class MmrOrderTest(unittest.TestCase):
+    question = [1.0, 0.0, 0.0]
+
+    def test_pure_relevance_sorts_by_similarity(self):
+        chunks = [[0.2, 1.0, 0.0], [1.0, 0.1, 0.0], [0.6, 0.0, 1.0]]
+        self.assertEqual(mmr_order(self.question, chunks, mmr_lambda=1.0, dup_threshold=1.1), [1, 2, 0])
+
+    def test_diversity_demotes_redundant_chunk(self):
+        # 0 and 1 are both relevant and nearly identical; 2 is less relevant but different
+        chunks = [[1.0, 0.3, 0.0], [1.0, 0.35, 0.0], [0.7, 0.0, 0.7]]
+        self.assertEqual(mmr_order(self.question, chunks, mmr_lambda=1.0, dup_threshold=1.1), [0, 1, 2])
+        self.assertEqual(mmr_order(self.question, chunks, mmr_lambda=0.5, dup_threshold=1.1), [0, 2, 1])
+
+    def test_near_duplicates_are_dropped(self):
+        chunks = [[1.0, 0.0, 0.0], [1.0, 0.01, 0.0], [0.0, 1.0, 0.0]]
+        self.assertEqual(mmr_order(self.question, chunks, mmr_lambda=0.7, dup_threshold=0.95), [0, 2])
+
+    def test_scale_invariant(self):
+        chunks = np.array([[0.2, 1.0, 0.0], [1.0, 0.1, 0.0], [0.6, 0.0, 1.0]])
+        self.assertEqual(mmr_order(self.question, chunks * 10, mmr_lambda=0.7),
+                         mmr_order(self.question, chunks, mmr_lambda=0.7))
+
+
+class PackContextTest(unittest.TestCase):
+    def test_orders_by_mmr_and_dedupes_embeddings(self):
+        vectors = {"q": [1.0, 0.0], "off topic": [0.0, 1.0], "on topic": [1.0, 0.05], "on topic again": [1.0, 0.06]}
+        packed = pack_context("q", ["off topic", "on topic", "on topic again"], encode=fixed_encoder(vectors))
+        self.assertEqual(packed, ["on topic", "off topic"])
+
+    def test_token_budget_skips_chunks_that_do_not_fit(self):
+        chunks = ["a" * 40, "b" * 400, "c" * 20]  # ~10, ~100 and ~5 tokens
+        self.assertEqual(pack_context("q", chunks, token_budget=20), ["a" * 40, "c" * 20])
+
+    def test_encoding_failure_keeps_original_order(self):
+        def failing(texts):
+            raise RuntimeError("model unavailable")
+        chunks = ["[SEP 2 - B] x", "[SEP 1 - A] y", "[SEP 2 - B] z"]
+        with self.assertLogs("LLM_querying.context_packer", level="WARNING"):
+            self.assertEqual(pack_context("q", chunks, encode=failing), ["[SEP 2 - B] x", "[SEP 1 - A] y"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from collections import deque
+from unittest import mock
+
+import numpy as np
+
+from LLM_querying.DB_operations.graph_snapshot import GraphSnapshot, build_csr
+from LLM_querying.DB_operations.distance_oracle import (
+    DistanceOracle, bfs_distances, build_distance_oracle, connected_components,
+)
+
+
+def write_snapshot(path, ids, kinds, sources, targets, weights):
+    offsets, neighbors, edge_weights = build_csr(len(ids), np.asarray(sources), np.asarray(targets),
+                                                 np.asarray(weights, dtype=np.float32))
+    with open(os.path.join(path, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    np.save(os.path.join(path, "kinds.npy"), np.asarray(kinds, dtype=np.int8))
+    np.save(os.path.join(path, "offsets.npy"), offsets)
+    np.save(os.path.join(path, "neighbors.npy"), neighbors)
+    np.save(os.path.join(path, "weights.npy"), edge_weights)
+
+
+def adjacency(num_nodes, edges):
+    graph = [set() for _ in range(num_nodes)]
+    for a, b in edges:
+        if a != b:
+            graph[a].add(b)
+            graph[b].add(a)
+    return graph
+
+
+def reference_distances(graph, source):
+    dist = {source: 0}
+    queue = deque([source])
+    while queue:
+        row = queue.popleft()
+        for neighbor in graph[row]:
+            if neighbor not in dist:
+                dist[neighbor] = dist[row] + 1
+                queue.append(neighbor)
+    return dist
+
+
+class BuildCsrTest(unittest.TestCase):
+    def test_undirected_deduplicated_and_sorted_by_weight(self):
+        # 0-1 twice (strongest weight kept), a self loop, and 0-2
+        offsets, neighbors, weights = build_csr(
+            3, np.array([0, 1, 0, 2]), np.array([1, 0, 2, 2]), np.array([0.5, 0.9, 0.7, 1.0], dtype=np.float32)
+        )
+        self.assertEqual(offsets.tolist(), [0, 2, 3, 4])
+        self.assertEqual(neighbors[offsets[0]:offsets[1]].tolist(), [1, 2])  # 0.9 before 0.7
+        self.assertAlmostEqual(float(weights[0]), 0.9, places=6)
+        self.assertEqual(neighbors[offsets[1]:offsets[2]].tolist(), [0])
+        self.assertEqual(neighbors[offsets[2]:offsets[3]].tolist(), [0])
+
+
+class GraphSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        # concept c0 links to c1 (0.9), overloaded o2 (0.8) and belief b3 (0.95); b3 - b4 - b5 chain
+        ids = ["c0", "c1", "o2", "b3", "b4", "b5"]
+        kinds = [0, 0, 1, 2, 2, 2]
+        edges = [(0, 1, 0.9), (0, 2, 0.8), (0, 3, 0.95), (3, 4, 0.7), (4, 5, 0.6)]
+        write_snapshot(self.path, ids, kinds, *zip(*edges))
+        self.snapshot = GraphSnapshot(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_nearest_filters_by_kind_strongest_first(self):
+        self.assertEqual(self.snapshot.nearest_concepts(["c0"], top_k=5), {"c0": ["c1", "o2"]})
+        self.assertEqual(self.snapshot.nearest_concepts(["c0"], top_k=1), {"c0": ["c1"]})
+        self.assertEqual(self.snapshot.nearest_beliefs(["b4"]), {"b4": ["b3", "b5"]})
+        self.assertEqual(self.snapshot.nearest_concepts(["b3", "missing"]), {"b3": [], "missing": []})
+
+    def test_within_distance(self):
+        self.assertEqual(sorted(self.snapshot.within_distance("b3", 1)), ["b4", "c0"])
+        self.assertEqual(sorted(self.snapshot.within_distance("b3", 2)), ["b4", "b5", "c0", "c1", "o2"])
+        self.assertEqual(len(self.snapshot.within_distance("b3", 2, max_nodes=3)), 3)
+        self.assertEqual(self.snapshot.within_distance("missing", 2), [])
+
+
+class DistanceOracleTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(7)
+        # Two sizeable random components (so both get landmarks), a small one and isolated nodes
+        num_nodes = 260
+        edges = []
+        for lo, hi, count in ((0, 150, 260), (150, 240, 150), (240, 250, 12)):
+            nodes = list(range(lo, hi))
+            for i in range(1, len(nodes)):  # spanning chain keeps each block connected
+                edges.append((nodes[i - 1], nodes[i]))
+            edges += [tuple(rng.sample(nodes, 2)) for _ in range(count)]
+
+        cls.path = tempfile.mkdtemp()
+        cls.ids = [f"n{i}" for i in range(num_nodes)]
+        sources, targets = zip(*edges)
+        write_snapshot(cls.path, cls.ids, [0] * num_nodes, sources, targets, [1.0] * len(edges))
+        build_distance_oracle(cls.path, num_landmarks=4)
+
+        cls.graph = adjacency(num_nodes, edges)
+        cls.snapshot = GraphSnapshot(cls.path)
+        cls.oracle = DistanceOracle(cls.snapshot)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def assertValidPath(self, path, start, goal):
+        rows = [self.snapshot.row_of[node_id] for node_id in path]
+        self.assertEqual(rows[0], start)
+        self.assertEqual(rows[-1], goal)
+        for a, b in zip(rows, rows[1:]):
+            self.assertIn(b, self.graph[a])
+
+    def test_components_match_reachability(self):
+        components = connected_components(np.asarray(self.snapshot.offsets), np.asarray(self.snapshot.neighbors),
+                                          len(self.ids))
+        self.assertEqual(len(set(components.tolist())), 3 + 10)  # three blocks plus ten isolated nodes
+        reachable = reference_distances(self.graph, 0)
+        for row in range(len(self.ids)):
+            self.assertEqual(components[row] == components[0], row in reachable)
+
+    def test_bfs_distances_match_reference(self):
+        dist = bfs_distances(np.asarray(self.snapshot.offsets), np.asarray(self.snapshot.neighbors), 160, len(self.ids))
+        expected = reference_distances(self.graph, 160)
+        for row in range(len(self.ids)):
+            self.assertEqual(dist[row], expected.get(row, -1))
+
+    def test_shortest_paths_are_shortest(self):
+        rng = random.Random(1)
+        for _ in range(60):
+            start, goal = rng.randrange(250), rng.randrange(250)
+            expected = reference_distances(self.graph, start).get(goal)
+            path = self.oracle.shortest_path(self.ids[start], self.ids[goal])
+            if expected is None:
+                self.assertEqual(path, [])
+                self.assertFalse(self.oracle.is_reachable(self.ids[start], self.ids[goal]))
+                continue
+            self.assertEqual(len(path) - 1, expected)
+            self.assertValidPath(path, start, goal)
+
+    def test_distance_bounds_bracket_true_distance(self):
+        rng = random.Random(2)
+        for _ in range(60):
+            start, goal = rng.randrange(240), rng.randrange(240)
+            expected = reference_distances(self.graph, start).get(goal)
+            bounds = self.oracle.distance_bounds(self.ids[start], self.ids[goal])
+            if expected is None:
+                self.assertIsNone(bounds)
+                continue
+            lower, upper = bounds
+            self.assertLessEqual(lower, expected)
+            if upper is not None:
+                self.assertGreaterEqual(upper, expected)
+
+    def test_trivial_and_unknown_paths(self):
+        self.assertEqual(self.oracle.shortest_path("n3", "n3"), ["n3"])
+        self.assertEqual(self.oracle.shortest_path("n3", "missing"), [])
+        self.assertEqual(self.oracle.shortest_path("n250", "n251"), [])  # isolated nodes
+
+    def test_known_unreachable_needs_both_nodes_in_the_snapshot(self):
+        self.assertTrue(self.oracle.known_unreachable("n0", "n200"))
+        self.assertFalse(self.oracle.known_unreachable("n0", "n149"))
+        self.assertFalse(self.oracle.known_unreachable("n0", "added after the snapshot"))
+
+
+class ConceptPathTest(unittest.TestCase):
+    """get_concept_path on the default Neo4j backend."""
+
+    def setUp(self):
+        from LLM_querying import tools
+        self.tools = tools
+        self.shortest_path = self.enterContext(mock.patch.object(tools, "get_shortest_path", return_value=["a", "b"]))
+        self.enterContext(mock.patch.object(tools, "use_local_graph", return_value=False))
+        self.enterContext(mock.patch.object(tools, "CONCEPT_PATH_MAX_HOPS", 4))
+
+    def test_neo4j_search_is_hop_bounded(self):
+        with mock.patch.object(self.tools, "find_distance_oracle", return_value=None):
+            self.assertEqual(self.tools.get_concept_path("a", "b"), ["a", "b"])
+        self.shortest_path.assert_called_once_with("a", "b", max_length=4)
+
+    def test_oracle_answers_unreachable_pairs(self):
+        oracle = mock.Mock()
+        oracle.known_unreachable.return_value = True
+        with mock.patch.object(self.tools, "find_distance_oracle", return_value=oracle):
+            self.assertEqual(self.tools.get_concept_path("a", "z"), [])
+        self.shortest_path.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,276 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+import pinecone
+import requests
+
+# The initial_DB_construction scripts import their siblings as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "initial_DB_construction"))
+os.environ.setdefault("NEON_URL", "postgresql://unused")
+
+import incremental_sync  # noqa: E402
+from incremental_sync import build_vectors, diff_sections, extract_document, list_vector_ids, stable_hash  # noqa: E402
+from vectorize_upload_json import section_hash  # noqa: E402
+
+
+def stored_row(row_id, title, section, content):
+    return (title, section), (row_id, section_hash(title, section, content))
+
+
+class DiffSectionsTest(unittest.TestCase):
+    def setUp(self):
+        self.stored = dict([
+            stored_row(1, "Kant", "Autonomy", "old text"),
+            stored_row(2, "Kant", "Duty", "unchanged text"),
+            stored_row(3, "Hume", "Induction", "removed upstream"),
+        ])
+
+    def test_new_changed_deleted_unchanged(self):
+        scraped = [
+            ("Kant", "Autonomy", "new text"),
+            ("Kant", "Duty", "unchanged text"),
+            ("Hegel", "Dialectic", "brand new"),
+        ]
+        new, changed, deleted, unchanged = diff_sections(scraped, self.stored)
+        self.assertEqual([(s["title"], s["section"]) for s in new], [("Hegel", "Dialectic")])
+        self.assertEqual(new[0]["hash"], section_hash("Hegel", "Dialectic", "brand new"))
+        self.assertEqual([(s["id"], s["content"]) for s in changed], [(1, "new text")])
+        self.assertEqual(changed[0]["hash"], section_hash("Kant", "Autonomy", "new text"))
+        self.assertEqual(deleted, [{"id": 3, "title": "Hume", "section": "Induction"}])
+        self.assertEqual(unchanged, 1)
+
+    def test_identical_scrape_is_a_no_op(self):
+        scraped = [("Kant", "Autonomy", "old text"), ("Kant", "Duty", "unchanged text"),
+                   ("Hume", "Induction", "removed upstream")]
+        self.assertEqual(diff_sections(scraped, self.stored), ([], [], [], 3))
+
+    def test_hash_covers_title_and_section(self):
+        # same content moved under another heading is a new section, and the old one is deleted
+        new, changed, deleted, _ = diff_sections([("Kant", "Freedom", "old text")], {
+            k: v for k, v in self.stored.items() if k == ("Kant", "Autonomy")})
+        self.assertEqual([s["section"] for s in new], ["Freedom"])
+        self.assertEqual(changed, [])
+        self.assertEqual([d["id"] for d in deleted], [1])
+
+    def test_duplicate_sections_keep_first(self):
+        scraped = [("Hegel", "Dialectic", "first"), ("Hegel", "Dialectic", "second"),
+                   ("Kant", "Autonomy", "old text"), ("Kant", "Autonomy", "edited later")]
+        new, changed, _, unchanged = diff_sections(scraped, self.stored)
+        self.assertEqual([s["content"] for s in new], ["first"])
+        self.assertEqual(changed, [])
+        self.assertEqual(unchanged, 1)
+
+
+class FakeIndex:
+    def __init__(self, ids):
+        self.ids = ids
+
+    def list(self, prefix):
+        matches = [vid for vid in self.ids if vid.startswith(prefix)]
+        for start in range(0, len(matches), 2):  # paginated like Index.list
+            yield matches[start:start + 2]
+
+
+class VectorIdsTest(unittest.TestCase):
+    def test_lists_only_belief_and_concept_vectors(self):
+        index = FakeIndex(["7_belief_1", "7_belief_2", "7_belief_3", "7_concept_4", "7_overloaded_concept_5",
+                           "70_belief_6", "8_concept_7"])
+        self.assertEqual(sorted(list_vector_ids(index, [7])), ["7_belief_1", "7_belief_2", "7_belief_3",
+                                                               "7_concept_4"])
+
+    def test_build_vectors_ids_are_stable(self):
+        mistral_json = {
+            "key_beliefs": [{"belief": " Duty binds reason ", "justification": "j",
+                             "related_concepts": [{"name": "duty"}, "reason"]}, {"belief": "  "}],
+            "key_concepts": [{"name": "Autonomy"}, "not a dict"],
+        }
+        vectors = build_vectors(7, "Kant", mistral_json)
+        self.assertEqual([vid for vid, _, _ in vectors],
+                         [f"7_belief_{stable_hash('Duty binds reason')}", f"7_concept_{stable_hash('Autonomy')}"])
+        self.assertEqual(vectors[0][2]["related_concepts"], "duty, reason")
+        self.assertEqual(stable_hash("Autonomy"), stable_hash("Autonomy"))
+        self.assertLess(stable_hash("Autonomy"), 10**8)
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self.body = body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Client Error")
+
+    def json(self):
+        if self.body is None:
+            raise json.JSONDecodeError("Expecting value", "", 0)
+        return self.body
+
+
+def completion(output):
+    return FakeResponse(body={"choices": [{"message": {"content": "Here you go: " + json.dumps(output)}}]})
+
+
+EXTRACTED = {"key_beliefs": [{"belief": "Reason legislates", "justification": "j", "related_concepts": []}],
+             "key_concepts": [{"name": "Autonomy"}]}
+
+
+def fake_post(url, headers=None, json=None, timeout=None):
+    """Mistral stand-in: the section content decides how the request goes."""
+    content = json["messages"][1]["content"]
+    if "connection drops" in content:
+        raise requests.ConnectionError("connection reset")
+    if "bad request" in content:
+        return FakeResponse(400, {"message": "invalid"})
+    if "no choices" in content:
+        return FakeResponse(body={"object": "error"})
+    if "not json" in content:
+        return FakeResponse()
+    return completion(EXTRACTED)
+
+
+@mock.patch.object(incremental_sync.time, "sleep", lambda seconds: None)
+@mock.patch.object(incremental_sync.requests, "post", side_effect=fake_post)
+class ExtractDocumentTest(unittest.TestCase):
+    def setUp(self):
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+
+    def test_parses_the_first_json_object(self, post):
+        self.assertEqual(extract_document("fine"), EXTRACTED)
+
+    def test_failures_return_none(self, post):
+        for content in ("connection drops", "bad request", "no choices", "not json"):
+            with self.subTest(content=content):
+                self.assertIsNone(extract_document(content, max_retries=2))
+
+    def test_retries_server_errors(self, post):
+        post.side_effect = [FakeResponse(503), requests.Timeout("slow"), completion(EXTRACTED)]
+        self.assertEqual(extract_document("fine"), EXTRACTED)
+        self.assertEqual(post.call_count, 3)
+
+
+class FakeModel:
+    def encode(self, texts, batch_size=None):
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+class RunSyncTest(unittest.TestCase):
+    """run_sync against fake Neon, Pinecone, Neo4j and Mistral."""
+
+    def setUp(self):
+        stored = [stored_row(1, "Kant", "Autonomy", "old text"), stored_row(2, "Kant", "Duty", "old duty"),
+                  stored_row(3, "Hume", "Induction", "removed upstream")]
+        self.scraped = [("Kant", "Autonomy", "new text"), ("Kant", "Duty", "bad request"),
+                        ("Hegel", "Dialectic", "connection drops"), ("Marx", "Labour", "brand new")]
+        self.index = mock.MagicMock()
+        self.index.list.side_effect = lambda prefix: iter([[prefix + "old"]])
+        for patcher in (
+            mock.patch.object(incremental_sync, "get_connection"),
+            mock.patch.object(incremental_sync, "load_stored_hashes", return_value=dict(stored)),
+            mock.patch.object(incremental_sync, "has_json_files", return_value=True),
+            mock.patch.object(incremental_sync, "iter_sections", return_value=self.scraped),
+            # one of three stored sections is deleted; the mass-delete guard has its own tests
+            mock.patch.object(incremental_sync, "MAX_DELETE_FRACTION", 0.5),
+            mock.patch.object(incremental_sync, "reserve_ids", side_effect=lambda conn, count: list(range(10, 10 + count))),
+            mock.patch.object(incremental_sync, "load_model", return_value=FakeModel()),
+            mock.patch.object(incremental_sync, "write_manifest"),
+            mock.patch.object(incremental_sync.time, "sleep", lambda seconds: None),
+            mock.patch.object(incremental_sync.requests, "post", side_effect=fake_post),
+            mock.patch("pinecone.Pinecone"),
+            mock.patch("neo4j.GraphDatabase.driver"),
+            contextlib.redirect_stdout(io.StringIO()),
+        ):
+            self.enterContext(patcher)
+        pinecone.Pinecone.return_value.Index.return_value = self.index
+        self.apply_neon = self.enterContext(mock.patch.object(incremental_sync, "apply_neon"))
+
+    def test_failed_extractions_do_not_stop_the_others(self):
+        manifest = incremental_sync.run_sync("unused")
+        conn, new, changed, deleted, embeddings, outputs = self.apply_neon.call_args.args
+        self.assertEqual([s["title"] for s in new], ["Marx"])
+        self.assertEqual([s["id"] for s in changed], [1])
+        self.assertEqual([s["id"] for s in deleted], [3])
+        self.assertEqual(sorted(outputs), [1, 11])
+        self.assertEqual(sorted(manifest["extraction_failed"]), [2, 10])
+        # the failed sections' old vectors stay; the others' are replaced
+        self.assertEqual(sorted(manifest["vectors_deleted"]), ["1_belief_old", "1_concept_old",
+                                                               "3_belief_old", "3_concept_old"])
+        self.assertEqual(len(manifest["vectors_upserted"]), 4)
+
+    def test_skip_extraction_keeps_changed_vectors(self):
+        manifest = incremental_sync.run_sync("unused", skip_extraction=True)
+        incremental_sync.requests.post.assert_not_called()
+        self.assertEqual(sorted(manifest["vectors_deleted"]), ["3_belief_old", "3_concept_old"])
+        self.assertEqual(manifest["vectors_upserted"], [])
+        self.assertEqual(sorted(manifest["extraction_pending"]), [1, 2, 10, 11])
+
+    def test_mass_deletion_is_held_back(self):
+        with mock.patch.object(incremental_sync, "MAX_DELETE_FRACTION", 0.1):
+            manifest = incremental_sync.run_sync("unused")
+        self.assertTrue(manifest["deletions_refused"])
+        self.assertEqual([s["id"] for s in manifest["deleted"]], [3])
+        self.assertEqual(sorted(manifest["vectors_deleted"]), ["1_belief_old", "1_concept_old"])
+        self.assertEqual(self.apply_neon.call_args.args[3], [])
+
+    def test_mass_deletion_needs_the_flag(self):
+        with mock.patch.object(incremental_sync, "MAX_DELETE_FRACTION", 0.1):
+            manifest = incremental_sync.run_sync("unused", allow_mass_delete=True)
+        self.assertFalse(manifest["deletions_refused"])
+        self.assertEqual([s["id"] for s in self.apply_neon.call_args.args[3]], [3])
+
+    def test_no_json_files_aborts_before_touching_anything(self):
+        with mock.patch.object(incremental_sync, "has_json_files", return_value=False):
+            with self.assertRaises(ValueError):
+                incremental_sync.run_sync("unused")
+        incremental_sync.get_connection.assert_not_called()
+
+
+class ApplyPineconeTest(unittest.TestCase):
+    def test_stamps_the_marker_the_search_cache_reads(self):
+        from LLM_querying.DB_operations import pinecone_operations
+
+        index = mock.MagicMock()
+        incremental_sync.apply_pinecone(index, ["1_belief_old"], [("1_belief_new", [1.0], {"type": "belief"})])
+        (marker,), = (c.kwargs["vectors"] for c in index.upsert.call_args_list
+                      if c.kwargs.get("namespace") == pinecone_operations.INDEX_VERSION_NAMESPACE)
+        self.assertEqual(marker[0], pinecone_operations.INDEX_VERSION_ID)
+
+    def test_no_changes_leave_the_version_alone(self):
+        index = mock.MagicMock()
+        incremental_sync.apply_pinecone(index, [], [])
+        index.upsert.assert_not_called()
+
+
+class ApplyNeonTest(unittest.TestCase):
+    def test_sections_without_output_get_a_pending_hash(self):
+        changed = [{"id": 1, "content": "c1", "hash": "h1"}, {"id": 2, "content": "c2", "hash": "h2"}]
+        new = [{"id": 10, "title": "Marx", "section": "Labour", "content": "c10", "hash": "h10"}]
+        embeddings = {"h1": [0.1], "h2": [0.2], "h10": [1.0]}
+        conn = mock.MagicMock()
+        with mock.patch.object(incremental_sync, "execute_values") as execute_values:
+            incremental_sync.apply_neon(conn, new, changed, [], embeddings, {1: {"key_beliefs": []}})
+        (_, _, updates), (_, _, inserts) = (c.args for c in execute_values.call_args_list)
+        self.assertEqual([(row[0], row[2], row[4]) for row in updates],
+                         [(1, "h1", '{"key_beliefs": []}'), (2, "pending:h2", None)])
+        self.assertEqual((inserts[0][4], inserts[0][6]), ("pending:h10", None))
+        conn.commit.assert_called_once()
+
+    def test_changed_sections_without_output_keep_the_old_extraction(self):
+        changed = [{"id": 1, "content": "c1", "hash": "h1"}, {"id": 2, "content": "c2", "hash": "h2"}]
+        conn = mock.MagicMock()
+        with mock.patch.object(incremental_sync, "execute_values") as execute_values:
+            incremental_sync.apply_neon(conn, [], changed, [], {"h1": [0.1], "h2": [0.2]}, {1: {"key_beliefs": []}})
+        (_, query, updates), = (c.args for c in execute_values.call_args_list)
+        # a NULL output falls back to the stored extraction instead of overwriting it
+        self.assertIn("COALESCE(v.output::jsonb, t.mistral_output)", query)
+        self.assertEqual([row[4] for row in updates], ['{"key_beliefs": []}', None])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmarks.mistral_standin import start_standin
+from LLM_querying import mistral_api
+from LLM_querying.response_cache import ResponseCache
+
+ANSWER = "Kant’s autonomy — “Selbstgesetzgebung” — Über Nietzsche: Wille zur Macht ✓"
+
+
+class StreamMistralChatTest(unittest.TestCase):
+    """Streaming and plain completions against the local stand-in, which sends raw UTF-8."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.requests = []
+
+        def responder(request):
+            cls.requests.append(request)
+            return ANSWER
+
+        cls.server = start_standin(responder=responder)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.enterContext(mock.patch.object(mistral_api, "MISTRAL_URL", self.server.url))
+        self.enterContext(mock.patch.object(mistral_api, "response_cache", None))
+        self.requests.clear()
+
+    def test_stream_decodes_utf8_deltas(self):
+        deltas = list(mistral_api.stream_mistral_chat("prompt"))
+        self.assertGreater(len(deltas), 1)
+        self.assertEqual("".join(deltas).strip(), ANSWER)
+        self.assertTrue(self.requests[0]["stream"])
+
+    def test_plain_completion_decodes_utf8(self):
+        self.assertEqual(mistral_api.call_mistral_chat("prompt"), ANSWER)
+
+    def test_streamed_response_is_cached(self):
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.object(mistral_api, "response_cache", ResponseCache(cache_dir, ttl=None)):
+            first = "".join(mistral_api.call_mistral_chat("prompt", stream=True))
+            second = list(mistral_api.call_mistral_chat("prompt", stream=True))
+        self.assertEqual(second, [first])
+        self.assertEqual(len(self.requests), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
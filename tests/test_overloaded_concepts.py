@@ -0,0 +1,123 @@
+import unittest
+from unittest import mock
+
+from LLM_querying.DB_operations.overloaded_concepts import (
+    name_key, normalize_concept_name, overloaded_vector_id, plan_merges, prune_sections,
+)
+
+
+def concept(node_id, name, sep_id):
+    return {"id": node_id, "kind": "concept", "name": name, "key": name_key(name), "sep_id": sep_id,
+            "document_title": f"Entry {sep_id}"}
+
+
+def overloaded(node_id, name, sep_ids, vector_ids):
+    return {"id": node_id, "kind": "overloaded", "name": name, "key": name_key(name), "sep_ids": sep_ids,
+            "document_titles": [f"Entry {s}" for s in sep_ids], "vector_ids": vector_ids}
+
+
+class NameKeyTest(unittest.TestCase):
+    def test_normalization(self):
+        self.assertEqual(normalize_concept_name("  Free   Will "), "free will")
+        self.assertEqual(normalize_concept_name("Übermensch"), "ubermensch")
+        self.assertEqual(normalize_concept_name("Being-for-itself"), "being for itself")
+        self.assertEqual(normalize_concept_name("Kant's \"Categorical\" Imperative!"), "kant s categorical imperative")
+        self.assertEqual(normalize_concept_name("STRASSE"), normalize_concept_name("straße"))  # casefold, not lower
+        self.assertEqual(normalize_concept_name(None), "")
+
+    def test_keys_match_across_spellings(self):
+        self.assertEqual(name_key("Élan vital"), name_key("elan  VITAL."))
+        self.assertNotEqual(name_key("free will"), name_key("freewill"))
+        self.assertEqual(len(name_key("anything")), 16)
+
+
+class PlanMergesTest(unittest.TestCase):
+    def test_lone_nodes_need_no_merge(self):
+        nodes = [concept("1_concept_a", "Autonomy", 1), overloaded("9_overloaded_concept_x", "Virtue", [9, 10], ["v1"])]
+        self.assertEqual(plan_merges(nodes), [])
+        self.assertEqual(plan_merges([]), [])
+
+    def test_concepts_sharing_a_key_create_an_overloaded_concept(self):
+        nodes = [concept("2_concept_b", "free will", 2), concept("1_concept_a", "Free Will", 1),
+                 concept("3_concept_c", "Determinism", 3)]
+        (merge,) = plan_merges(nodes)
+        self.assertTrue(merge["create"])
+        self.assertEqual(merge["name"], "Free Will")  # lowest ID names the group
+        self.assertEqual(merge["target"], overloaded_vector_id([1, 2], "Free Will"))
+        self.assertEqual(merge["master_vector"], "1_concept_a")
+        self.assertEqual((merge["sep_ids"], merge["vector_ids"]), ([1, 2], ["1_concept_a", "2_concept_b"]))
+        self.assertEqual(merge["absorb"], [("1_concept_a", "concept"), ("2_concept_b", "concept")])
+
+    def test_existing_overloaded_concept_absorbs_new_duplicates(self):
+        nodes = [overloaded("1_overloaded_concept_x", "Free will", [1, 2], ["1_concept_a", "2_concept_b"]),
+                 concept("5_concept_e", "FREE-WILL", 5)]
+        (merge,) = plan_merges(nodes)
+        self.assertFalse(merge["create"])
+        self.assertEqual(merge["target"], "1_overloaded_concept_x")
+        self.assertIsNone(merge["master_vector"])
+        self.assertEqual(merge["sep_ids"], [1, 2, 5])
+        self.assertEqual(merge["vector_ids"], ["1_concept_a", "2_concept_b", "5_concept_e"])
+        self.assertEqual(merge["absorb"], [("5_concept_e", "concept")])
+
+    def test_re_extracted_concept_merges_into_its_target_once(self):
+        # section 2 was re-extracted: its concept comes back under the ID already folded in
+        nodes = [overloaded("1_overloaded_concept_x", "Free will", ["1", "2"], ["1_concept_a", "2_concept_b"]),
+                 concept("2_concept_b", "free will", 2.0), concept("5_concept_e", "Free Will", 5)]
+        (merge,) = plan_merges(nodes)
+        self.assertEqual(merge["sep_ids"], ["1", "2", 5])
+        self.assertEqual(merge["document_titles"], ["Entry 1", "Entry 2", "Entry 5"])
+        self.assertEqual(merge["vector_ids"], ["1_concept_a", "2_concept_b", "5_concept_e"])
+        self.assertEqual(merge["absorb"], [("2_concept_b", "concept"), ("5_concept_e", "concept")])
+
+    def test_duplicate_overloaded_concepts_fold_into_the_first(self):
+        nodes = [overloaded("4_overloaded_concept_y", "virtue", [4], ["4_concept_d"]),
+                 overloaded("1_overloaded_concept_x", "Virtue", [1, 2], ["1_concept_a", "2_concept_b"])]
+        (merge,) = plan_merges(nodes)
+        self.assertEqual(merge["target"], "1_overloaded_concept_x")
+        self.assertEqual(merge["absorb"], [("4_overloaded_concept_y", "overloaded")])
+        self.assertEqual(merge["sep_ids"], [1, 2, 4])
+
+    def test_synonym_links_join_groups(self):
+        nodes = [concept("1_concept_a", "Autonomy", 1), concept("2_concept_b", "Self-legislation", 2),
+                 concept("3_concept_c", "Heteronomy", 3)]
+        self.assertEqual(plan_merges(nodes), [])
+        # links are transitive, and links to nodes that were not loaded are ignored
+        (merge,) = plan_merges(nodes, links=[("1_concept_a", "2_concept_b"), ("2_concept_b", "9_concept_z")])
+        self.assertEqual(merge["absorb"], [("1_concept_a", "concept"), ("2_concept_b", "concept")])
+        self.assertEqual(merge["key"], name_key("Autonomy"))
+
+    def test_groups_are_planned_independently(self):
+        nodes = [concept("1_concept_a", "Virtue", 1), concept("2_concept_b", "virtue", 2),
+                 concept("3_concept_c", "Duty", 3), concept("4_concept_d", "duty", 4),
+                 concept("5_concept_e", "Care", 5)]
+        merges = plan_merges(nodes)
+        self.assertEqual(sorted(m["name"] for m in merges), ["Duty", "Virtue"])
+        absorbed = [node_id for m in merges for node_id, _ in m["absorb"]]
+        self.assertEqual(len(absorbed), len(set(absorbed)))  # each node folds into one target only
+
+
+class PruneSectionsTest(unittest.TestCase):
+    def test_deleted_sections_leave_overloaded_concepts(self):
+        stored = [overloaded("1_overloaded_concept_x", "Virtue", [1, 2, 3], ["1_concept_a", "2_concept_b", "3_concept_c"]),
+                  overloaded("2_overloaded_concept_y", "Duty", [2.0, "3"], ["2_concept_d", "3_concept_e"])]
+        driver, index = mock.MagicMock(), mock.MagicMock()
+        session = driver.session.return_value.__enter__.return_value
+        session.run.return_value = stored
+        updates, removed = prune_sections(driver, index, [2, 3])
+
+        (update,) = updates
+        self.assertEqual((update["target"], update["sep_ids"], update["vector_ids"]),
+                         ("1_overloaded_concept_x", [1], ["1_concept_a"]))
+        self.assertEqual(removed, ["2_overloaded_concept_y"])
+        index.update.assert_called_once()
+        self.assertEqual(index.update.call_args.kwargs["set_metadata"]["sep_ids"], ["1"])
+        index.delete.assert_called_once_with(ids=["2_overloaded_concept_y"])
+
+    def test_nothing_deleted_reads_nothing(self):
+        driver, index = mock.MagicMock(), mock.MagicMock()
+        self.assertEqual(prune_sections(driver, index, []), ([], []))
+        driver.session.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
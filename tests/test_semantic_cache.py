@@ -0,0 +1,214 @@
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from LLM_querying.DB_operations import pinecone_operations
+from LLM_querying.DB_operations.metadata_store import write_metadata_store
+from LLM_querying.semantic_cache import SemanticCache
+
+DIM = 64
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def neighbor(vector, cosine, rng):
+    """A unit vector at exactly `cosine` similarity to `vector`."""
+    noise = rng.standard_normal(len(vector)).astype(np.float32)
+    noise -= (noise @ vector) * vector
+    noise = unit(noise)
+    return unit(cosine * vector + np.sqrt(1 - cosine ** 2) * noise)
+
+
+class SemanticCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.query = unit(self.rng.standard_normal(DIM))
+
+    def test_exact_and_near_hits_miss_far(self):
+        cache = SemanticCache(DIM, max_size=10, threshold=0.97, ttl=None)
+        cache.put("beliefs:5", self.query, ["b1", "b2"])
+        self.assertEqual(cache.get("beliefs:5", self.query), ["b1", "b2"])
+        self.assertEqual(cache.get("beliefs:5", self.query * 3), ["b1", "b2"])  # scale does not matter
+        self.assertEqual(cache.get("beliefs:5", neighbor(self.query, 0.99, self.rng)), ["b1", "b2"])
+        self.assertIsNone(cache.get("beliefs:5", neighbor(self.query, 0.5, self.rng)))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (3, 1))
+
+    def test_near_hits_found_through_lsh_buckets(self):
+        cache = SemanticCache(DIM, max_size=1000, threshold=0.97, ttl=None)
+        base = [unit(self.rng.standard_normal(DIM)) for _ in range(200)]
+        for i, vector in enumerate(base):
+            cache.put("ns", vector, i)
+        found = [cache.get("ns", neighbor(vector, 0.985, self.rng)) for vector in base]
+        self.assertGreaterEqual(sum(value == i for i, value in enumerate(found)), 190)  # LSH may miss a few
+        self.assertTrue(all(value in (i, None) for i, value in enumerate(found)))  # but never returns a wrong one
+
+    def test_namespaces_are_separate(self):
+        cache = SemanticCache(DIM, threshold=0.97, ttl=None)
+        cache.put("beliefs:5", self.query, ["b1"])
+        self.assertIsNone(cache.get("concepts:5", self.query))
+        self.assertIsNone(cache.get("beliefs:10", self.query))
+
+    def test_returns_copies(self):
+        cache = SemanticCache(DIM, threshold=0.97, ttl=None)
+        value = ["b1"]
+        cache.put("ns", self.query, value)
+        value.append("mutated")
+        cache.get("ns", self.query).append("mutated too")
+        self.assertEqual(cache.get("ns", self.query), ["b1"])
+
+    def test_lru_eviction(self):
+        cache = SemanticCache(DIM, max_size=2, threshold=0.97, ttl=None)
+        a, b, c = (unit(self.rng.standard_normal(DIM)) for _ in range(3))
+        cache.put("ns", a, "a")
+        cache.put("ns", b, "b")
+        self.assertEqual(cache.get("ns", a), "a")  # a is now the most recently used
+        cache.put("ns", c, "c")
+        self.assertIsNone(cache.get("ns", b))
+        self.assertEqual(cache.get("ns", a), "a")
+        self.assertEqual(cache.get("ns", c), "c")
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.stats()["size"], 2)
+
+    def test_ttl_expiry(self):
+        cache = SemanticCache(DIM, threshold=0.97, ttl=0.05)
+        cache.put("ns", self.query, "old")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("ns", self.query))
+        self.assertEqual(cache.stats()["expired"], 1)
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_version_change_invalidates(self):
+        cache = SemanticCache(DIM, threshold=0.97, ttl=None)
+        cache.check_version("v1")
+        cache.put("ns", self.query, "stale")
+        cache.check_version("v1")
+        self.assertEqual(cache.get("ns", self.query), "stale")
+        cache.check_version("v2")
+        self.assertIsNone(cache.get("ns", self.query))
+        self.assertEqual(cache.stats()["invalidations"], 1)
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_clear(self):
+        cache = SemanticCache(DIM, threshold=0.97, ttl=None)
+        cache.put("ns", self.query, "x")
+        cache.clear()
+        self.assertIsNone(cache.get("ns", self.query))
+
+
+class FakePineconeIndex:
+    """Just enough of a Pinecone `Index` for version markers: fetch/upsert by namespace and stats."""
+
+    def __init__(self, total=100):
+        self.total = total
+        self.namespaces = {}
+
+    def upsert(self, vectors, namespace=""):
+        for vector_id, values, metadata in vectors:
+            self.namespaces.setdefault(namespace, {})[vector_id] = SimpleNamespace(id=vector_id, metadata=metadata)
+
+    def fetch(self, ids, namespace=""):
+        stored = self.namespaces.get(namespace, {})
+        return SimpleNamespace(vectors={i: stored[i] for i in ids if i in stored})
+
+    def describe_index_stats(self):
+        return {"total_vector_count": self.total}
+
+
+class IndexVersionTest(unittest.TestCase):
+    def setUp(self):
+        self.index = FakePineconeIndex()
+        for patcher in (
+            mock.patch.object(pinecone_operations, "get_index", return_value=self.index),
+            mock.patch.object(pinecone_operations, "SEARCH_CACHE_VERSION_INTERVAL", 0),
+            mock.patch.object(pinecone_operations, "_index_version", None),
+        ):
+            self.enterContext(patcher)
+
+    def test_stamp_changes_version_at_the_same_count(self):
+        unstamped = pinecone_operations.get_index_version()
+        self.assertEqual(unstamped, (None, 100))
+        pinecone_operations.stamp_index_version(self.index)
+        first = pinecone_operations.get_index_version()
+        pinecone_operations.stamp_index_version(self.index)  # e.g. a sync that replaced vectors 1:1
+        second = pinecone_operations.get_index_version()
+        self.assertNotEqual(first, unstamped)
+        self.assertNotEqual(first, second)
+        self.assertEqual(second[1], 100)
+        self.assertEqual(self.index.namespaces[pinecone_operations.INDEX_VERSION_NAMESPACE].keys(),
+                         {pinecone_operations.INDEX_VERSION_ID})
+
+    def test_count_change_without_stamp_still_counts(self):
+        pinecone_operations.stamp_index_version(self.index)
+        before = pinecone_operations.get_index_version()
+        self.index.total += 1
+        self.assertNotEqual(pinecone_operations.get_index_version(), before)
+
+    def test_stamp_invalidates_cached_searches(self):
+        cache = SemanticCache(DIM, threshold=0.97, ttl=None)
+        query = unit(np.ones(DIM))
+        cache.check_version(pinecone_operations.get_index_version())
+        cache.put("ns", query, ["deleted id"])
+        pinecone_operations.stamp_index_version(self.index)
+        cache.check_version(pinecone_operations.get_index_version())
+        self.assertIsNone(cache.get("ns", query))
+
+
+class MetadataStoreVersionTest(unittest.TestCase):
+    def setUp(self):
+        self.index = FakePineconeIndex()
+        pinecone_operations.stamp_index_version(self.index)
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "metadata.sqlite")
+        write_metadata_store([("1_concept_a", {"sep_ids": ["1"]})], path,
+                             index_version=pinecone_operations.read_index_version(self.index))
+        for patcher in (
+            mock.patch.object(pinecone_operations, "get_index", return_value=self.index),
+            mock.patch.object(pinecone_operations, "SEARCH_CACHE_VERSION_INTERVAL", 0),
+            mock.patch.object(pinecone_operations, "_index_version", None),
+            mock.patch.object(pinecone_operations, "METADATA_STORE_PATH", path),
+            mock.patch.object(pinecone_operations, "_metadata_store", None),
+            mock.patch.object(pinecone_operations, "_metadata_store_checked", False),
+        ):
+            self.enterContext(patcher)
+
+    def test_store_is_read_while_the_index_is_unchanged(self):
+        store = pinecone_operations.get_metadata_store()
+        self.assertIsNotNone(store)
+        self.assertEqual(store.get("1_concept_a"), {"sep_ids": ["1"]})
+
+    def test_lookups_do_not_reread_the_version(self):
+        self.assertIsNotNone(pinecone_operations.get_metadata_store())
+        with mock.patch.object(pinecone_operations, "read_index_version") as read:
+            for _ in range(3):
+                self.assertIsNotNone(pinecone_operations.get_metadata_store())
+        read.assert_not_called()
+
+    def test_store_stale_at_load_is_skipped(self):
+        pinecone_operations.stamp_index_version(self.index)  # e.g. a merge that rewrote sep_ids
+        with self.assertLogs(pinecone_operations.logger, "WARNING"):
+            self.assertIsNone(pinecone_operations.get_metadata_store())
+
+    def test_version_refresh_retires_a_store_that_went_stale(self):
+        self.assertIsNotNone(pinecone_operations.get_metadata_store())
+        pinecone_operations.stamp_index_version(self.index)
+        with self.assertLogs(pinecone_operations.logger, "WARNING"):
+            pinecone_operations.get_index_version()
+        self.assertIsNone(pinecone_operations.get_metadata_store())
+
+    def test_unreadable_version_keeps_the_store(self):
+        with mock.patch.object(pinecone_operations, "read_index_version", side_effect=ConnectionError("down")):
+            self.assertIsNotNone(pinecone_operations.get_metadata_store())
+            pinecone_operations.get_index_version()
+            self.assertIsNotNone(pinecone_operations.get_metadata_store())
+
+
+if __name__ == "__main__":
+    unittest.main()
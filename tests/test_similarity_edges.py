@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from LLM_querying.DB_operations.local_vector_index import LocalVectorIndex
+from LLM_querying.DB_operations.similarity_edges import (
+    BYTES_PER_PAIR, block_sizes, build_similarity_edges, top_k_neighbors,
+)
+
+
+def brute_force(vectors, sep_keys, source_rows, target_rows, exclude, k):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized[source_rows] @ normalized[target_rows].T
+    for i, source in enumerate(source_rows):
+        for j, target in enumerate(target_rows):
+            if source == target or sep_keys[target] in exclude[i]:
+                scores[i, j] = -np.inf
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return target_rows[order], np.take_along_axis(scores, order, axis=1)
+
+
+class BlockSizesTest(unittest.TestCase):
+    def test_working_set_fits_budget(self):
+        for num_sources, num_targets, dim, budget_mb in ((5000, 80000, 768, 64), (100, 100, 768, 1), (3000, 9000, 16, 1)):
+            source_block, target_block = block_sizes(num_sources, num_targets, dim, budget_mb)
+            working_set = 4 * dim * (source_block + target_block) + BYTES_PER_PAIR * source_block * target_block
+            self.assertLessEqual(working_set, budget_mb * 1024 * 1024)
+            self.assertLessEqual(source_block, num_sources)
+            self.assertLessEqual(target_block, num_targets)
+
+
+class TopKNeighborsTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.num_nodes = 1500  # more sources than one source block
+        self.vectors = rng.standard_normal((self.num_nodes, 16)).astype(np.float32)
+        self.sep_keys = rng.integers(0, 120, self.num_nodes).astype(np.float64)
+        self.sep_keys[:5] = np.nan  # rows without a SEP ID are never excluded by key
+
+    def exclusions(self, source_rows):
+        exclude = [[self.sep_keys[r]] if not np.isnan(self.sep_keys[r]) else [] for r in source_rows]
+        for i in range(0, len(exclude), 7):  # some sources span several SEP entries
+            exclude[i] = exclude[i] + [float((i * 13) % 120)]
+        return exclude
+
+    def test_matches_brute_force_across_blocks(self):
+        source_rows = np.arange(self.num_nodes, dtype=np.int64)
+        target_rows = np.arange(0, self.num_nodes, 2, dtype=np.int64)
+        exclude = self.exclusions(source_rows)
+
+        rows, scores = top_k_neighbors(self.vectors, self.sep_keys, source_rows, target_rows, exclude,
+                                       k=3, memory_budget_mb=1)
+        expected_rows, expected_scores = brute_force(self.vectors, self.sep_keys, source_rows, target_rows, exclude, 3)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5, atol=1e-5)
+        np.testing.assert_array_equal(rows, expected_rows)
+
+    def test_missing_neighbours_are_padded(self):
+        source_rows = np.asarray([10, 11], dtype=np.int64)
+        target_rows = np.asarray([10, 11, 12], dtype=np.int64)
+        exclude = [[self.sep_keys[12]], []]
+        rows, scores = top_k_neighbors(self.vectors, self.sep_keys, source_rows, target_rows, exclude, k=4)
+        # source 10: itself and row 12 are excluded, so one real neighbour
+        self.assertEqual(rows[0, 0], 11)
+        self.assertTrue(np.all(rows[0, 1:] == -1) and np.all(np.isneginf(scores[0, 1:])))
+
+    def test_no_sources_or_targets(self):
+        rows, scores = top_k_neighbors(self.vectors, self.sep_keys, np.empty(0, dtype=np.int64),
+                                       np.arange(10), [], k=2)
+        self.assertEqual(rows.shape, (0, 2))
+        rows, scores = top_k_neighbors(self.vectors, self.sep_keys, np.arange(3), np.empty(0, dtype=np.int64),
+                                       [[], [], []], k=2)
+        self.assertTrue(np.all(rows == -1))
+
+
+class BuildSimilarityEdgesTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        rng = np.random.default_rng(5)
+        types = ["belief", "concept", "overloaded_concept", "section"] * 15
+        metadata = []
+        for i, node_type in enumerate(types):
+            if node_type == "overloaded_concept":
+                metadata.append({"type": node_type, "sep_ids": [i % 6, (i + 1) % 6]})
+            else:
+                metadata.append({"type": node_type, "sep_id": i % 6})
+        np.save(os.path.join(self.path, "vectors.npy"), rng.standard_normal((len(types), 8)).astype(np.float32))
+        with open(os.path.join(self.path, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump([f"v{i}" for i in range(len(types))], f)
+        with open(os.path.join(self.path, "metadata.jsonl"), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(m) + "\n" for m in metadata)
+        self.index = LocalVectorIndex(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_one_edge_per_group_never_within_a_sep_entry(self):
+        edges = build_similarity_edges(self.index)
+        by_id = dict(zip(self.index.ids, self.index.metadata))
+        sources = [a for a, _, _ in edges]
+        nodes = [vid for vid, m in by_id.items() if m["type"] != "section"]
+        self.assertEqual(sorted(set(sources)), sorted(nodes))
+        for node in nodes:
+            self.assertEqual(sources.count(node), 2)  # best belief and best concept
+        sep_ids = lambda m: m.get("sep_ids") or [m["sep_id"]]
+        for a, b, weight in edges:
+            # a target is skipped when its (primary) SEP entry is one of the source's
+            self.assertNotIn(sep_ids(by_id[b])[0], sep_ids(by_id[a]))
+            self.assertNotEqual(by_id[b]["type"], "section")
+            self.assertNotEqual(a, b)
+            self.assertLessEqual(weight, 1.0 + 1e-6)
+
+    def test_source_ids_restrict_sources(self):
+        edges = build_similarity_edges(self.index, source_ids=["v0", "v1", "missing"])
+        self.assertEqual(sorted({a for a, _, _ in edges}), ["v0", "v1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
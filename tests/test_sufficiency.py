@@ -0,0 +1,82 @@
+import unittest
+from unittest import mock
+
+from LLM_querying import sufficiency
+from LLM_querying.sufficiency import collect_plan_aspects, coverage_score, estimate_sufficiency
+
+# Aspects and chunks on orthogonal axes: a chunk covers an aspect only if it shares its axis
+VECTORS = {
+    "autonomy": [1.0, 0.0, 0.0, 0.0],
+    "will to power": [0.0, 1.0, 0.0, 0.0],
+    "eternal return": [0.0, 0.0, 1.0, 0.0],
+    "Kant on autonomy": [0.95, 0.05, 0.0, 0.0],
+    "Nietzsche on power": [0.05, 0.9, 0.0, 0.1],
+    "unrelated": [0.0, 0.0, 0.0, 1.0],
+}
+
+
+def encode(texts):
+    return {text: VECTORS[text] for text in texts}
+
+
+class CollectPlanAspectsTest(unittest.TestCase):
+    def test_only_search_targets(self):
+        plan = {"steps": [
+            {"action": "search_beliefs", "target": ["autonomy", "will to power", "  "]},
+            {"action": "get_thinker", "target": "Kant"},
+            {"action": "expand_graph", "target": "c1"},
+            {"action": "search_concepts", "target": "eternal return"},
+        ]}
+        self.assertEqual(collect_plan_aspects(plan), ["autonomy", "will to power", "eternal return"])
+
+    def test_empty_plan(self):
+        self.assertEqual(collect_plan_aspects({}), [])
+
+
+class CoverageScoreTest(unittest.TestCase):
+    def test_fraction_of_covered_aspects(self):
+        aspects = ["autonomy", "will to power", "eternal return"]
+        self.assertAlmostEqual(coverage_score(aspects, ["Kant on autonomy", "Nietzsche on power"], encode), 2 / 3)
+        self.assertAlmostEqual(coverage_score(aspects, ["unrelated"], encode), 0.0)
+
+    def test_duplicate_aspects_count_once(self):
+        self.assertAlmostEqual(coverage_score(["autonomy", "autonomy", "will to power"], ["Kant on autonomy"], encode),
+                               0.5)
+
+    def test_no_aspects_or_no_context(self):
+        self.assertIsNone(coverage_score([], ["Kant on autonomy"], encode))
+        self.assertEqual(coverage_score(["autonomy"], [], encode), 0.0)
+
+
+@mock.patch.object(sufficiency, "SUFFICIENCY_FAST_PATH", True)
+class EstimateSufficiencyTest(unittest.TestCase):
+    def test_decisive_scores_answer_locally(self):
+        before = sufficiency.get_sufficiency_stats()
+        self.assertTrue(estimate_sufficiency(["autonomy"], ["Kant on autonomy"], encode))
+        self.assertFalse(estimate_sufficiency(["autonomy", "will to power"], ["unrelated"], encode))
+        after = sufficiency.get_sufficiency_stats()
+        self.assertEqual(after["local_yes"] - before["local_yes"], 1)
+        self.assertEqual(after["local_no"] - before["local_no"], 1)
+
+    def test_ambiguous_score_defers_to_llm(self):
+        aspects = ["autonomy", "will to power", "eternal return"]
+        self.assertIsNone(estimate_sufficiency(aspects, ["Kant on autonomy", "Nietzsche on power"], encode))
+
+    def test_encoder_failure_defers_to_llm(self):
+        def failing(texts):
+            raise RuntimeError("model unavailable")
+        with self.assertLogs("LLM_querying.sufficiency", level="WARNING"):
+            self.assertIsNone(estimate_sufficiency(["autonomy"], ["Kant on autonomy"], failing))
+
+    def test_no_aspects_defers_to_llm(self):
+        self.assertIsNone(estimate_sufficiency([], ["Kant on autonomy"], encode))
+
+
+class FastPathDisabledTest(unittest.TestCase):
+    def test_disabled_fast_path_always_defers(self):
+        with mock.patch.object(sufficiency, "SUFFICIENCY_FAST_PATH", False):
+            self.assertIsNone(estimate_sufficiency(["autonomy"], ["Kant on autonomy"], encode))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import contextvars
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from LLM_querying import tracing
+from LLM_querying.tracing import Histograms, context_bound, current_trace, propagate, span, start_trace
+
+
+def spans_by_name(trace):
+    return {s.name: s for s in trace.spans}
+
+
+def current_parent():
+    """ID of the span a new span would nest under (None at the top of a trace)."""
+    return tracing._current_span.get()
+
+
+class StartTraceTest(unittest.TestCase):
+    def test_nested_start_trace_reuses_the_outer_trace(self):
+        with start_trace("request") as outer:
+            with span("outer.step"):
+                with start_trace("helper") as inner:
+                    self.assertIs(inner, outer)
+                    with span("helper.step"):
+                        pass
+            self.assertIs(current_trace(), outer)  # leaving the nested block keeps the outer trace
+        self.assertIsNone(current_trace())
+        spans = spans_by_name(outer)
+        self.assertEqual(spans["helper.step"].parent, spans["outer.step"].id)
+        self.assertIsNotNone(outer.duration)
+
+    def test_spans_without_a_trace_are_noops(self):
+        with mock.patch.object(tracing, "TRACE_HISTOGRAMS", False):
+            with span("untraced") as s:
+                s.set(rows=1)
+        self.assertIsNone(current_trace())
+
+
+class PropagateTest(unittest.TestCase):
+    def test_worker_spans_nest_under_the_callers_span(self):
+        def work(i):
+            with span("worker", i=i):
+                return threading.get_ident()
+
+        with start_trace("request") as trace:
+            with span("caller") as caller:
+                with ThreadPoolExecutor(max_workers=3) as executor:
+                    list(executor.map(propagate(work), range(6)))
+            self.assertIsNone(current_parent())
+        workers = [s for s in trace.spans if s.name == "worker"]
+        self.assertEqual(len(workers), 6)
+        self.assertTrue(all(s.parent == caller.id for s in workers))
+
+    def test_run_steps_workers_nest_under_run_steps(self):
+        from LLM_querying import thinker_agent
+
+        def run_step(step, embeddings=None):
+            with span("tool.search"):
+                return [f"chunk for {step['target']}"]
+
+        steps = [{"action": "search_beliefs", "target": f"t{i}"} for i in range(4)]
+        with mock.patch.object(thinker_agent, "run_step", side_effect=run_step), \
+                mock.patch.object(thinker_agent, "encode_queries", return_value={}):
+            with start_trace("request") as trace:
+                with span("loop") as loop:
+                    chunks = thinker_agent.run_steps(steps, max_workers=4)
+
+        self.assertEqual(chunks, [f"chunk for t{i}" for i in range(4)])
+        by_id = {s.id: s for s in trace.spans}
+        (run_steps,) = [s for s in trace.spans if s.name == "run_steps"]
+        self.assertEqual(run_steps.parent, loop.id)
+        step_spans = [s for s in trace.spans if s.name == "step.search_beliefs"]
+        self.assertEqual(len(step_spans), 4)
+        self.assertTrue(all(s.parent == run_steps.id for s in step_spans))
+        tool_spans = [s for s in trace.spans if s.name == "tool.search"]
+        self.assertTrue(all(by_id[s.parent].name == "step.search_beliefs" for s in tool_spans))
+
+
+@context_bound
+def traced_stream(n):
+    with start_trace("stream") as trace:
+        with span("stream.generate"):
+            for i in range(n):
+                yield i, trace, current_parent()
+
+
+class ContextBoundTest(unittest.TestCase):
+    def test_trace_does_not_leak_between_items(self):
+        stream = traced_stream(3)
+        _, trace, parent = next(stream)
+        self.assertIsNotNone(parent)
+        self.assertIsNone(current_trace())  # the consumer sees its own (empty) context
+        self.assertIsNone(current_parent())
+        rest = list(stream)
+        self.assertEqual([item[0] for item in rest], [1, 2])
+        self.assertEqual([s.name for s in trace.spans], ["stream.generate"])
+        self.assertIsNotNone(trace.duration)
+
+    def test_abandoned_stream_leaves_nothing_behind(self):
+        with start_trace("request") as outer:
+            with span("consumer") as consumer:
+                stream = traced_stream(5)
+                _, trace, parent = next(stream)
+                self.assertIs(trace, outer)  # the stream joined the consumer's trace...
+                self.assertEqual(current_parent(), consumer.id)  # ...without moving its current span
+                stream.close()
+                self.assertEqual(current_parent(), consumer.id)
+        self.assertIsNone(current_trace())
+        spans = spans_by_name(outer)
+        self.assertEqual(spans["stream.generate"].parent, consumer.id)
+        self.assertIsNotNone(spans["stream.generate"].duration)
+
+    def test_stream_closed_from_another_context(self):
+        stream = traced_stream(5)
+        trace = contextvars.copy_context().run(lambda: next(stream)[1])
+        stream.close()  # e.g. garbage-collected after the request that started it finished
+        self.assertIsNone(current_trace())
+        self.assertIsNotNone(trace.duration)
+
+    def test_send_and_throw_reach_the_generator(self):
+        @context_bound
+        def echo():
+            received = []
+            while True:
+                try:
+                    received.append((yield len(received)))
+                except KeyError:
+                    yield "caught"
+                    return
+
+        gen = echo()
+        self.assertEqual(next(gen), 0)
+        self.assertEqual(gen.send("a"), 1)
+        self.assertEqual(gen.throw(KeyError("x")), "caught")
+
+    def test_plain_generator_finalized_elsewhere_does_not_raise(self):
+        def plain():
+            with span("plain"):
+                yield 1
+
+        with start_trace("request"):
+            gen = plain()
+            contextvars.copy_context().run(next, gen)
+            gen.close()  # the span's token belongs to the copied context; _reset ignores it here
+            self.assertIsNone(current_parent())
+
+
+class HistogramsTest(unittest.TestCase):
+    def test_prometheus_buckets_are_cumulative(self):
+        histograms = Histograms(buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.1, 0.5, 0.5, 5.0):
+            histograms.observe("neon.titles", seconds)
+        histograms.observe("mistral.chat", 2.0)
+        lines = histograms.to_prometheus().splitlines()
+        self.assertEqual(lines[0], "# TYPE phil_rag_span_seconds histogram")
+        self.assertIn('phil_rag_span_seconds_bucket{span="neon.titles",le="0.1"} 2', lines)  # le is inclusive
+        self.assertIn('phil_rag_span_seconds_bucket{span="neon.titles",le="1.0"} 4', lines)
+        self.assertIn('phil_rag_span_seconds_bucket{span="neon.titles",le="+Inf"} 5', lines)
+        self.assertIn('phil_rag_span_seconds_count{span="neon.titles"} 5', lines)
+        self.assertIn('phil_rag_span_seconds_sum{span="neon.titles"} 6.150000', lines)
+        self.assertIn('phil_rag_span_seconds_bucket{span="mistral.chat",le="1.0"} 0', lines)
+        self.assertIn('phil_rag_span_seconds_bucket{span="mistral.chat",le="+Inf"} 1', lines)
+
+    def test_spans_feed_histograms_without_a_trace(self):
+        histograms = Histograms()
+        with mock.patch.object(tracing, "TRACE_HISTOGRAMS", True), mock.patch.object(tracing, "histograms", histograms):
+            with span("untraced"):
+                pass
+        self.assertEqual(histograms.snapshot()["series"]["untraced"]["count"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
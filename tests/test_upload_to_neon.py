@@ -0,0 +1,123 @@
+import csv
+import io
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+from psycopg2 import sql
+
+# The initial_DB_construction scripts import their siblings as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "initial_DB_construction"))
+os.environ.setdefault("NEON_URL", "postgresql://unused")
+
+import upload_to_neon  # noqa: E402
+from upload_to_neon import CopyStream, _copy_value, _lazy_chunks, _upsert_chunk  # noqa: E402
+
+
+def render(statement):
+    """psycopg2 needs a live connection to quote identifiers; double quotes are enough to read the SQL."""
+    if isinstance(statement, sql.Composed):
+        return "".join(render(part) for part in statement.seq)
+    if isinstance(statement, sql.Identifier):
+        return ".".join(f'"{s}"' for s in statement.strings)
+    return statement.string
+
+
+class CopyValueTest(unittest.TestCase):
+    def test_plain_values(self):
+        self.assertIsNone(_copy_value(None))
+        self.assertEqual(_copy_value("text"), "text")
+        self.assertEqual(_copy_value(""), "")
+        self.assertEqual(_copy_value(3), "3")
+        self.assertEqual((_copy_value(True), _copy_value(False)), ("true", "false"))
+        self.assertEqual(_copy_value({"a": [1, 2]}), '{"a": [1, 2]}')
+        self.assertEqual(_copy_value((0.5, 1)), "[0.5, 1]")
+
+    def test_numpy_embeddings_become_json(self):
+        vector = np.linspace(0, 1, 2000, dtype=np.float32)  # long enough for numpy to elide with "..."
+        rendered = _copy_value(vector)
+        self.assertNotIn("...", rendered)
+        np.testing.assert_array_equal(np.asarray(json.loads(rendered), dtype=np.float32), vector)
+        self.assertEqual(_copy_value(np.array([[1, 2], [3, 4]])), "[[1, 2], [3, 4]]")
+
+    def test_numpy_scalars(self):
+        self.assertEqual(_copy_value(np.int64(7)), "7")
+        self.assertEqual(_copy_value(np.float64(0.25)), "0.25")
+        self.assertEqual(_copy_value(np.bool_(True)), "true")
+
+
+class CopyStreamTest(unittest.TestCase):
+    rows = [
+        (1, 'He said "ought"', None),
+        (2, "line one\nline two, with comma", ""),
+        (3, "Über", {"k": "v"}),
+    ]
+
+    def test_csv_round_trip(self):
+        stream = CopyStream(self.rows)
+        data = stream.read().decode("utf-8")
+        self.assertEqual(stream.rows, 3)
+        parsed = list(csv.reader(io.StringIO(data)))
+        self.assertEqual(parsed, [["1", 'He said "ought"', ""], ["2", "line one\nline two, with comma", ""],
+                                  ["3", "Über", '{"k": "v"}']])
+
+    def test_null_and_empty_string_differ(self):
+        data = CopyStream([(None, "")]).read()
+        self.assertEqual(data, b',""\n')  # unquoted empty field is NULL in COPY csv
+
+    def test_small_reads_stream_lazily(self):
+        pulled = []
+
+        def rows():
+            for i in range(100):
+                pulled.append(i)
+                yield (i, "x" * 10)
+
+        stream = CopyStream(rows())
+        first = stream.read(32)
+        self.assertEqual(len(first), 32)
+        self.assertLess(len(pulled), 10)
+        rest = b"".join(iter(lambda: stream.read(32), b""))
+        self.assertEqual(len(list(csv.reader(io.StringIO((first + rest).decode())))), 100)
+
+    def test_lazy_chunks(self):
+        chunks = [list(chunk) for chunk in _lazy_chunks(iter(range(7)), 3)]
+        self.assertEqual(chunks, [[0, 1, 2], [3, 4, 5], [6]])
+
+
+class UpsertChunkTest(unittest.TestCase):
+    def upsert(self, update_columns):
+        cur = mock.MagicMock()
+        copied = []
+
+        def copy_chunk(cur, table, columns, rows):
+            copied.append((table, list(rows)))
+            return len(copied[-1][1])
+
+        with mock.patch.object(upload_to_neon, "_copy_chunk", side_effect=copy_chunk):
+            count = _upsert_chunk(cur, "sep_embeddings", ("title", "section", "content"),
+                                  iter([("A", "1", "x"), ("A", "1", "y")]), ("title", "section"), update_columns)
+        statements = [render(c.args[0]) for c in cur.execute.call_args_list]
+        return count, copied, statements
+
+    def test_copies_into_staging_then_dedupes(self):
+        count, copied, (create, insert) = self.upsert(("content",))
+        self.assertEqual(count, 2)
+        self.assertEqual(copied, [("sep_embeddings_staging", [("A", "1", "x"), ("A", "1", "y")])])
+        self.assertIn('CREATE TEMP TABLE IF NOT EXISTS "sep_embeddings_staging" (LIKE "sep_embeddings"', create)
+        self.assertIn("ON COMMIT DELETE ROWS", create)
+        # one row per conflict key, the last one copied, so ON CONFLICT never sees a key twice
+        self.assertIn('SELECT DISTINCT ON ("title", "section")', insert)
+        self.assertIn('ORDER BY "title", "section", ctid DESC', insert)
+        self.assertTrue(insert.endswith('ON CONFLICT ("title", "section") DO UPDATE SET "content" = EXCLUDED."content"'))
+
+    def test_without_update_columns_does_nothing_on_conflict(self):
+        _, _, (_, insert) = self.upsert(None)
+        self.assertTrue(insert.endswith('ON CONFLICT ("title", "section") DO NOTHING'))
+
+
+if __name__ == "__main__":
+    unittest.main()